@@ -0,0 +1,296 @@
+"""Batch runner: play many headless games across a process pool for balancing.
+
+Each run gets its own seed, level range, input policy and shop plan. Runs
+play their levels back to back (buying from the shop between levels) until
+they die, time out or finish the range. Per-level stats stream to
+batch_results.csv as runs finish; only running totals are kept in memory, so
+sweeps of any size fit. At the end a per-level summary (completion rate and
+mean coins, kills, damage and time) is printed and written to
+batch_summary.csv.
+
+Usage: python batch.py [--runs 1000] [--levels 1-100] [--span 5]
+                       [--policy aim --policy random] [--shop weapon] [--workers N]
+"""
+import argparse
+import csv
+import itertools
+import math
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("SDL_NO_SIGNAL_HANDLERS", "1")  # SDL would swallow the SIGTERM of Pool.terminate()
+
+RESULTS_PATH = "batch_results.csv"
+SUMMARY_PATH = "batch_summary.csv"
+MAX_LEVEL_TICKS = 60 * 60 * 5  # Five simulated minutes before a level counts as timed out
+PROGRESS_INTERVAL = 2.0  # Seconds between progress lines
+
+RESULT_FIELDS = ["run", "seed", "policy", "shop", "level", "outcome", "ticks", "time_s", "coins_collected",
+                 "enemies_killed", "damage_taken", "coins", "spent", "weapon_power", "rocket_type"]
+SUMMARY_METRICS = ["time_s", "coins_collected", "enemies_killed", "damage_taken", "coins", "spent"]
+
+
+# Input policies: policy(game, rng) -> input bitmask for the next tick
+def policy_random(game, rng):
+    return rng.getrandbits(3)  # Player 1 left/right/fire only
+
+
+def policy_aim(game, rng):
+    """Fire constantly and slide under the boss, or the lowest enemy on screen."""
+    from main import INPUT_FIRE, INPUT_LEFT, INPUT_RIGHT
+    if game.boss_active:
+        target = game.boss.rect.centerx
+    elif game.enemies:
+        target = max(game.enemies, key=lambda enemy: enemy.rect.bottom).rect.centerx
+    else:
+        return INPUT_FIRE
+    dx = target - game.player.rect.centerx
+    if abs(dx) <= game.player.speed:
+        return INPUT_FIRE
+    return INPUT_FIRE | (INPUT_RIGHT if dx > 0 else INPUT_LEFT)
+
+
+def policy_idle(game, rng):
+    from main import INPUT_FIRE
+    return INPUT_FIRE
+
+
+POLICIES = {
+    "aim": policy_aim,
+    "random": policy_random,
+    "idle": policy_idle
+}
+
+# Shop plans: purchases tried in order after each completed level, repeated
+# until nothing on the list is affordable
+SHOP_PLANS = {
+    "none": [],
+    "weapon": ["upgrade_weapon"],
+    "rocket": ["upgrade_rocket:advanced", "upgrade_rocket:ultimate", "upgrade_weapon"],
+    "plasma": ["unlock:plasma", "upgrade_weapon"]
+}
+
+
+def can_buy(player, action):
+    """Whether ``action`` would buy something new (the shop charges for repeats)."""
+    if action == "upgrade_weapon":
+        return player.weapon_power < 5 and player.coins >= 50 * player.weapon_power
+    if action.startswith("upgrade_rocket:"):
+        rockets = ["basic", "advanced", "ultimate"]
+        rocket = action.split(":")[1]
+        cost = {"advanced": 200, "ultimate": 500}[rocket]
+        return rockets.index(player.rocket_type) < rockets.index(rocket) and player.coins >= cost
+    if action.startswith("unlock:"):
+        weapon = action.split(":")[1]
+        return weapon not in player.weapons_unlocked and player.coins >= {"missile": 300, "plasma": 500}[weapon]
+    return False
+
+
+def shop(game, plan):
+    """Spend coins following ``plan``; returns the coins spent."""
+    before = game.player.coins
+    bought = True
+    while bought:
+        bought = False
+        for action in plan:
+            if can_buy(game.player, action):
+                game.apply_action(action)
+                bought = True
+                break
+    return before - game.player.coins
+
+
+def simulate(job):
+    """Play one run and return a result row per level attempted."""
+    from main import TICK_RATE, Game, GameState
+    run, seed, first, last, policy_name, plan_name, two_players, max_ticks = job
+    policy, plan = POLICIES[policy_name], SHOP_PLANS[plan_name]
+    rng = random.Random(seed ^ 0x5EED)  # Policy randomness, separate from the game's stream
+    game = Game(seed=seed, save_path=None)
+    game.settings["record_replays"] = False
+    game.settings["two_players"] = two_players
+    game.level = first
+    game.reset_game(seed)
+
+    rows = []
+    for level in range(first, last + 1):
+        game.state = GameState.PLAYING  # Skip the level 1 story screens
+        ticks = 0
+        while ticks < max_ticks and game.step(policy(game, rng)) == GameState.PLAYING:
+            ticks += 1
+        outcome = {GameState.LEVEL_COMPLETE: "complete", GameState.GAME_OVER: "died"}.get(game.state, "timeout")
+        ticks += outcome != "timeout"  # Count the tick that ended the level
+        spent = shop(game, plan) if outcome == "complete" else 0
+        stats = game.level_stats
+        rows.append({
+            "run": run,
+            "seed": seed,
+            "policy": policy_name,
+            "shop": plan_name,
+            "level": level,
+            "outcome": outcome,
+            "ticks": ticks,
+            "time_s": ticks / TICK_RATE,
+            "coins_collected": stats["coins_collected"],
+            "enemies_killed": stats["enemies_killed"],
+            "damage_taken": stats["damage_taken"],
+            "coins": game.player.coins,
+            "spent": spent,
+            "weapon_power": game.player.weapon_power,
+            "rocket_type": game.player.rocket_type
+        })
+        if outcome != "complete" or level == game.max_level:
+            break
+        if level < last:
+            game.apply_action("next_level")
+    return rows
+
+
+def available_cores():
+    """Cores this process may run on (respects affinity masks and container limits)."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def init_worker():
+    import main
+    main.init()  # Open the (dummy) display once per worker rather than per run
+
+
+def make_jobs(runs, seed, first, last, span, policies, plans, two_players, max_ticks):
+    """Yield one job per run, cycling start levels, policies and shop plans."""
+    combos = list(itertools.product(policies, plans))
+    starts = range(first, last + 1) if span else [first]
+    for run in range(runs):
+        start = starts[(run // len(combos)) % len(starts)]
+        end = min(last, start + span - 1) if span else last
+        policy, plan = combos[run % len(combos)]
+        yield run, seed + run, start, end, policy, plan, two_players, max_ticks
+
+
+class RunningStats:
+    """Count, mean and standard deviation of a stream of values (Welford)."""
+
+    __slots__ = ("count", "mean", "m2")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    @property
+    def std(self):
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+
+class Summary:
+    """Per (policy, shop, level) running aggregates of the result rows."""
+
+    def __init__(self):
+        self.groups = {}
+
+    def add(self, row):
+        key = (row["policy"], row["shop"], row["level"])
+        group = self.groups.get(key)
+        if group is None:
+            group = self.groups[key] = {"attempts": 0, "complete": 0, "died": 0, "timeout": 0,
+                                        "metrics": {name: RunningStats() for name in SUMMARY_METRICS}}
+        group["attempts"] += 1
+        group[row["outcome"]] += 1
+        for name, stats in group["metrics"].items():
+            stats.add(row[name])
+
+    def rows(self):
+        for (policy, plan, level), group in sorted(self.groups.items()):
+            row = {"policy": policy, "shop": plan, "level": level, "attempts": group["attempts"],
+                   "completion_rate": group["complete"] / group["attempts"],
+                   "died": group["died"], "timeout": group["timeout"]}
+            for name, stats in group["metrics"].items():
+                row[name + "_mean"] = stats.mean
+                row[name + "_std"] = stats.std
+            yield row
+
+    def write(self, path):
+        rows = list(self.rows())
+        if not rows:
+            return
+        with open(path, "w", newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+
+    def print(self):
+        print(f"{'policy':<8}{'shop':<8}{'level':>6}{'runs':>7}{'done %':>8}{'time s':>8}{'coins':>8}"
+              f"{'kills':>7}{'damage':>8}{'spent':>7}")
+        for row in self.rows():
+            print(f"{row['policy']:<8}{row['shop']:<8}{row['level']:6d}{row['attempts']:7d}"
+                  f"{row['completion_rate'] * 100:8.1f}{row['time_s_mean']:8.1f}{row['coins_collected_mean']:8.1f}"
+                  f"{row['enemies_killed_mean']:7.1f}{row['damage_taken_mean']:8.1f}{row['spent_mean']:7.1f}")
+
+
+def parse_levels(text):
+    first, _, last = text.partition("-")
+    return int(first), int(last or first)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=100, help="Number of runs")
+    parser.add_argument("--levels", type=parse_levels, default=(1, 100), help="Level range, e.g. 1-100 or 40")
+    parser.add_argument("--span", type=int, default=0,
+                        help="Levels per run; runs then start at successive levels of the range (default: whole range)")
+    parser.add_argument("--policy", action="append", choices=list(POLICIES),
+                        help="Input policy (repeatable; runs cycle through them, default: aim)")
+    parser.add_argument("--shop", action="append", choices=list(SHOP_PLANS),
+                        help="Shop plan between levels (repeatable, default: weapon)")
+    parser.add_argument("--two-players", action="store_true", help="Spawn player 2 (who stays idle)")
+    parser.add_argument("--max-ticks", type=int, default=MAX_LEVEL_TICKS, help="Ticks before a level times out")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of run 0; run i uses seed + i")
+    parser.add_argument("--workers", type=int, default=available_cores(),
+                        help="Worker processes (default: all available cores)")
+    parser.add_argument("--output", default=RESULTS_PATH, help="Per-level results CSV, written as runs finish")
+    parser.add_argument("--summary", default=SUMMARY_PATH, help="Summary CSV")
+    args = parser.parse_args()
+
+    first, last = args.levels
+    jobs = make_jobs(args.runs, args.seed, first, last, args.span, args.policy or ["aim"],
+                     args.shop or ["weapon"], args.two_players, args.max_ticks)
+    summary = Summary()
+    start = last_report = time.perf_counter()
+    finished = 0
+    with open(args.output, "w", newline="") as file, \
+            multiprocessing.Pool(args.workers, initializer=init_worker) as pool:
+        writer = csv.DictWriter(file, fieldnames=RESULT_FIELDS)
+        writer.writeheader()
+        for rows in pool.imap_unordered(simulate, jobs):
+            writer.writerows(rows)
+            for row in rows:
+                summary.add(row)
+            finished += 1
+            now = time.perf_counter()
+            if now - last_report >= PROGRESS_INTERVAL or finished == args.runs:
+                file.flush()
+                last_report = now
+                print(f"{finished}/{args.runs} runs, {finished / (now - start):.1f} runs/s", file=sys.stderr)
+        pool.close()
+        pool.join()
+
+    summary.print()
+    summary.write(args.summary)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
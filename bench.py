@@ -0,0 +1,247 @@
+"""Headless benchmark suite: drive the game through scripted stress scenarios.
+
+Each scenario runs in its own process (so peak RSS is per scenario) and
+reports ticks/s, p50/p99 frame time, peak particle and entity counts and
+peak RSS. Results are written to bench_results.json and bench_results.csv.
+With --baseline the results are compared against a stored baseline and the
+exit status is 1 if any scenario regressed by more than --tolerance.
+
+Usage: SDL_VIDEODRIVER=dummy python bench.py [--scenario NAME ...] [--scale 0.1]
+                                             [--baseline FILE] [--save-baseline FILE]
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+RESULTS_PATH = "bench_results"  # .json/.csv are appended
+TOLERANCE = 0.2  # Allowed relative slowdown before a metric counts as a regression
+SEED = 1234
+
+# Metrics gated against the baseline: name -> True if higher is better
+GATED_METRICS = {
+    "ticks_per_sec": True,
+    "frame_p50_ms": False,
+    "frame_p99_ms": False,
+    "peak_rss_kb": False
+}
+
+
+def keep_alive(game):
+    """Stop the players dying so every frame of a scenario is simulated."""
+    for player in game.players():
+        player.shield = True
+        player.shield_timer = 2
+        player.health = player.max_health
+
+
+def start_level(game, level, two_players=False):
+    from main import GameState
+    game.settings["two_players"] = two_players
+    game.level = level
+    game.reset_game(SEED)
+    game.state = GameState.PLAYING
+
+
+def setup_level_100(game):
+    start_level(game, 100)
+
+
+def setup_coop_plasma(game):
+    start_level(game, 20, two_players=True)
+    for player in game.players():
+        player.unlock_weapon("plasma")
+        player.switch_weapon("plasma")
+
+
+def tick_coop_plasma(game, rng):
+    from main import INPUT_FIRE, INPUT_P2_FIRE, INPUT_LEFT, INPUT_RIGHT, INPUT_P2_LEFT, INPUT_P2_RIGHT
+    for player in game.players():
+        player.rapid_fire = True
+        player.rapid_fire_timer = 300
+    return INPUT_FIRE | INPUT_P2_FIRE | rng.choice((INPUT_LEFT | INPUT_P2_RIGHT, INPUT_RIGHT | INPUT_P2_LEFT, 0))
+
+
+def setup_boss(game):
+    start_level(game, game.max_level)
+    game.enemies = []
+    game.spawn_boss()
+
+
+def tick_boss(game, rng):
+    from main import GameState
+    if not game.boss_active:
+        setup_boss(game)
+    game.state = GameState.PLAYING
+    return tick_random(game, rng)
+
+
+def setup_particle_storm(game):
+    start_level(game, 1)
+
+
+def tick_particle_storm(game, rng):
+    from main import WIDTH, HEIGHT
+    for _ in range(10):
+        game.create_explosion(rng.randint(0, WIDTH), rng.randint(0, HEIGHT), rng.randint(10, 50))
+    return 0
+
+
+def setup_menu_idle(game):
+    from main import GameState
+    game.state = GameState.START_MENU
+
+
+def tick_random(game, rng):
+    return rng.getrandbits(9)
+
+
+# name -> (setup, per-tick input function (None for menus), frames)
+SCENARIOS = {
+    "level_100_opening": (setup_level_100, tick_random, 1800),
+    "coop_plasma_rapid_fire": (setup_coop_plasma, tick_coop_plasma, 1800),
+    "boss_max_level": (setup_boss, tick_boss, 1800),
+    "particle_storm": (setup_particle_storm, tick_particle_storm, 1800),
+    "menu_idle_10min": (setup_menu_idle, None, 60 * 60 * 10)
+}
+
+
+def run_scenario(name, scale=1.0, render_scale=1.0):
+    """Run one scenario in this process and return its metrics."""
+    import numpy as np
+    from main import Game, GameState, init, present
+
+    setup, next_inputs, frames = SCENARIOS[name]
+    frames = max(1, int(frames * scale))
+    rng = random.Random(SEED)
+    screen = init(render_scale)
+    game = Game(seed=SEED, save_path=None)
+    game.settings["record_replays"] = False
+    setup(game)
+
+    frame_ns = np.zeros(frames, dtype=np.int64)
+    peak_particles = peak_entities = ticks = 0
+    start = time.perf_counter()
+    for frame in range(frames):
+        frame_start = time.perf_counter_ns()
+        if next_inputs is not None:
+            keep_alive(game)
+            if game.step(next_inputs(game, rng)) != GameState.PLAYING:
+                game.state = GameState.PLAYING
+            ticks += 1
+        game.starfield.update()  # run() scrolls the stars by elapsed time; one tick per frame here
+        present(game.draw(screen))
+        frame_ns[frame] = time.perf_counter_ns() - frame_start
+
+        peak_particles = max(peak_particles, game.particles.count)
+        peak_entities = max(peak_entities, len(game.enemies) + len(game.projectiles) +
+                            len(game.enemy_bullets) + len(game.power_ups) + game.boss_active)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "scenario": name,
+        "frames": frames,
+        "ticks": ticks,
+        "ticks_per_sec": ticks / elapsed if ticks else None,
+        "frame_p50_ms": float(np.percentile(frame_ns, 50)) / 1e6,
+        "frame_p99_ms": float(np.percentile(frame_ns, 99)) / 1e6,
+        "peak_particles": peak_particles,
+        "peak_entities": peak_entities,
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None
+    }
+
+
+def run_isolated(name, scale, render_scale):
+    """Run a scenario in a fresh interpreter so its peak RSS is its own."""
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", name, "--scale", str(scale),
+         "--render-scale", str(render_scale)],
+        check=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def compare(results, baseline, tolerance):
+    """Return a list of regression messages against ``baseline``."""
+    previous = {result["scenario"]: result for result in baseline["results"]}
+    regressions = []
+    for result in results:
+        old = previous.get(result["scenario"])
+        if old is None:
+            continue
+        for metric, higher_is_better in GATED_METRICS.items():
+            new_value, old_value = result.get(metric), old.get(metric)
+            if not new_value or not old_value:
+                continue
+            change = (old_value - new_value if higher_is_better else new_value - old_value) / old_value
+            if change > tolerance:
+                regressions.append(f"{result['scenario']}: {metric} {old_value:.3f} -> {new_value:.3f} "
+                                   f"({change:+.0%} worse)")
+    return regressions
+
+
+def write_results(results, path):
+    with open(path + ".json", "w") as file:
+        json.dump({"seed": SEED, "results": results}, file, indent=2)
+    with open(path + ".csv", "w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=list(results[0]))
+        writer.writeheader()
+        writer.writerows(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS),
+                        help="Scenario to run (repeatable, default: all)")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiply every scenario's frame count")
+    parser.add_argument("--render-scale", type=float, default=1.0,
+                        help="Render at this fraction of the display resolution")
+    parser.add_argument("--baseline", help="Baseline JSON to compare against; exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="Allowed relative regression")
+    parser.add_argument("--save-baseline", help="Also write the results to this baseline JSON")
+    parser.add_argument("--output", default=RESULTS_PATH, help="Results path without extension")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_scenario(args.child, args.scale, args.render_scale)))
+        return 0
+
+    results = []
+    print(f"{'scenario':<24}{'ticks/s':>10}{'p50 ms':>9}{'p99 ms':>9}{'particles':>10}{'entities':>9}{'rss MB':>8}")
+    for name in args.scenario or SCENARIOS:
+        result = run_isolated(name, args.scale, args.render_scale)
+        results.append(result)
+        rate = f"{result['ticks_per_sec']:10.0f}" if result["ticks_per_sec"] else f"{'-':>10}"
+        rss = f"{result['peak_rss_kb'] / 1024:8.1f}" if result["peak_rss_kb"] else f"{'-':>8}"
+        print(f"{name:<24}{rate}{result['frame_p50_ms']:9.3f}{result['frame_p99_ms']:9.3f}"
+              f"{result['peak_particles']:10d}{result['peak_entities']:9d}{rss}")
+
+    write_results(results, args.output)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as file:
+            json.dump({"seed": SEED, "results": results}, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        for message in regressions:
+            print("REGRESSION", message)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
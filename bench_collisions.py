@@ -0,0 +1,72 @@
+"""Benchmark the SpatialHash broad phase against a brute-force colliderect scan.
+
+Entities are scattered at a constant density (the play area grows with the
+entity count), so the per-query cost of the grid should stay flat while the
+brute-force scan grows linearly.
+
+Usage: SDL_VIDEODRIVER=dummy python bench_collisions.py
+"""
+import os
+import random
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+
+from main import SpatialHash
+
+DENSITY = 200 / (1920 * 1080)  # Entities per pixel, roughly a busy 1080p screen
+QUERIES = 2000
+
+
+def make_rects(rng, count, world_w, world_h, w, h):
+    return [pygame.Rect(rng.randint(0, world_w - w), rng.randint(0, world_h - h), w, h)
+            for _ in range(count)]
+
+
+def bench(count, rng):
+    side = int((count / DENSITY) ** 0.5)
+    enemies = make_rects(rng, count, side, side, 50, 40)
+    bullets = make_rects(rng, QUERIES, side, side, 4, 15)
+
+    grid = SpatialHash()
+    start = time.perf_counter()
+    for i, rect in enumerate(enemies):
+        grid.insert(i, rect)
+    build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    grid_hits = 0
+    for bullet in bullets:
+        for i in grid.query(bullet):
+            if bullet.colliderect(enemies[i]):
+                grid_hits += 1
+                break
+    grid_query = time.perf_counter() - start
+
+    start = time.perf_counter()
+    brute_hits = 0
+    for bullet in bullets:
+        for enemy in enemies:
+            if bullet.colliderect(enemy):
+                brute_hits += 1
+                break
+    brute_query = time.perf_counter() - start
+
+    assert grid_hits == brute_hits
+    return build, grid_query / QUERIES, brute_query / QUERIES
+
+
+def main():
+    pygame.init()
+    rng = random.Random(0)
+    print(f"{'entities':>8}  {'build ms':>9}  {'grid us/query':>13}  {'brute us/query':>14}")
+    for count in (100, 400, 1600, 6400, 25600):
+        build, grid_q, brute_q = bench(count, rng)
+        print(f"{count:8d}  {build * 1e3:9.2f}  {grid_q * 1e6:13.2f}  {brute_q * 1e6:14.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Benchmark the batched nearest-target query that steers homing missiles.
+
+Compares nearest_targets() (grid above NEAREST_GRID_MIN_PAIRS, distance matrix
+below) with a per-missile Python scan of the enemy list, then times full
+Game.update_projectiles() ticks with hundreds of missiles against a screen
+full of enemies.
+
+Usage: SDL_VIDEODRIVER=dummy python bench_homing.py
+"""
+import math
+import os
+import random
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import numpy as np
+
+import main
+from main import Enemy, EnemyType, Game, GameState, WeaponType, nearest_brute, nearest_targets
+
+ENEMIES = 300  # A full screen
+REPEATS = 20
+
+
+def scan(points, targets):
+    """The per-missile approach: walk every enemy for every missile."""
+    result = []
+    for px, py in points:
+        best, best_distance = -1, math.inf
+        for i, (tx, ty) in enumerate(targets):
+            distance = (px - tx) ** 2 + (py - ty) ** 2
+            if distance < best_distance:
+                best, best_distance = i, distance
+        result.append(best)
+    return result
+
+
+def timed(function, *args, repeats=REPEATS):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        result = function(*args)
+    return result, (time.perf_counter() - start) / repeats
+
+
+def bench_queries(rng):
+    targets = np.array([(rng.uniform(0, main.WIDTH), rng.uniform(-40, main.HEIGHT)) for _ in range(ENEMIES)])
+    print(f"nearest-target query, {ENEMIES} enemies")
+    print(f"{'missiles':>8}  {'batched ms':>10}  {'matrix ms':>9}  {'scan ms':>8}")
+    for count in (100, 300, 1000, 3000):
+        points = np.array([(rng.uniform(0, main.WIDTH), rng.uniform(0, main.HEIGHT)) for _ in range(count)])
+        batched, batched_time = timed(nearest_targets, points, targets)
+        matrix, matrix_time = timed(nearest_brute, points, targets)
+        scanned, scan_time = timed(scan, points.tolist(), targets.tolist(), repeats=2)
+        assert (batched == matrix).all() and batched.tolist() == scanned
+        print(f"{count:8d}  {batched_time * 1e3:10.3f}  {matrix_time * 1e3:9.3f}  {scan_time * 1e3:8.3f}")
+
+
+def bench_ticks(rng):
+    game = Game(seed=0, save_path=None)
+    game.settings["record_replays"] = False
+    game.reset_game(0)
+    game.state = GameState.PLAYING
+    print(f"\nGame.update_projectiles() with {ENEMIES} enemies")
+    print(f"{'missiles':>8}  {'ms/tick':>8}")
+    for count in (100, 300, 1000):
+        game.enemies = [Enemy(rng.randint(0, main.WIDTH - 70), rng.randint(-40, main.HEIGHT // 2),
+                              EnemyType.FIGHTER, 1, game.rng) for _ in range(ENEMIES)]
+        game.projectile_pool.release_all(game.projectiles)
+        game.projectiles = [game.projectile_pool.acquire(rng.randint(0, main.WIDTH), main.HEIGHT,
+                                                         WeaponType.MISSILE, 1) for _ in range(count)]
+        start = time.perf_counter()
+        ticks = 0
+        while ticks < 60 and game.projectiles:
+            game.update_projectiles()
+            ticks += 1
+        print(f"{count:8d}  {(time.perf_counter() - start) / ticks * 1e3:8.3f}")
+
+
+def run():
+    main.init()
+    rng = random.Random(0)
+    bench_queries(rng)
+    bench_ticks(rng)
+
+
+if __name__ == "__main__":
+    run()
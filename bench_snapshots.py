@@ -0,0 +1,107 @@
+"""Snapshot benchmark: size and speed of world snapshots, and exact replay after a restore.
+
+For each level a two-player boss fight is played until the screen is full of
+bullets, then snapshot() and restore() are timed and the snapshot size
+reported. The fight then continues for --ticks ticks of recorded inputs,
+the snapshot is restored and the same inputs are replayed: every tick must
+match the original run. The exit status is 1 on any mismatch, or if a
+snapshot or restore takes longer than --budget milliseconds.
+
+Usage: python bench_snapshots.py [--levels 1 50 100] [--ticks 600] [--budget 1.0]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import numpy as np
+
+from main import Game, GameState
+from netplay import fingerprint
+
+LEVELS = (1, 50, 100)
+WARMUP_TICKS = 240  # Let the boss fill the screen with bullets
+REPEATS = 200
+
+
+def boss_fight(level):
+    game = Game(seed=level, save_path=None)
+    game.settings["two_players"] = True
+    game.settings["record_replays"] = False
+    game.level = level
+    game.reset_game(level)
+    game.state = GameState.PLAYING
+    game.spawn_boss()
+    return game
+
+
+def play(game, inputs):
+    """Step through ``inputs`` (players kept alive) and return a fingerprint per tick.
+
+    Events stay on, so achievement and challenge progress (and the coins
+    challenges pay out) is part of what must replay exactly.
+    """
+    prints = []
+    rules = game.achievement_engine.rules
+    for tick_inputs in inputs:
+        for player in game.players():
+            player.shield, player.shield_timer = True, 2
+        game.step(tick_inputs)
+        prints.append((fingerprint(game), [(rule.count, rule.failed, rule.done) for rule in rules]))
+    return prints
+
+
+def timed(function, *args):
+    """Median and worst milliseconds of REPEATS calls."""
+    times = np.empty(REPEATS)
+    for i in range(REPEATS):
+        start = time.perf_counter()
+        function(*args)
+        times[i] = time.perf_counter() - start
+    return np.median(times) * 1000, times.max() * 1000
+
+
+def measure(level, ticks):
+    game = boss_fight(level)
+    rng = random.Random(level)
+    play(game, [rng.getrandbits(12) for _ in range(WARMUP_TICKS)])
+    game.state = GameState.PLAYING
+    snapshot = game.snapshot()
+    entities = len(game.enemies) + len(game.projectiles) + len(game.power_ups) + len(game.enemy_bullets)
+
+    snapshot_ms = timed(game.snapshot)
+    restore_ms = timed(game.restore, snapshot)
+
+    inputs = [rng.getrandbits(12) for _ in range(ticks)]
+    original = play(game, inputs)
+    game.restore(snapshot)
+    replayed = play(game, inputs)
+    mismatch = next((tick for tick, (a, b) in enumerate(zip(original, replayed)) if a != b), None)
+    return len(snapshot), entities, snapshot_ms, restore_ms, mismatch
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--levels", type=int, nargs="+", default=LEVELS)
+    parser.add_argument("--ticks", type=int, default=600, help="Ticks replayed after the restore")
+    parser.add_argument("--budget", type=float, default=1.0, help="Max milliseconds per snapshot or restore")
+    args = parser.parse_args()
+
+    failed = False
+    print(f"{'level':>5}{'entities':>10}{'bytes':>8}{'snap p50':>10}{'snap max':>10}"
+          f"{'load p50':>10}{'load max':>10}  replay")
+    for level in args.levels:
+        size, entities, (snap_p50, snap_max), (load_p50, load_max), mismatch = measure(level, args.ticks)
+        replay = "exact" if mismatch is None else f"DIVERGED at tick {mismatch}"
+        print(f"{level:5d}{entities:10d}{size:8d}{snap_p50:10.3f}{snap_max:10.3f}{load_p50:10.3f}{load_max:10.3f}"
+              f"  {replay}")
+        failed |= mismatch is not None or max(snap_p50, load_p50) > args.budget
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
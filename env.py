@@ -0,0 +1,309 @@
+"""Gym-style environments for training and evaluating bots against the game.
+
+GameEnv wraps one headless Game: ``reset(seed)`` starts a level and
+``step(action)`` advances it, Gymnasium style, returning
+``(observation, reward, terminated, truncated, info)``. Observations are a
+dict of fixed-shape NumPy arrays (player, enemy, projectile, power-up, boss
+and nearest enemy bullet features, zero-padded with a presence column), plus
+an optional downscaled RGB frame. VectorGameEnv steps many independent games
+in one call straight into stacked buffers, without rendering, and resets
+finished games automatically.
+
+gymnasium is not required; when it is installed the environments also get
+``observation_space`` and ``action_space``.
+
+Usage: python env.py [num_envs]   (prints environment steps per second)
+"""
+import os
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import numpy as np
+import pygame
+
+import main
+from main import (INPUT_FIRE, INPUT_LEFT, INPUT_RIGHT, INPUT_WEAPON_LASER, INPUT_WEAPON_MISSILE,
+                  INPUT_WEAPON_PLASMA, TICK_RATE, Game, GameState)
+
+try:
+    from gymnasium import spaces
+except ImportError:  # Optional: only needed for observation_space/action_space
+    spaces = None
+
+# Discrete actions -> player 1 input mask
+ACTIONS = (
+    0,
+    INPUT_LEFT,
+    INPUT_RIGHT,
+    INPUT_FIRE,
+    INPUT_LEFT | INPUT_FIRE,
+    INPUT_RIGHT | INPUT_FIRE,
+    INPUT_WEAPON_LASER | INPUT_FIRE,
+    INPUT_WEAPON_MISSILE | INPUT_FIRE,
+    INPUT_WEAPON_PLASMA | INPUT_FIRE
+)
+
+# Rows kept per entity kind; beyond these the ones nearest the player are kept
+MAX_ENEMIES = 32
+MAX_PROJECTILES = 32
+MAX_POWER_UPS = 8
+MAX_BULLET_ROWS = 64
+
+# Observation features. Positions are divided by the render size, so they are
+# in [0, 1] on screen; the first column of every entity row is 1 if present.
+PLAYER_FEATURES = 13  # x, y, health, max health, laser/missile/plasma, power, rapid fire, shield, cooldown, level, progress
+ENEMY_FEATURES = 7  # present, x, y, width, height, health, type
+PROJECTILE_FEATURES = 6  # present, x, y, vx, vy, type
+POWER_UP_FEATURES = 5  # present, x, y, speed, type
+BOSS_FEATURES = 8  # present, x, y, width, height, health, phase, shield
+BULLET_FEATURES = 6  # present, dx, dy (from the player), vx, vy, damage
+OBSERVATION_SHAPES = {
+    "player": (PLAYER_FEATURES,),
+    "enemies": (MAX_ENEMIES, ENEMY_FEATURES),
+    "projectiles": (MAX_PROJECTILES, PROJECTILE_FEATURES),
+    "power_ups": (MAX_POWER_UPS, POWER_UP_FEATURES),
+    "boss": (BOSS_FEATURES,),
+    "bullets": (MAX_BULLET_ROWS, BULLET_FEATURES)
+}
+
+SCORE_REWARD = 0.01  # Reward per point of score
+DAMAGE_PENALTY = 0.1  # Negative reward per hit point lost
+LEVEL_COMPLETE_REWARD = 10.0
+MAX_EPISODE_TICKS = TICK_RATE * 60 * 5  # Episodes are truncated after five simulated minutes
+
+
+def observation_buffers(shape=()):
+    """Zeroed float32 observation arrays, with ``shape`` prepended to each."""
+    return {name: np.zeros(shape + size, dtype=np.float32) for name, size in OBSERVATION_SHAPES.items()}
+
+
+def nearest(rows, count, px, py):
+    """Indices of the ``count`` rows nearest (px, py); rows are (x, y, ...) tuples."""
+    if len(rows) <= count:
+        return range(len(rows))
+    points = np.array([row[:2] for row in rows], dtype=np.float32)
+    distance = (points[:, 0] - px) ** 2 + (points[:, 1] - py) ** 2
+    return np.argpartition(distance, count)[:count]
+
+
+def fill_rows(out, rows, px, py):
+    """Write entity ``rows`` (tuples without the presence column) into ``out``, nearest first kept."""
+    out[:] = 0
+    if not rows:
+        return
+    kept = [rows[i] for i in nearest(rows, len(out), px, py)]
+    out[:len(kept), 0] = 1
+    out[:len(kept), 1:] = kept
+
+
+def observe(game, out):
+    """Write ``game``'s feature arrays into the ``out`` buffers (see OBSERVATION_SHAPES)."""
+    sx, sy = 1 / main.WIDTH, 1 / main.HEIGHT
+    player = game.player
+    px, py = player.rect.centerx * sx, player.rect.centery * sy
+    weapon = player.weapon_type
+    out["player"][:] = (
+        px, py, player.health / player.max_health, player.max_health / 200,
+        weapon == "laser", weapon == "missile", weapon == "plasma", player.weapon_power / 5,
+        player.rapid_fire, player.shield, player.shoot_cooldown / 15,
+        game.level / game.max_level, min(1.0, game.enemies_defeated / game.enemies_to_defeat)
+    )
+
+    fill_rows(out["enemies"], [
+        (e.rect.centerx * sx, e.rect.centery * sy, e.width * sx, e.height * sy, e.health / 100, e.type.value)
+        for e in game.enemies
+    ], px, py)
+    fill_rows(out["projectiles"], [
+        (p.x * sx, p.y * sy, p.vx * sx, p.vy * sy, p.type.value) for p in game.projectiles
+    ], px, py)
+    fill_rows(out["power_ups"], [
+        (p.rect.centerx * sx, p.rect.centery * sy, p.speed * sy, p.type.value) for p in game.power_ups
+    ], px, py)
+
+    boss = out["boss"]
+    if game.boss_active:
+        b = game.boss
+        boss[:] = (1, b.rect.centerx * sx, b.rect.centery * sy, b.width * sx, b.height * sy,
+                   b.health / b.max_health, b.phase_index, b.shield_active)
+    else:
+        boss[:] = 0
+
+    # Enemy bullets are already arrays: pick the nearest without building rows
+    bullets = out["bullets"]
+    bullets[:] = 0
+    store = game.enemy_bullets
+    n = store.count
+    if n:
+        dx = store.x[:n] * sx - px
+        dy = store.y[:n] * sy - py
+        keep = np.argpartition(dx * dx + dy * dy, MAX_BULLET_ROWS)[:MAX_BULLET_ROWS] if n > MAX_BULLET_ROWS \
+            else slice(None)
+        rows = bullets[:min(n, MAX_BULLET_ROWS)]
+        rows[:, 0] = 1
+        rows[:, 1] = dx[keep]
+        rows[:, 2] = dy[keep]
+        rows[:, 3] = store.vx[:n][keep] * sx
+        rows[:, 4] = store.vy[:n][keep] * sy
+        rows[:, 5] = store.damage[:n][keep] / 10
+
+
+class GameEnv:
+    """One game level as an episode, Gymnasium style.
+
+    ``action`` is an index into ACTIONS, repeated for ``frame_skip`` ticks.
+    The reward is score gained minus damage taken, plus a bonus for clearing
+    the level. Episodes terminate when the level is cleared or the player
+    dies, and are truncated after ``max_ticks``. With ``frame_size``
+    (width, height) the observation also has a ``frame`` array holding the
+    rendered screen scaled down to that size.
+    """
+
+    def __init__(self, level=1, frame_skip=1, max_ticks=MAX_EPISODE_TICKS, frame_size=None, out=None):
+        main.init()
+        self.game = Game(save_path=None)
+        self.game.settings["record_replays"] = False
+        self.game.events.clear()  # No achievement rewards: episodes with one seed play out identically
+        self.level = level
+        self.frame_skip = frame_skip
+        self.max_ticks = max_ticks
+        self.frame_size = frame_size
+        self.obs = out if out is not None else observation_buffers()
+        if frame_size is not None:
+            self.obs["frame"] = np.zeros((frame_size[1], frame_size[0], 3), dtype=np.uint8)
+            self.canvas = pygame.Surface((main.WIDTH, main.HEIGHT))
+        self.ticks = 0
+        self.score = 0
+        self.damage = 0
+        if spaces is not None:
+            self.action_space = spaces.Discrete(len(ACTIONS))
+            boxes = {name: spaces.Box(-np.inf, np.inf, size, np.float32) for name, size in OBSERVATION_SHAPES.items()}
+            if frame_size is not None:
+                boxes["frame"] = spaces.Box(0, 255, self.obs["frame"].shape, np.uint8)
+            self.observation_space = spaces.Dict(boxes)
+
+    def reset(self, seed=None, options=None):
+        """Start the episode's level; returns (observation, info)."""
+        game = self.game
+        game.level = (options or {}).get("level", self.level)
+        game.reset_game(seed)
+        game.state = GameState.PLAYING  # Skip the level 1 story screens
+        self.ticks = 0
+        self.score = game.player.score
+        self.damage = 0
+        return self.observe(), {"seed": game.seed, "level": game.level}
+
+    def step(self, action):
+        """Advance ``frame_skip`` ticks; returns (observation, reward, terminated, truncated, info)."""
+        game = self.game
+        inputs = ACTIONS[action]
+        state = game.state
+        for _ in range(self.frame_skip):
+            state = game.step(inputs)
+            self.ticks += 1
+            if state != GameState.PLAYING:
+                break
+
+        score, damage = game.player.score, game.level_stats["damage_taken"]
+        reward = (score - self.score) * SCORE_REWARD - (damage - self.damage) * DAMAGE_PENALTY
+        self.score, self.damage = score, damage
+        terminated = state != GameState.PLAYING
+        if state == GameState.LEVEL_COMPLETE:
+            reward += LEVEL_COMPLETE_REWARD
+        truncated = not terminated and self.ticks >= self.max_ticks
+        info = {"ticks": self.ticks, "state": state.name}
+        return self.observe(), reward, terminated, truncated, info
+
+    def observe(self):
+        observe(self.game, self.obs)
+        if self.frame_size is not None:
+            self.render_frame(self.obs["frame"])
+        return self.obs
+
+    def render_frame(self, out):
+        """Draw the game and write it scaled to ``frame_size`` into ``out`` (height, width, 3)."""
+        self.game.draw(self.canvas)
+        small = pygame.transform.scale(self.canvas, self.frame_size)
+        out[:] = pygame.surfarray.pixels3d(small).transpose(1, 0, 2)
+
+
+class VectorGameEnv:
+    """``num_envs`` independent GameEnvs stepped together, without rendering.
+
+    Observations are the same dict of arrays with a leading ``num_envs``
+    axis; each game writes straight into its row of the shared buffers. A
+    game whose episode ends is reset on the spot (its next seed is drawn from
+    its own stream) and the last observation of the finished episode is
+    returned in ``infos[i]["final_observation"]``.
+    """
+
+    def __init__(self, num_envs, level=1, frame_skip=1, max_ticks=MAX_EPISODE_TICKS):
+        self.num_envs = num_envs
+        self.obs = observation_buffers((num_envs,))
+        self.envs = [GameEnv(level, frame_skip, max_ticks, out={name: arr[i] for name, arr in self.obs.items()})
+                     for i in range(num_envs)]
+        self.rewards = np.zeros(num_envs, dtype=np.float32)
+        self.terminated = np.zeros(num_envs, dtype=bool)
+        self.truncated = np.zeros(num_envs, dtype=bool)
+        self.seeds = np.random.default_rng()
+        if spaces is not None:
+            self.single_action_space = self.envs[0].action_space
+            self.single_observation_space = self.envs[0].observation_space
+            self.action_space = spaces.MultiDiscrete([len(ACTIONS)] * num_envs)
+
+    def reset(self, seed=None, options=None):
+        """Reset every game; game ``i`` gets ``seed + i``. Returns (observations, infos)."""
+        self.seeds = np.random.default_rng(seed)
+        infos = []
+        for i, env in enumerate(self.envs):
+            infos.append(env.reset(None if seed is None else seed + i, options)[1])
+        return self.obs, infos
+
+    def step(self, actions):
+        """Step game ``i`` with ``actions[i]``; returns (observations, rewards, terminated, truncated, infos)."""
+        infos = []
+        for i, (env, action) in enumerate(zip(self.envs, actions)):
+            _, reward, terminated, truncated, info = env.step(action)
+            if terminated or truncated:
+                info["final_observation"] = {name: arr[i].copy() for name, arr in self.obs.items()}
+                env.reset(int(self.seeds.integers(2 ** 32)))
+            self.rewards[i] = reward
+            self.terminated[i] = terminated
+            self.truncated[i] = truncated
+            infos.append(info)
+        return self.obs, self.rewards, self.terminated, self.truncated, infos
+
+
+def bench(num_envs=8, steps=2000):
+    """Print environment steps per second for the single, framed and vector environments."""
+    rng = np.random.default_rng(0)
+    env = GameEnv()
+    env.reset(seed=0)
+    start = time.perf_counter()
+    for action in rng.integers(len(ACTIONS), size=steps):
+        _, _, terminated, truncated, _ = env.step(action)
+        if terminated or truncated:
+            env.reset()
+    print(f"GameEnv:                  {steps / (time.perf_counter() - start):8.0f} steps/s")
+
+    env = GameEnv(frame_size=(84, 84))
+    env.reset(seed=0)
+    start = time.perf_counter()
+    for action in rng.integers(len(ACTIONS), size=steps // 4):
+        _, _, terminated, truncated, _ = env.step(action)
+        if terminated or truncated:
+            env.reset()
+    print(f"GameEnv 84x84 frames:     {steps // 4 / (time.perf_counter() - start):8.0f} steps/s")
+
+    vector = VectorGameEnv(num_envs)
+    vector.reset(seed=0)
+    start = time.perf_counter()
+    for _ in range(steps // num_envs):
+        vector.step(rng.integers(len(ACTIONS), size=num_envs))
+    print(f"VectorGameEnv({num_envs:3d}):       {steps // num_envs * num_envs / (time.perf_counter() - start):8.0f} steps/s")
+
+
+if __name__ == "__main__":
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 8)
@@ -1,25 +1,229 @@
+import time
+
+STARTUP_BEGIN = time.perf_counter()  # Start of the startup report's "imports" step
+
 import pygame
 import random
 import sys
 import math
 import json
+import os
+import struct
+import socket
+import heapq
+import threading
+import copy
+from collections import OrderedDict, deque
 from enum import Enum
 
-# Initialize pygame
-pygame.init()
-pygame.mixer.init()
-
-# Screen setup
-SCREEN_INFO = pygame.display.Info()
-WIDTH, HEIGHT = SCREEN_INFO.current_w, SCREEN_INFO.current_h
-win = pygame.display.set_mode((WIDTH, HEIGHT), pygame.FULLSCREEN)
-pygame.display.set_caption("🚀 Advanced Rocket Shooter")
+import numpy as np
+
+IMPORTS_DONE = time.perf_counter()
+
+# Screen and fonts. Importing this module touches neither; init() sets them up
+# on first use (Game() calls it) and replaces these placeholders.
+# WIDTH x HEIGHT is the internal render resolution that the game world and UI
+# are laid out in. When it differs from the display, frames are drawn to
+# ``screen`` and present() scales them into PRESENT_RECT of the window.
+WIDTH, HEIGHT = 1280, 720
+win = None  # The display surface
+screen = None  # Surface frames are drawn to; ``win`` itself when rendering at display resolution
+PRESENT_RECT = None  # Where ``screen`` lands on the display (aspect-preserving fit)
+SMOOTH_SCALING = False  # smoothscale instead of nearest-neighbour scale when presenting
+RENDER_SCALES = [1.0, 0.75, 0.5]  # Choices offered in the settings menu
+UI_HEIGHT = 1080  # Menu and HUD layouts are given in pixels at this height; ui() scales them to HEIGHT
+FONT_SM = FONT_MD = FONT_LG = FONT_XL = None
+FONT_CACHE_PATH = "font_cache.json"  # Resolved font paths, so later launches skip the system font scan
+
+# Seconds spent in each startup step, in order, for startup_report()
+STARTUP_TIMES = OrderedDict()
+
+
+def startup_step(name, start):
+    """Record the time since ``start`` as startup step ``name``; returns the new start time."""
+    now = time.perf_counter()
+    STARTUP_TIMES[name] = STARTUP_TIMES.get(name, 0) + now - start
+    return now
+
+
+def font_path(name):
+    """Path of system font ``name`` (None for pygame's default), cached in FONT_CACHE_PATH."""
+    try:
+        with open(FONT_CACHE_PATH, "r") as file:
+            cache = json.load(file)
+    except (OSError, ValueError):
+        cache = {}
+    if name in cache and (cache[name] is None or os.path.exists(cache[name])):
+        return cache[name]
+
+    cache[name] = pygame.font.match_font(name)  # Scans the system font directories
+    try:
+        with open(FONT_CACHE_PATH, "w") as file:
+            json.dump(cache, file)
+    except OSError:
+        pass  # Read-only directory: scan again next launch
+    return cache[name]
+
+
+def init(render_scale=1.0, render_resolution=None, smooth_scaling=False):
+    """Open the window and load the fonts, once. Returns the surface to draw frames on.
+
+    The internal resolution is ``render_resolution`` (width, height) if given,
+    otherwise the display size times ``render_scale``.
+    """
+    global WIDTH, HEIGHT, win, screen, PRESENT_RECT, SMOOTH_SCALING, FONT_SM, FONT_MD, FONT_LG, FONT_XL
+    if win is not None:
+        return screen
+    STARTUP_TIMES["imports"] = IMPORTS_DONE - STARTUP_BEGIN
+    start = time.perf_counter()
+
+    # Only the subsystems the game uses; the mixer stays down until something plays sound
+    pygame.display.init()
+    pygame.font.init()
+    start = startup_step("pygame init", start)
+
+    screen_info = pygame.display.Info()
+    display_size = (screen_info.current_w, screen_info.current_h)
+    win = pygame.display.set_mode(display_size, pygame.FULLSCREEN)
+    pygame.display.set_caption("🚀 Advanced Rocket Shooter")
+    if render_resolution:
+        WIDTH, HEIGHT = render_resolution
+    else:
+        WIDTH, HEIGHT = max(1, round(display_size[0] * render_scale)), max(1, round(display_size[1] * render_scale))
+    if (WIDTH, HEIGHT) == display_size:
+        screen = win
+        PRESENT_RECT = win.get_rect()
+    else:
+        screen = pygame.Surface((WIDTH, HEIGHT)).convert(win)
+        PRESENT_RECT = screen.get_rect().fit(win.get_rect())
+        win.fill(BLACK)  # Letterbox bars are never drawn over
+    SMOOTH_SCALING = smooth_scaling
+    start = startup_step("display", start)
+
+    path = font_path("monospace")
+    start = startup_step("font lookup", start)
+    FONT_SM = pygame.font.Font(path, int(HEIGHT / 40))
+    FONT_MD = pygame.font.Font(path, int(HEIGHT / 30))
+    FONT_LG = pygame.font.Font(path, int(HEIGHT / 20))
+    FONT_XL = pygame.font.Font(path, int(HEIGHT / 10))
+    startup_step("fonts", start)
+    return screen
+
+
+def present(dirty=None):
+    """Show the frame drawn to ``screen``: flip or upscale it whole, or update just the ``dirty`` rects."""
+    if screen is win:
+        if dirty is None:
+            pygame.display.flip()
+        else:
+            pygame.display.update(dirty)
+        return
+    scale = pygame.transform.smoothscale if SMOOTH_SCALING else pygame.transform.scale
+    if dirty is None:
+        scale(screen, PRESENT_RECT.size, win.subsurface(PRESENT_RECT))
+        pygame.display.update(PRESENT_RECT)
+        return
+    regions = [present_rects(rect) for rect in dirty]
+    if sum(source.width * source.height for source, _ in regions) >= WIDTH * HEIGHT:
+        return present()  # Odd scaling ratios have long periods; past a full frame, scale it whole
+    updated = []
+    for source, target in regions:
+        if source and target:
+            scale(screen.subsurface(source), target.size, win.subsurface(target))
+            updated.append(target)
+    pygame.display.update(updated)
+
+
+def ui(pixels):
+    """Scale a layout size given at UI_HEIGHT to the internal resolution."""
+    return round(pixels * HEIGHT / UI_HEIGHT)
+
+
+def render_mouse_pos():
+    """Mouse position in internal render coordinates."""
+    x, y = pygame.mouse.get_pos()
+    if screen is win:
+        return x, y
+    return ((x - PRESENT_RECT.x) * WIDTH // PRESENT_RECT.width,
+            (y - PRESENT_RECT.y) * HEIGHT // PRESENT_RECT.height)
+
+
+def present_rects(rect):
+    """``rect`` of the render target grown to whole scaling periods, and the window area it covers.
+
+    A period is the smallest span that scales to a whole number of window
+    pixels, so a region scaled on its own lands exactly where the full frame
+    puts it (and, with nearest-neighbour scaling, samples the same pixels).
+    This is the inverse of render_mouse_pos.
+    """
+    period_x = WIDTH // math.gcd(WIDTH, PRESENT_RECT.width)
+    period_y = HEIGHT // math.gcd(HEIGHT, PRESENT_RECT.height)
+    left, top = rect.left // period_x * period_x, rect.top // period_y * period_y
+    right, bottom = -(-rect.right // period_x) * period_x, -(-rect.bottom // period_y) * period_y
+    source = pygame.Rect(left, top, right - left, bottom - top).clip(screen.get_rect())
+    target = pygame.Rect(PRESENT_RECT.x + source.left * PRESENT_RECT.width // WIDTH,
+                         PRESENT_RECT.y + source.top * PRESENT_RECT.height // HEIGHT,
+                         source.width * PRESENT_RECT.width // WIDTH,
+                         source.height * PRESENT_RECT.height // HEIGHT)
+    return source, target
+
+
+def startup_report():
+    """Startup time per step, as printable lines."""
+    lines = [f"{name:<14}{seconds * 1000:9.1f} ms" for name, seconds in STARTUP_TIMES.items()]
+    lines.append(f"{'total':<14}{sum(STARTUP_TIMES.values()) * 1000:9.1f} ms")
+    return "\n".join(lines)
+
+
+# Rendered text cache
+TEXT_CACHE_SIZE = 512
+
+
+class TextCache:
+    """Size-bounded LRU cache of rendered text surfaces.
+
+    Keyed by (font, text, color, antialias) so each unique string is
+    rasterized once instead of once per frame. ``hits``/``misses`` count
+    lookups since the last ``take_counts`` (once per frame, for the profiler).
+    """
+
+    def __init__(self, maxsize=TEXT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font, text, antialias, color):
+        key = (font, text, tuple(color), antialias)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surface
+        self.misses += 1
+        surface = font.render(text, antialias, color)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.maxsize:
+            self.surfaces.popitem(last=False)
+        return surface
+
+    def take_counts(self):
+        """Return (hits, misses) and start counting afresh."""
+        counts = (self.hits, self.misses)
+        self.hits = self.misses = 0
+        return counts
+
+    def clear(self):
+        self.surfaces.clear()
+
+
+TEXT_CACHE = TextCache()
+
+
+def render_text(font, text, antialias, color):
+    """Drop-in for ``font.render`` that goes through the shared TEXT_CACHE."""
+    return TEXT_CACHE.render(font, text, antialias, color)
 
-# Fonts
-FONT_SM = pygame.font.SysFont("monospace", int(HEIGHT / 40))
-FONT_MD = pygame.font.SysFont("monospace", int(HEIGHT / 30))
-FONT_LG = pygame.font.SysFont("monospace", int(HEIGHT / 20))
-FONT_XL = pygame.font.SysFont("monospace", int(HEIGHT / 10))
 
 # Colors
 BLACK = (0, 0, 0)
@@ -33,6 +237,151 @@ CYAN = (0, 255, 255)
 ORANGE = (255, 165, 0)
 
 
+# Simulation timing. Gameplay speeds and timers are expressed per tick.
+TICK_RATE = 60  # Simulation ticks per second
+MAX_TICKS_PER_FRAME = 5  # Catch-up limit before backlog ticks are dropped
+MAX_LERP_DISTANCE = 64  # Larger jumps between ticks are drawn without interpolation
+
+
+def ticks_ms():
+    """Monotonic milliseconds, like pygame.time.get_ticks() but without needing pygame.init()."""
+    return time.monotonic_ns() // 1000000
+
+
+# Per-tick input bits consumed by Game.step()
+INPUT_LEFT = 1 << 0
+INPUT_RIGHT = 1 << 1
+INPUT_FIRE = 1 << 2
+INPUT_P2_LEFT = 1 << 3
+INPUT_P2_RIGHT = 1 << 4
+INPUT_P2_FIRE = 1 << 5
+INPUT_WEAPON_LASER = 1 << 6
+INPUT_WEAPON_MISSILE = 1 << 7
+INPUT_WEAPON_PLASMA = 1 << 8
+INPUT_P2_WEAPON_LASER = 1 << 9
+INPUT_P2_WEAPON_MISSILE = 1 << 10
+INPUT_P2_WEAPON_PLASMA = 1 << 11
+
+# Each player's bits, in the order (left, right, fire, laser, missile, plasma)
+PLAYER_INPUTS = (
+    (INPUT_LEFT, INPUT_RIGHT, INPUT_FIRE, INPUT_WEAPON_LASER, INPUT_WEAPON_MISSILE, INPUT_WEAPON_PLASMA),
+    (INPUT_P2_LEFT, INPUT_P2_RIGHT, INPUT_P2_FIRE,
+     INPUT_P2_WEAPON_LASER, INPUT_P2_WEAPON_MISSILE, INPUT_P2_WEAPON_PLASMA)
+)
+PLAYER_INPUT_MASKS = tuple(sum(bits) for bits in PLAYER_INPUTS)
+
+
+def as_player(inputs, index):
+    """Move player 1's bits in ``inputs`` to player ``index``'s bits."""
+    if index == 0:
+        return inputs & PLAYER_INPUT_MASKS[0]
+    mapped = 0
+    for source, target in zip(PLAYER_INPUTS[0], PLAYER_INPUTS[index]):
+        if inputs & source:
+            mapped |= target
+    return mapped
+
+
+def read_inputs(keys):
+    """Map a ``pygame.key.get_pressed()`` snapshot to held-key input bits."""
+    inputs = 0
+    if keys[pygame.K_LEFT]:
+        inputs |= INPUT_LEFT
+    if keys[pygame.K_RIGHT]:
+        inputs |= INPUT_RIGHT
+    if keys[pygame.K_SPACE]:
+        inputs |= INPUT_FIRE
+    if keys[pygame.K_a]:
+        inputs |= INPUT_P2_LEFT
+    if keys[pygame.K_d]:
+        inputs |= INPUT_P2_RIGHT
+    if keys[pygame.K_w]:
+        inputs |= INPUT_P2_FIRE
+    return inputs
+
+
+# Replay files: header, run-length encoded per-tick input masks, then
+# out-of-band actions (shop purchases, level changes) keyed by tick index.
+REPLAY_PATH = "last_run.rply"
+REPLAY_MAGIC = b"RPLY"
+REPLAY_VERSION = 5  # 2: alias-sampled spawns, 3: boss bullet patterns, 4: render resolution, 5: spawn curves
+# magic, version, render width, height, seed, level, flags, runs, actions
+REPLAY_HEADER = struct.Struct("<4sBHHIHBII")
+REPLAY_RUN = struct.Struct("<HH")  # input mask, repeat count
+REPLAY_ACTION = struct.Struct("<IB")  # tick, action name length (name bytes follow)
+
+
+class InputRecording:
+    """Compact log of every simulated tick's inputs for one run.
+
+    Together with the seed, start level, player count and render resolution
+    (spawn positions and culling depend on it) it is enough to re-simulate
+    the run exactly with ``replay()``.
+    """
+
+    def __init__(self, seed, level=1, two_players=False, size=None):
+        self.seed = seed
+        self.level = level
+        self.two_players = two_players
+        self.size = size or (WIDTH, HEIGHT)
+        self.runs = []  # [mask, count] pairs
+        self.actions = []  # (tick, action) pairs
+        self.ticks = 0
+
+    def record(self, inputs):
+        runs = self.runs
+        if runs and runs[-1][0] == inputs and runs[-1][1] < 0xFFFF:
+            runs[-1][1] += 1
+        else:
+            runs.append([inputs, 1])
+        self.ticks += 1
+
+    def record_action(self, action):
+        self.actions.append((self.ticks, action))
+
+    def inputs(self):
+        for mask, count in self.runs:
+            for _ in range(count):
+                yield mask
+
+    def to_bytes(self):
+        parts = [REPLAY_HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION, *self.size, self.seed, self.level,
+                                    1 if self.two_players else 0, len(self.runs), len(self.actions))]
+        parts.extend(REPLAY_RUN.pack(mask, count) for mask, count in self.runs)
+        for tick, action in self.actions:
+            name = action.encode("utf-8")
+            parts.append(REPLAY_ACTION.pack(tick, len(name)) + name)
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data):
+        magic, version, width, height, seed, level, flags, run_count, action_count = REPLAY_HEADER.unpack_from(data)
+        if magic != REPLAY_MAGIC or version != REPLAY_VERSION:
+            raise ValueError("Not a supported replay file")
+        recording = cls(seed, level, bool(flags & 1), (width, height))
+        offset = REPLAY_HEADER.size
+        for _ in range(run_count):
+            mask, count = REPLAY_RUN.unpack_from(data, offset)
+            offset += REPLAY_RUN.size
+            recording.runs.append([mask, count])
+            recording.ticks += count
+        for _ in range(action_count):
+            tick, length = REPLAY_ACTION.unpack_from(data, offset)
+            offset += REPLAY_ACTION.size
+            recording.actions.append((tick, data[offset:offset + length].decode("utf-8")))
+            offset += length
+        return recording
+
+    def save(self, path):
+        with open(path, "wb") as file:
+            file.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as file:
+            return cls.from_bytes(file.read())
+
+
 # Game states
 class GameState(Enum):
     START_MENU = 0
@@ -49,8 +398,26 @@ class GameState(Enum):
     LEVEL_SELECT = 11
 
 
+# Full-screen menu states, drawn with dirty rects when enabled
+MENU_STATES = {
+    GameState.START_MENU, GameState.SETTINGS, GameState.SHOP, GameState.TUTORIAL,
+    GameState.STORY, GameState.ACHIEVEMENTS, GameState.CHALLENGES, GameState.LEVEL_SELECT
+}
+
+
 # Player class
 class Player:
+    # Rocket type: (body color, engine color)
+    ROCKET_COLORS = {
+        "basic": ((0, 255, 255), (0, 180, 180)),
+        "advanced": ((255, 165, 0), (200, 100, 0)),
+        "ultimate": ((255, 50, 255), (180, 0, 180))
+    }
+
+    __slots__ = ("width", "height", "rect", "speed", "health", "max_health", "coins", "weapon_type",
+                 "weapon_power", "weapons_unlocked", "rapid_fire", "shield", "shield_timer", "score",
+                 "lives", "rocket_type", "kills", "shoot_cooldown", "rapid_fire_timer")
+
     def __init__(self, x_position=None):
         self.width = 40
         self.height = 50
@@ -68,7 +435,7 @@ class Player:
         self.shield_timer = 0
         self.score = 0
         self.lives = 3
-        self.rocket_type = "basic"  # basic, advanced, ultimate
+        self.rocket_type = "basic"  # basic, advanced, ultimate (see ROCKET_COLORS)
         self.kills = 0
         self.shoot_cooldown = 0
         self.rapid_fire_timer = 0
@@ -143,50 +510,30 @@ class Player:
             return True
         return False
 
-    def draw(self, surface):
-        # Draw rocket based on type
-        if self.rocket_type == "basic":
-            color = (0, 255, 255)
-            engine_color = (0, 180, 180)
-        elif self.rocket_type == "advanced":
-            color = (255, 165, 0)
-            engine_color = (200, 100, 0)
-        else:  # ultimate
-            color = (255, 50, 255)
-            engine_color = (180, 0, 180)
-
-        # Draw rocket body
-        pygame.draw.polygon(surface, color, [
-            (self.rect.centerx, self.rect.top),
-            (self.rect.left, self.rect.bottom),
-            (self.rect.right, self.rect.bottom)
-        ])
-        pygame.draw.rect(surface, engine_color, (self.rect.left + 15, self.rect.top + 20, 10, 20))
-
-        # Draw engines (flame effect)
-        flame_length = random.randint(5, 10)
-        flame_color = (255, random.randint(100, 200), 0)  # RGB: red-orange
-        pygame.draw.polygon(surface, flame_color, [
-            (self.rect.left + 5, self.rect.bottom),
-            (self.rect.left + 15, self.rect.bottom + flame_length),
-            (self.rect.right - 15, self.rect.bottom + flame_length),
-            (self.rect.right - 5, self.rect.bottom)
-        ])
-        # Draw shield if active
+    def sprites(self):
+        """Return (sprite, position) pairs for the rocket, its flame and shield."""
+        body = ATLAS.player(self.rocket_type)
+        flame = random.choice(ATLAS.flames())  # Flicker between pre-rendered flame frames
+        items = [(body, self.rect.topleft), (flame, (self.rect.left, self.rect.bottom))]
         if self.shield:
-            shield_color = (0, 100, 255)
-            pygame.draw.circle(surface, shield_color, self.rect.center, self.rect.width, 2)
+            shield = ATLAS.shield()
+            items.append((shield, (self.rect.centerx - shield.get_width() // 2,
+                                   self.rect.centery - shield.get_height() // 2)))
+        return items
+
+    def draw(self, surface):
+        surface.blits(self.sprites(), doreturn=False)
 
     def draw_health_bar(self, surface, y_offset=10):
-        bar_width = 200
-        bar_height = 20
+        bar_width = ui(200)
+        bar_height = ui(20)
         fill = (self.health / self.max_health) * bar_width
-        outline_rect = pygame.Rect(10, y_offset, bar_width, bar_height)
-        fill_rect = pygame.Rect(10, y_offset, fill, bar_height)
+        outline_rect = pygame.Rect(ui(10), ui(y_offset), bar_width, bar_height)
+        fill_rect = pygame.Rect(ui(10), ui(y_offset), fill, bar_height)
         pygame.draw.rect(surface, RED, fill_rect)
         pygame.draw.rect(surface, WHITE, outline_rect, 2)
-        health_text = FONT_SM.render(f"Health: {self.health}/{self.max_health}", True, WHITE)
-        surface.blit(health_text, (15, y_offset + 2))
+        health_text = render_text(FONT_SM, f"Health: {self.health}/{self.max_health}", True, WHITE)
+        surface.blit(health_text, (ui(15), ui(y_offset + 2)))
 
 
 # Enemy types
@@ -198,65 +545,133 @@ class EnemyType(Enum):
     ELITE = 4
 
 
+# Scout hull colors, a fixed palette so each one is rasterized once
+SCOUT_COLORS = [
+    (255, 100, 100), (200, 80, 120), (230, 140, 60), (170, 60, 90),
+    (255, 130, 150), (190, 110, 70), (220, 60, 60), (240, 90, 140)
+]
+
+
+# Enemy archetypes. Speeds are uniform between (min_base + min_per_level * level)
+# and (max_base + max_per_level * level); health is base + int(per_level * level).
+# A size jitter range makes the archetype square with a random size, a palette
+# picks a random color, and a cooldown range of None means it never shoots.
+ENEMY_ARCHETYPES = {
+    EnemyType.ASTEROID: {"size": (30, 30), "size_jitter": (-5, 10), "speed": (1.0, 0.2, 2.0, 0.4),
+                         "health": (1, 0), "color": (100, 255, 100), "value": 1, "cooldown": None,
+                         "drop_chance": 0.3},
+    EnemyType.SCOUT: {"size": (40, 30), "speed": (2.0, 0.3, 3.0, 0.5), "health": (2, 0.5),
+                      "palette": SCOUT_COLORS, "value": 2, "cooldown": (80, 120), "drop_chance": 0.4},
+    EnemyType.FIGHTER: {"size": (50, 40), "speed": (1.5, 0.2, 2.5, 0.4), "health": (3, 1),
+                        "color": (200, 50, 50), "value": 5, "cooldown": (60, 90), "drop_chance": 0.5},
+    EnemyType.BOMBER: {"size": (60, 40), "speed": (1.0, 0.2, 1.8, 0.3), "health": (5, 2),
+                       "color": (100, 100, 200), "value": 10, "cooldown": (90, 150), "drop_chance": 0.6},
+    EnemyType.ELITE: {"size": (70, 50), "speed": (2.5, 0.3, 3.5, 0.5), "health": (8, 3),
+                      "color": (200, 200, 50), "value": 20, "cooldown": (50, 80), "drop_chance": 0.7}
+}
+
+# Spawn weight curves: (level, weight) keyframes per archetype. Weights are
+# interpolated linearly between keyframes, zero before the first and held after
+# the last. Endless mode has its own weights.
+SPAWN_LEVELS = 100
+SPAWN_CURVES = {
+    EnemyType.ASTEROID: [(1, 8), (2, 6), (3, 5), (4, 4), (5, 3), (6, 0)],
+    EnemyType.SCOUT: [(1, 2), (2, 3), (4, 3), (5, 2), (6, 0)],
+    EnemyType.FIGHTER: [(1, 0), (2, 1), (3, 2), (4, 2), (5, 3), (6, 2), (50, 2), (100, 1)],
+    EnemyType.BOMBER: [(3, 0), (4, 1), (5, 2), (6, 3), (50, 3), (100, 2)],
+    EnemyType.ELITE: [(5, 0), (6, 2), (100, 4)]
+}
+ENDLESS_SPAWN_WEIGHTS = {EnemyType.FIGHTER: 1, EnemyType.BOMBER: 2, EnemyType.ELITE: 4}
+
+
+def curve_value(keyframes, level):
+    """Piecewise-linear value of sorted (level, value) ``keyframes`` at ``level``."""
+    first_level, value = keyframes[0]
+    if level < first_level:
+        return 0
+    for (start, low), (end, high) in zip(keyframes, keyframes[1:]):
+        if level < end:
+            return low + (high - low) * (level - start) / (end - start)
+        value = high
+    return value
+
+
+def spawn_weights(level, curves=SPAWN_CURVES):
+    """Archetype -> spawn weight at ``level`` (archetypes weighted zero are left out)."""
+    weights = {enemy_type: curve_value(keyframes, level) for enemy_type, keyframes in curves.items()}
+    return {enemy_type: weight for enemy_type, weight in weights.items() if weight > 0}
+
+
+class AliasSampler:
+    """O(1) weighted sampling with Vose's alias method.
+
+    Each draw takes one ``rng.random()``: it picks a column and then either the
+    column's own item or its alias.
+    """
+    __slots__ = ("items", "probability", "alias")
+
+    def __init__(self, weights):
+        self.items = list(weights)
+        n = len(self.items)
+        total = sum(weights.values())
+        scaled = [weights[item] * n / total for item in self.items]
+        self.probability = [1.0] * n
+        self.alias = list(range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            low, high = small.pop(), large.pop()
+            self.probability[low] = scaled[low]
+            self.alias[low] = high
+            scaled[high] -= 1.0 - scaled[low]
+            (small if scaled[high] < 1.0 else large).append(high)
+
+    def sample(self, rng):
+        u = rng.random() * len(self.items)
+        column = int(u)
+        return self.items[column if u - column < self.probability[column] else self.alias[column]]
+
+
+SPAWN_SAMPLERS = [AliasSampler(spawn_weights(level)) for level in range(1, SPAWN_LEVELS + 1)]
+ENDLESS_SPAWN_SAMPLER = AliasSampler(ENDLESS_SPAWN_WEIGHTS)
+
+
+def spawn_sampler(level, endless=False):
+    """The precomputed spawn sampler for ``level``, or for endless mode."""
+    if endless:
+        return ENDLESS_SPAWN_SAMPLER
+    return SPAWN_SAMPLERS[min(max(level, 1), SPAWN_LEVELS) - 1]
+
+
 class Enemy:
-    def __init__(self, x, y, enemy_type, level):
+    __slots__ = ("type", "level", "width", "height", "speed", "health", "color", "value",
+                 "shoot_cooldown", "drop_chance", "rect", "original_pos", "angle", "oscillation", "rng",
+                 "cooldown")
+
+    def __init__(self, x, y, enemy_type, level, rng=random):
         self.type = enemy_type
         self.level = level
+        self.rng = rng  # Gameplay RNG stream of the owning game
+        archetype = ENEMY_ARCHETYPES[enemy_type]
 
-        if enemy_type == EnemyType.ASTEROID:
-            self.width = 30 + random.randint(-5, 10)
+        self.width, self.height = archetype["size"]
+        if "size_jitter" in archetype:
+            self.width += rng.randint(*archetype["size_jitter"])
             self.height = self.width
-            self.speed = random.uniform(1.0 + level * 0.2, 2.0 + level * 0.4)
-            self.health = 1
-            self.color = (100, 255, 100)
-            self.value = 1
-            self.shoot_cooldown = 0
-            self.drop_chance = 0.3
-
-        elif enemy_type == EnemyType.SCOUT:
-            self.width = 40
-            self.height = 30
-            self.speed = random.uniform(2.0 + level * 0.3, 3.0 + level * 0.5)
-            self.health = 2 + level // 2
-            self.color = (random.randint(150, 255), random.randint(50, 150), random.randint(50, 150))
-            self.value = 2
-            self.shoot_cooldown = random.randint(80, 120)
-            self.drop_chance = 0.4
-
-        elif enemy_type == EnemyType.FIGHTER:
-            self.width = 50
-            self.height = 40
-            self.speed = random.uniform(1.5 + level * 0.2, 2.5 + level * 0.4)
-            self.health = 3 + level
-            self.color = (200, 50, 50)
-            self.value = 5
-            self.shoot_cooldown = random.randint(60, 90)
-            self.drop_chance = 0.5
-
-        elif enemy_type == EnemyType.BOMBER:
-            self.width = 60
-            self.height = 40
-            self.speed = random.uniform(1.0 + level * 0.2, 1.8 + level * 0.3)
-            self.health = 5 + level * 2
-            self.color = (100, 100, 200)
-            self.value = 10
-            self.shoot_cooldown = random.randint(90, 150)
-            self.drop_chance = 0.6
-
-        elif enemy_type == EnemyType.ELITE:
-            self.width = 70
-            self.height = 50
-            self.speed = random.uniform(2.5 + level * 0.3, 3.5 + level * 0.5)
-            self.health = 8 + level * 3
-            self.color = (200, 200, 50)
-            self.value = 20
-            self.shoot_cooldown = random.randint(50, 80)
-            self.drop_chance = 0.7
+        min_base, min_per_level, max_base, max_per_level = archetype["speed"]
+        self.speed = rng.uniform(min_base + level * min_per_level, max_base + level * max_per_level)
+        base, per_level = archetype["health"]
+        self.health = base + int(level * per_level)
+        self.color = rng.choice(archetype["palette"]) if "palette" in archetype else archetype["color"]
+        self.value = archetype["value"]
+        self.cooldown = archetype["cooldown"]
+        self.shoot_cooldown = rng.randint(*self.cooldown) if self.cooldown else 0
+        self.drop_chance = archetype["drop_chance"]
 
         self.rect = pygame.Rect(x, y, self.width, self.height)
         self.original_pos = (x, y)
         self.angle = 0
-        self.oscillation = random.uniform(0.02, 0.05)
+        self.oscillation = rng.uniform(0.02, 0.05)
 
     def move(self):
         if self.type == EnemyType.ASTEROID:
@@ -275,40 +690,33 @@ class Enemy:
         return self.shoot_cooldown <= 0 and self.type != EnemyType.ASTEROID
 
     def reset_cooldown(self):
-        if self.type == EnemyType.SCOUT:
-            self.shoot_cooldown = random.randint(80, 120)
-        elif self.type == EnemyType.FIGHTER:
-            self.shoot_cooldown = random.randint(60, 90)
-        elif self.type == EnemyType.BOMBER:
-            self.shoot_cooldown = random.randint(90, 150)
-        elif self.type == EnemyType.ELITE:
-            self.shoot_cooldown = random.randint(50, 80)
+        if self.cooldown:
+            self.shoot_cooldown = self.rng.randint(*self.cooldown)
+
+    def sprite(self):
+        return ATLAS.enemy(self.type, self.width, self.height, self.color), self.rect.topleft
 
     def draw(self, surface):
-        if self.type == EnemyType.ASTEROID:
-            pygame.draw.circle(surface, self.color, self.rect.center, self.rect.width // 2)
-            pygame.draw.circle(surface, (40, 140, 40), self.rect.center, self.rect.width // 4)
-        else:
-            pygame.draw.rect(surface, self.color, self.rect)
-            # Draw cockpit
-            pygame.draw.circle(surface, (50, 50, 50),
-                               (self.rect.centerx, self.rect.centery),
-                               self.rect.width // 4)
+        surface.blit(*self.sprite())
 
 
 # Boss class
 class Boss:
+    __slots__ = ("width", "height", "rect", "speed", "health", "max_health", "direction", "phases",
+                 "phase_index", "phase_tick", "color", "shield_active", "shield_timer", "level",
+                 "value", "shield_cooldown")
+
     def __init__(self, level):
-        self.width = 200 + level * 10
-        self.height = 80 + level * 5
+        self.width = min(200 + level * 10, WIDTH // 2)
+        self.height = min(80 + level * 5, HEIGHT // 5)
         self.rect = pygame.Rect(WIDTH // 2 - self.width // 2, 50, self.width, self.height)
         self.speed = 1 + level * 0.2
         self.health = 50 * level
         self.max_health = 50 * level
         self.direction = 1  # 1 for right, -1 for left
-        self.shoot_cooldown = 40 - min(5, level)  # More time between shots
-        self.attack_pattern = 0
-        self.attack_timer = 0
+        self.phases = boss_phases(level)
+        self.phase_index = 0
+        self.phase_tick = -(40 - min(5, level))  # Delay before the first phase
         self.color = (200, 0, 0)
         self.shield_active = False
         self.shield_timer = 0
@@ -320,19 +728,37 @@ class Boss:
         self.rect.x += self.speed * self.direction
         if self.rect.left <= 0 or self.rect.right >= WIDTH:
             self.direction *= -1
-            self.rect.y += 20  # Move down when hitting a wall
+            self.rect.clamp_ip((0, 0, WIDTH, HEIGHT))
+            self.rect.y = min(self.rect.y + 20, HEIGHT // 3)  # Move down when hitting a wall, up to a third of the screen
 
     def update_cooldown(self):
-        if self.shoot_cooldown > 0:
-            self.shoot_cooldown -= 1
         if self.shield_cooldown > 0:
             self.shield_cooldown -= 1
 
-    def can_shoot(self):
-        return self.shoot_cooldown <= 0
-
-    def reset_cooldown(self):
-        self.shoot_cooldown = 40 - min(5, self.level)  # Faster shooting at higher levels
+    def phase_pause(self):
+        """Ticks between attack phases; shorter at higher levels."""
+        return max(20, 60 - self.level // 2)
+
+    def attack(self, bullets, target):
+        """Advance the attack cycle one tick, firing the current phase's patterns into ``bullets``."""
+        tick = self.phase_tick
+        self.phase_tick += 1
+        if tick < 0:
+            return
+        phase = self.phases[self.phase_index]
+        length = 1
+        for name in phase:
+            if name == "shield":
+                if tick == 0:
+                    self.activate_shield()
+                continue
+            pattern = BULLET_PATTERNS[name]
+            length = max(length, pattern.duration())
+            if tick % pattern.interval == 0 and tick < pattern.duration():
+                pattern.fire(bullets, self.rect.centerx, self.rect.bottom, tick // pattern.interval, target)
+        if tick >= length:
+            self.phase_index = (self.phase_index + 1) % len(self.phases)
+            self.phase_tick = -self.phase_pause()
 
     def activate_shield(self):
         if self.shield_cooldown <= 0:
@@ -352,30 +778,28 @@ class Boss:
         self.health = max(0, self.health - amount)
         return True
 
-    def draw(self, surface):
+    def draw(self, surface, offset=(0, 0)):
+        rect = self.rect.move(offset)
+
         # Draw boss body
-        pygame.draw.rect(surface, self.color, self.rect, border_radius=10)
+        surface.blit(ATLAS.boss(self.width, self.height, self.color), rect.topleft)
 
         # Draw shield if active
         if self.shield_active:
             shield_color = (0, 100, 255)
-            pygame.draw.rect(surface, shield_color, self.rect.inflate(20, 20), 3, border_radius=15)
+            pygame.draw.rect(surface, shield_color, rect.inflate(20, 20), 3, border_radius=15)
 
         # Draw health bar
         health_width = 300
         health_ratio = self.health / self.max_health
         pygame.draw.rect(surface, (100, 100, 100),
-                         (self.rect.centerx - health_width // 2, self.rect.top - 30, health_width, 15))
+                         (rect.centerx - health_width // 2, rect.top - 30, health_width, 15))
         pygame.draw.rect(surface, (0, 255, 0),
-                         (self.rect.centerx - health_width // 2, self.rect.top - 30, health_width * health_ratio, 15))
-
-        # Draw details
-        pygame.draw.circle(surface, (50, 50, 50), (self.rect.centerx, self.rect.centery), 20)
-        pygame.draw.circle(surface, (150, 150, 255), (self.rect.centerx, self.rect.centery), 10)
+                         (rect.centerx - health_width // 2, rect.top - 30, health_width * health_ratio, 15))
 
         # Draw level indicator
-        level_text = FONT_MD.render(f"BOSS LEVEL {self.level}", True, RED)
-        surface.blit(level_text, (self.rect.centerx - level_text.get_width() // 2, self.rect.top - 50))
+        level_text = render_text(FONT_MD, f"BOSS LEVEL {self.level}", True, RED)
+        surface.blit(level_text, (rect.centerx - level_text.get_width() // 2, rect.top - 50))
 
 
 # Weapon types
@@ -385,53 +809,158 @@ class WeaponType(Enum):
     PLASMA = 2
 
 
+# Player weapon names to projectile types
+WEAPON_TYPES = {
+    "laser": WeaponType.LASER,
+    "missile": WeaponType.MISSILE,
+    "plasma": WeaponType.PLASMA
+}
+
+
 class Projectile:
+    __slots__ = ("type", "power", "width", "height", "speed", "color", "damage",
+                 "homing", "explosive", "rect", "x", "y", "vx", "vy")
+
+    # Per-weapon stats: (width, height, speed, color, damage per power level, homing, explosive)
+    STATS = {
+        WeaponType.LASER: (4, 15, 15, (255, 60, 60), 10, False, False),
+        WeaponType.MISSILE: (8, 20, 10, (255, 165, 0), 25, True, False),
+        WeaponType.PLASMA: (15, 15, 8, (0, 255, 255), 40, False, True),
+    }
+
     def __init__(self, x, y, weapon_type, power):
+        self.rect = pygame.Rect(0, 0, 0, 0)
+        self.reset(x, y, weapon_type, power)
+
+    def reset(self, x, y, weapon_type, power):
+        """(Re)initialize in place so pooled projectiles can be reused."""
+        width, height, speed, color, damage, homing, explosive = self.STATS[weapon_type]
         self.type = weapon_type
         self.power = power
-
-        if weapon_type == WeaponType.LASER:
-            self.width = 4
-            self.height = 15
-            self.speed = 15
-            self.color = (255, 60, 60)
-            self.damage = 10 * power
-
-        elif weapon_type == WeaponType.MISSILE:
-            self.width = 8
-            self.height = 20
-            self.speed = 10
-            self.color = (255, 165, 0)
-            self.damage = 25 * power
-            self.homing = True
-
-        elif weapon_type == WeaponType.PLASMA:
-            self.width = 15
-            self.height = 15
-            self.speed = 8
-            self.color = (0, 255, 255)
-            self.damage = 40 * power
-            self.explosive = True
-
-        self.rect = pygame.Rect(x - self.width // 2, y - self.height, self.width, self.height)
+        self.width = width
+        self.height = height
+        self.speed = speed
+        self.color = color
+        self.damage = damage * power
+        self.homing = homing
+        self.explosive = explosive
+        self.rect.update(x - width // 2, y - height, width, height)
+        # Float center and velocity; the rect follows them, rounded
+        self.x, self.y = self.rect.center
+        self.vx = 0.0
+        self.vy = -float(speed)
+        return self
 
     def move(self):
-        self.rect.y -= self.speed
+        self.x += self.vx
+        self.y += self.vy
+        self.rect.center = (round(self.x), round(self.y))
+
+    def sprite(self):
+        return ATLAS.projectile(self.type), self.rect.topleft
 
     def draw(self, surface):
-        if self.type == WeaponType.LASER:
-            pygame.draw.line(surface, self.color,
-                             (self.rect.centerx, self.rect.bottom),
-                             (self.rect.centerx, self.rect.top), 4)
-        elif self.type == WeaponType.MISSILE:
-            pygame.draw.rect(surface, self.color, self.rect)
-            pygame.draw.polygon(surface, (255, 200, 0), [
-                (self.rect.left, self.rect.bottom),
-                (self.rect.right, self.rect.bottom),
-                (self.rect.centerx, self.rect.bottom + 10)
-            ])
-        elif self.type == WeaponType.PLASMA:
-            pygame.draw.circle(surface, self.color, self.rect.center, self.rect.width // 2)
+        surface.blit(*self.sprite())
+
+
+class ProjectilePool:
+    """Free list of dead projectiles, recycled instead of reallocated."""
+
+    __slots__ = ("free",)
+
+    def __init__(self):
+        self.free = []
+
+    def acquire(self, x, y, weapon_type, power):
+        if self.free:
+            return self.free.pop().reset(x, y, weapon_type, power)
+        return Projectile(x, y, weapon_type, power)
+
+    def release(self, projectile):
+        self.free.append(projectile)
+
+    def release_all(self, projectiles):
+        self.free.extend(projectiles)
+
+
+# Plasma blasts: radius grows with weapon power, damage falls off linearly to
+# PLASMA_EDGE_DAMAGE of the hit at the edge
+PLASMA_RADIUS = 50
+PLASMA_RADIUS_PER_POWER = 15
+PLASMA_EDGE_DAMAGE = 0.25
+
+
+# Nearest-target queries
+MISSILE_TURN_RATE = 0.08  # Radians a homing missile can turn per tick
+NEAREST_CELL_SIZE = 64
+NEAREST_GRID_MIN_PAIRS = 20000  # Below this many point-target pairs a distance matrix is cheaper
+NEAREST_CHUNK = 1 << 20  # Max distance-matrix entries computed at once
+
+
+def nearest_brute(points, targets):
+    """Index of the nearest target for every point, via chunked distance matrices."""
+    result = np.empty(len(points), dtype=np.intp)
+    rows = max(1, NEAREST_CHUNK // len(targets))
+    for start in range(0, len(points), rows):
+        delta = points[start:start + rows, None, :] - targets[None, :, :]
+        result[start:start + rows] = np.einsum("ijk,ijk->ij", delta, delta).argmin(axis=1)
+    return result
+
+
+def nearest_targets(points, targets, cell_size=NEAREST_CELL_SIZE):
+    """Index of the nearest target for every point, answered in one batched query.
+
+    ``points`` and ``targets`` are float arrays of shape (n, 2). Returns -1s when
+    there are no targets. Small batches use a distance matrix. Larger ones
+    bucket the targets into a uniform grid and search each point's 3x3 cell
+    block; a best match within ``cell_size`` is provably the nearest, and
+    the points without one fall back to the matrix. Ties go to the lowest index.
+    """
+    n, m = len(points), len(targets)
+    if m == 0:
+        return np.full(n, -1, dtype=np.intp)
+    if n * m < NEAREST_GRID_MIN_PAIRS:
+        return nearest_brute(points, targets)
+
+    # Cell keys, biased so negative coordinates (off-screen spawns) sort correctly
+    bias, stride = 1 << 20, 1 << 21
+    target_cells = np.floor(targets / cell_size).astype(np.int64) + bias
+    keys = target_cells[:, 0] * stride + target_cells[:, 1]
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    point_cells = np.floor(points / cell_size).astype(np.int64) + bias
+
+    pair_points, pair_targets = [], []
+    point_index = np.arange(n)
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            query = (point_cells[:, 0] + dx) * stride + point_cells[:, 1] + dy
+            low = np.searchsorted(sorted_keys, query, "left")
+            counts = np.searchsorted(sorted_keys, query, "right") - low
+            total = counts.sum()
+            if not total:
+                continue
+            starts = np.repeat(low - (np.cumsum(counts) - counts), counts)
+            pair_points.append(np.repeat(point_index, counts))
+            pair_targets.append(order[np.arange(total) + starts])
+
+    best = np.full(n, -1, dtype=np.intp)
+    if pair_points:
+        pair_points = np.concatenate(pair_points)
+        pair_targets = np.concatenate(pair_targets)
+        delta = points[pair_points] - targets[pair_targets]
+        distances = np.einsum("ij,ij->i", delta, delta)
+        best_distance = np.full(n, np.inf)
+        np.minimum.at(best_distance, pair_points, distances)
+        closest = distances == best_distance[pair_points]
+        best[:] = m
+        np.minimum.at(best, pair_points[closest], pair_targets[closest])
+        best[best_distance > cell_size * cell_size] = -1
+
+    missing = np.flatnonzero(best < 0)
+    if len(missing):
+        best[missing] = nearest_brute(points[missing], targets)
+    return best
 
 
 # Power-up types
@@ -445,42 +974,1246 @@ class PowerUpType(Enum):
 
 
 class PowerUp:
+    __slots__ = ("type", "rect", "speed")
+
+    COLORS = {
+        PowerUpType.COIN: (255, 215, 0),
+        PowerUpType.HEALTH: (255, 50, 50),
+        PowerUpType.RAPID_FIRE: (50, 255, 50),
+        PowerUpType.SHIELD: (50, 50, 255),
+        PowerUpType.BOMB: (255, 0, 0),
+        PowerUpType.GUN: (180, 0, 180)
+    }
+    SYMBOLS = {
+        PowerUpType.COIN: "$",
+        PowerUpType.HEALTH: "+",
+        PowerUpType.RAPID_FIRE: "⚡",
+        PowerUpType.SHIELD: "🛡️",
+        PowerUpType.BOMB: "💣",
+        PowerUpType.GUN: "🔫"
+    }
+
     def __init__(self, x, y, type):
         self.type = type
         self.rect = pygame.Rect(x, y, 30, 30)
         self.speed = 2
-        self.colors = {
-            PowerUpType.COIN: (255, 215, 0),
-            PowerUpType.HEALTH: (255, 50, 50),
-            PowerUpType.RAPID_FIRE: (50, 255, 50),
-            PowerUpType.SHIELD: (50, 50, 255),
-            PowerUpType.BOMB: (255, 0, 0),
-            PowerUpType.GUN: (180, 0, 180)
-        }
-        self.symbols = {
-            PowerUpType.COIN: "$",
-            PowerUpType.HEALTH: "+",
-            PowerUpType.RAPID_FIRE: "⚡",
-            PowerUpType.SHIELD: "🛡️",
-            PowerUpType.BOMB: "💣",
-            PowerUpType.GUN: "🔫"
-        }
 
     def move(self):
         self.rect.y += self.speed
 
+    def sprite(self):
+        return ATLAS.power_up(self.type), self.rect.topleft
+
     def draw(self, surface):
-        pygame.draw.rect(surface, self.colors[self.type], self.rect, border_radius=5)
-        pygame.draw.rect(surface, WHITE, self.rect, 2, border_radius=5)
-        symbol = FONT_MD.render(self.symbols[self.type], True, WHITE)
-        surface.blit(symbol, (self.rect.centerx - symbol.get_width() // 2,
-                              self.rect.centery - symbol.get_height() // 2))
+        surface.blit(*self.sprite())
+
+
+# Sprite atlas
+FLAME_FRAMES = 4
+
+
+class SpriteAtlas:
+    """Entity sprites rasterized once and reused for every draw.
+
+    Each variant is built from the original primitive drawing code the first
+    time it is requested (``prebuild`` requests the known ones up front) and
+    converted to the display pixel format when a display exists.
+    """
+
+    def __init__(self):
+        self.sprites = {}
+
+    def get(self, key, build):
+        sprite = self.sprites.get(key)
+        if sprite is None:
+            sprite = build()
+            if pygame.display.get_surface() is not None:
+                sprite = sprite.convert_alpha()
+            self.sprites[key] = sprite
+        return sprite
+
+    def prebuild(self):
+        for rocket_type in Player.ROCKET_COLORS:
+            self.player(rocket_type)
+        self.flames()
+        self.shield()
+        for width in range(25, 41):
+            self.enemy(EnemyType.ASTEROID, width, width, (100, 255, 100))
+        for color in SCOUT_COLORS:
+            self.enemy(EnemyType.SCOUT, 40, 30, color)
+        self.enemy(EnemyType.FIGHTER, 50, 40, (200, 50, 50))
+        self.enemy(EnemyType.BOMBER, 60, 40, (100, 100, 200))
+        self.enemy(EnemyType.ELITE, 70, 50, (200, 200, 50))
+        for weapon_type in WeaponType:
+            self.projectile(weapon_type)
+        for kind in range(len(BULLET_KINDS)):
+            self.bullet(kind)
+        for power_type in PowerUpType:
+            self.power_up(power_type)
+
+    def player(self, rocket_type):
+        def build():
+            color, engine_color = Player.ROCKET_COLORS[rocket_type]
+            surface = pygame.Surface((40, 50), pygame.SRCALPHA)
+            pygame.draw.polygon(surface, color, [(20, 0), (0, 50), (40, 50)])
+            pygame.draw.rect(surface, engine_color, (15, 20, 10, 20))
+            return surface
+        return self.get(("player", rocket_type), build)
+
+    def flames(self):
+        frames = []
+        for frame in range(FLAME_FRAMES):
+            def build(frame=frame):
+                t = frame / max(1, FLAME_FRAMES - 1)
+                flame_length = 5 + round(5 * t)
+                flame_color = (255, 100 + round(100 * t), 0)  # RGB: red-orange
+                surface = pygame.Surface((40, 11), pygame.SRCALPHA)
+                pygame.draw.polygon(surface, flame_color, [
+                    (5, 0), (15, flame_length), (25, flame_length), (35, 0)
+                ])
+                return surface
+            frames.append(self.get(("flame", frame), build))
+        return frames
+
+    def shield(self):
+        def build():
+            surface = pygame.Surface((81, 81), pygame.SRCALPHA)
+            pygame.draw.circle(surface, (0, 100, 255), (40, 40), 40, 2)
+            return surface
+        return self.get(("shield",), build)
+
+    def enemy(self, enemy_type, width, height, color):
+        def build():
+            surface = pygame.Surface((width, height), pygame.SRCALPHA)
+            center = (width // 2, height // 2)
+            if enemy_type == EnemyType.ASTEROID:
+                pygame.draw.circle(surface, color, center, width // 2)
+                pygame.draw.circle(surface, (40, 140, 40), center, width // 4)
+            else:
+                surface.fill(color)
+                # Draw cockpit
+                pygame.draw.circle(surface, (50, 50, 50), center, width // 4)
+            return surface
+        return self.get(("enemy", enemy_type, width, height, color), build)
+
+    def boss(self, width, height, color):
+        def build():
+            surface = pygame.Surface((width, height), pygame.SRCALPHA)
+            pygame.draw.rect(surface, color, (0, 0, width, height), border_radius=10)
+            center = (width // 2, height // 2)
+            pygame.draw.circle(surface, (50, 50, 50), center, 20)
+            pygame.draw.circle(surface, (150, 150, 255), center, 10)
+            return surface
+        return self.get(("boss", width, height, color), build)
+
+    def projectile(self, weapon_type):
+        def build():
+            width, height, _, color = Projectile.STATS[weapon_type][:4]
+            if weapon_type == WeaponType.LASER:
+                surface = pygame.Surface((width, height), pygame.SRCALPHA)
+                pygame.draw.line(surface, color, (width // 2, height), (width // 2, 0), 4)
+            elif weapon_type == WeaponType.MISSILE:
+                surface = pygame.Surface((width, height + 11), pygame.SRCALPHA)
+                pygame.draw.rect(surface, color, (0, 0, width, height))
+                pygame.draw.polygon(surface, (255, 200, 0), [
+                    (0, height), (width, height), (width // 2, height + 10)
+                ])
+            else:
+                surface = pygame.Surface((width, height), pygame.SRCALPHA)
+                pygame.draw.circle(surface, color, (width // 2, height // 2), width // 2)
+            return surface
+        return self.get(("projectile", weapon_type), build)
+
+    def bullet(self, kind):
+        def build():
+            width, height, color = BULLET_KINDS[kind]
+            surface = pygame.Surface((width, height), pygame.SRCALPHA)
+            if kind == BULLET_LASER:
+                pygame.draw.line(surface, color, (width // 2, height), (width // 2, 0), width)
+            else:
+                pygame.draw.circle(surface, color, (width // 2, height // 2), width // 2)
+                pygame.draw.circle(surface, WHITE, (width // 2, height // 2), width // 4)
+            return surface
+        return self.get(("bullet", kind), build)
+
+    def power_up(self, power_type):
+        def build():
+            surface = pygame.Surface((30, 30), pygame.SRCALPHA)
+            rect = surface.get_rect()
+            pygame.draw.rect(surface, PowerUp.COLORS[power_type], rect, border_radius=5)
+            pygame.draw.rect(surface, WHITE, rect, 2, border_radius=5)
+            symbol = render_text(FONT_MD, PowerUp.SYMBOLS[power_type], True, WHITE)
+            surface.blit(symbol, (rect.centerx - symbol.get_width() // 2,
+                                  rect.centery - symbol.get_height() // 2))
+            return surface
+        return self.get(("power_up", power_type), build)
+
+
+ATLAS = SpriteAtlas()
+
+
+# Particle system
+MAX_PARTICLES = 4000  # Global cap on live explosion particles
+PARTICLE_COLOR_SHIFT = 5  # Sprite colors are quantized to steps of 1 << PARTICLE_COLOR_SHIFT
+
+
+class ParticleSystem:
+    """Fixed-capacity struct-of-arrays particle store.
+
+    Live particles occupy the first ``count`` slots of each array. ``update``
+    advances them all in one vectorized step and compacts survivors to the
+    front, so nothing is ever removed from a list. ``draw`` blits pre-rendered
+    circle sprites, built on first use per radius and quantized color.
+    """
+
+    def __init__(self, capacity=MAX_PARTICLES):
+        self.capacity = capacity
+        self.count = 0
+        self.x = np.zeros(capacity, dtype=np.float32)
+        self.y = np.zeros(capacity, dtype=np.float32)
+        self.dx = np.zeros(capacity, dtype=np.float32)
+        self.dy = np.zeros(capacity, dtype=np.float32)
+        self.size = np.zeros(capacity, dtype=np.int16)
+        self.color = np.zeros((capacity, 3), dtype=np.uint8)
+        self.life = np.zeros(capacity, dtype=np.int16)
+        self.rng = np.random.default_rng()  # Cosmetic only; never feeds gameplay
+        self.sprites = {}  # sprite key (see draw) -> circle sprite
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        self.count = 0
+
+    def emit(self, x, y, amount, max_size):
+        """Spawn ``amount`` particles at (x, y); extras beyond the cap are dropped."""
+        start = self.count
+        end = min(self.capacity, start + amount)
+        n = end - start
+        if n <= 0:
+            return
+        rng = self.rng
+        self.x[start:end] = x
+        self.y[start:end] = y
+        self.dx[start:end] = rng.uniform(-3, 3, n)
+        self.dy[start:end] = rng.uniform(-3, 3, n)
+        self.size[start:end] = rng.integers(2, max(2, max_size) + 1, n)
+        self.color[start:end, 0] = rng.integers(200, 256, n)
+        self.color[start:end, 1] = rng.integers(100, 201, n)
+        self.color[start:end, 2] = 0
+        self.life[start:end] = rng.integers(20, 41, n)
+        self.count = end
+
+    def update(self):
+        n = self.count
+        if not n:
+            return
+        self.x[:n] += self.dx[:n]
+        self.y[:n] += self.dy[:n]
+        self.life[:n] -= 1
+        alive = self.life[:n] > 0
+        survivors = int(np.count_nonzero(alive))
+        if survivors == n:
+            return
+        for arr in (self.x, self.y, self.dx, self.dy, self.size, self.color, self.life):
+            arr[:survivors] = arr[:n][alive]
+        self.count = survivors
+
+    def sprite(self, key):
+        """Circle sprite for a key packed as radius << 9 | quantized red << 6 | green << 3 | blue."""
+        radius = key >> 9
+        half_step = 1 << (PARTICLE_COLOR_SHIFT - 1)
+        color = [min(255, (((key >> shift) & 7) << PARTICLE_COLOR_SHIFT) + half_step) for shift in (6, 3, 0)]
+        sprite = pygame.Surface((radius * 2 + 1, radius * 2 + 1))
+        sprite.fill(BLACK)
+        pygame.draw.circle(sprite, color, (radius, radius), radius)
+        sprite.set_colorkey(BLACK, pygame.RLEACCEL)
+        if pygame.display.get_surface() is not None:
+            sprite = sprite.convert()
+        self.sprites[key] = sprite
+        return sprite
+
+    def draw(self, surface):
+        n = self.count
+        if not n:
+            return
+        size = self.size[:n].astype(np.int32)
+        color = (self.color[:n] >> PARTICLE_COLOR_SHIFT).astype(np.int32)
+        keys = (size << 9 | color[:, 0] << 6 | color[:, 1] << 3 | color[:, 2]).tolist()
+        sprites = self.sprites
+        for key in set(keys).difference(sprites):
+            self.sprite(key)
+        xs = (self.x[:n].astype(np.int32) - size).tolist()
+        ys = (self.y[:n].astype(np.int32) - size).tolist()
+        surface.blits(zip(map(sprites.__getitem__, keys), zip(xs, ys)), doreturn=False)
+
+
+# Enemy bullets
+MAX_BULLETS = 8192  # Global cap on live enemy bullets
+BULLET_LIFE = 900  # Ticks before a bullet expires even if still on screen
+BULLET_MARGIN = 32  # Bullets are culled this far outside the screen
+BULLET_LASER = 0
+BULLET_ORB = 1
+# Per-kind (width, height, color); bullets are positioned by their center
+BULLET_KINDS = [
+    (4, 15, (255, 60, 60)),
+    (10, 10, (255, 90, 220))
+]
+
+
+class BulletStore:
+    """Fixed-capacity struct-of-arrays store for every enemy and boss bullet.
+
+    Like ParticleSystem, live bullets occupy the first ``count`` slots.
+    ``update`` moves, ages and culls them all at once, and ``take_hits``
+    finds and removes the bullets overlapping a rect in one vectorized test.
+    """
+
+    def __init__(self, capacity=MAX_BULLETS):
+        self.capacity = capacity
+        self.count = 0
+        self.x = np.zeros(capacity, dtype=np.float32)
+        self.y = np.zeros(capacity, dtype=np.float32)
+        self.vx = np.zeros(capacity, dtype=np.float32)
+        self.vy = np.zeros(capacity, dtype=np.float32)
+        self.damage = np.zeros(capacity, dtype=np.int16)
+        self.age = np.zeros(capacity, dtype=np.int16)
+        self.kind = np.zeros(capacity, dtype=np.int8)
+        sizes = np.array([kind[:2] for kind in BULLET_KINDS], dtype=np.float32) / 2
+        self.half_width, self.half_height = sizes[:, 0], sizes[:, 1]
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        self.count = 0
+
+    def emit(self, x, y, vx, vy, damage, kind=BULLET_LASER):
+        """Spawn bullets; every argument may be a scalar or an array. Extras beyond the cap are dropped."""
+        x, y, vx, vy = np.broadcast_arrays(x, y, vx, vy)
+        start = self.count
+        end = min(self.capacity, start + x.size)
+        n = end - start
+        if n <= 0:
+            return
+        self.x[start:end] = x.ravel()[:n]
+        self.y[start:end] = y.ravel()[:n]
+        self.vx[start:end] = vx.ravel()[:n]
+        self.vy[start:end] = vy.ravel()[:n]
+        self.damage[start:end] = damage
+        self.age[start:end] = 0
+        self.kind[start:end] = kind
+        self.count = end
+
+    def keep(self, alive):
+        """Compact the bullets where ``alive`` is True to the front."""
+        n = self.count
+        survivors = int(np.count_nonzero(alive))
+        if survivors == n:
+            return
+        for arr in (self.x, self.y, self.vx, self.vy, self.damage, self.age, self.kind):
+            arr[:survivors] = arr[:n][alive]
+        self.count = survivors
+
+    def update(self):
+        n = self.count
+        if not n:
+            return
+        x, y = self.x[:n], self.y[:n]
+        x += self.vx[:n]
+        y += self.vy[:n]
+        self.age[:n] += 1
+        self.keep((x > -BULLET_MARGIN) & (x < WIDTH + BULLET_MARGIN) & (y > -BULLET_MARGIN) &
+                  (y < HEIGHT + BULLET_MARGIN) & (self.age[:n] < BULLET_LIFE))
+
+    def take_hits(self, rect):
+        """Remove the bullets overlapping ``rect``; return their (damage, x, y)."""
+        n = self.count
+        if not n:
+            return []
+        kind = self.kind[:n]
+        x, y = self.x[:n], self.y[:n]
+        half_width, half_height = self.half_width[kind], self.half_height[kind]
+        hit = ((x + half_width > rect.left) & (x - half_width < rect.right) &
+               (y + half_height > rect.top) & (y - half_height < rect.bottom))
+        if not hit.any():
+            return []
+        hits = list(zip(self.damage[:n][hit].tolist(), x[hit].astype(np.int32).tolist(),
+                        y[hit].astype(np.int32).tolist()))
+        self.keep(~hit)
+        return hits
+
+    def snapshot(self):
+        """The live bullets' arrays as bytes, one array after another."""
+        n = self.count
+        return b"".join(arr[:n].tobytes() for arr in (self.x, self.y, self.vx, self.vy, self.damage, self.age, self.kind))
+
+    def restore(self, data, offset, count):
+        """Load ``count`` bullets from a ``snapshot`` starting at ``offset``; returns the offset after them."""
+        for arr in (self.x, self.y, self.vx, self.vy, self.damage, self.age, self.kind):
+            arr[:count] = np.frombuffer(data, arr.dtype, count, offset)
+            offset += count * arr.itemsize
+        self.count = count
+        return offset
+
+    def snapshot_size(self, count):
+        return count * sum(arr.itemsize for arr in (self.x, self.y, self.vx, self.vy, self.damage, self.age, self.kind))
+
+    def draw(self, surface, lag=0.0):
+        """Blit every bullet, drawn ``lag`` ticks back along its velocity (for interpolation)."""
+        n = self.count
+        if not n:
+            return
+        kind = self.kind[:n]
+        moved = (self.age[:n] > 0) * lag  # Bullets fired this tick have no previous position
+        xs = (self.x[:n] - self.half_width[kind] - self.vx[:n] * moved).astype(np.int32).tolist()
+        ys = (self.y[:n] - self.half_height[kind] - self.vy[:n] * moved).astype(np.int32).tolist()
+        sprites = [ATLAS.bullet(index) for index in range(len(BULLET_KINDS))]
+        surface.blits(list(zip(map(sprites.__getitem__, kind.tolist()), zip(xs, ys))), doreturn=False)
+
+
+# Bullet patterns. A pattern fires ``volleys`` volleys, one every ``interval``
+# ticks. Each volley is ``count`` bullets: "line" fires them side by side
+# ``gap`` pixels apart, "fan" spreads them over ``spread`` degrees and "ring"
+# spaces them evenly around a circle. The heading is straight down, or at the
+# nearest player when ``aimed``, and turns ``spin`` degrees per volley
+# (a spinning ring is a spiral).
+class BulletPattern:
+    __slots__ = ("shape", "count", "speed", "damage", "kind", "volleys", "interval", "spread", "gap",
+                 "spin", "aimed")
+
+    def __init__(self, shape, count=1, speed=4, damage=10, kind=BULLET_ORB, volleys=1, interval=1,
+                 spread=0, gap=0, spin=0, aimed=False):
+        self.shape = shape
+        self.count = count
+        self.speed = speed
+        self.damage = damage
+        self.kind = kind
+        self.volleys = volleys
+        self.interval = interval
+        self.spread = math.radians(spread)
+        self.gap = gap
+        self.spin = math.radians(spin)
+        self.aimed = aimed
+
+    def duration(self):
+        return self.volleys * self.interval
+
+    def fire(self, bullets, x, y, volley, target):
+        """Emit volley number ``volley`` from (x, y); ``target`` is the (x, y) aimed at."""
+        heading = math.atan2(target[1] - y, target[0] - x) if self.aimed else math.pi / 2
+        heading += self.spin * volley
+        steps = np.arange(self.count, dtype=np.float64)
+        xs = x
+        if self.shape == "ring":
+            angles = heading + steps * (2 * math.pi / self.count)
+        elif self.shape == "fan" and self.count > 1:
+            angles = heading - self.spread / 2 + steps * (self.spread / (self.count - 1))
+        else:
+            angles = np.full(self.count, heading)
+            if self.shape == "line":
+                xs = x + (steps - (self.count - 1) / 2) * self.gap
+        bullets.emit(xs, y, np.cos(angles) * self.speed, np.sin(angles) * self.speed, self.damage, self.kind)
+
+
+BULLET_PATTERNS = {
+    "triple": BulletPattern("line", count=3, speed=15, damage=30, kind=BULLET_LASER, gap=40),
+    "fan": BulletPattern("fan", count=5, speed=5, spread=60, volleys=3, interval=12, aimed=True),
+    "fan_wide": BulletPattern("fan", count=11, speed=4, spread=150, volleys=4, interval=10, spin=6),
+    "aimed_burst": BulletPattern("fan", count=1, speed=8, volleys=8, interval=5, aimed=True),
+    "ring": BulletPattern("ring", count=24, speed=3, volleys=3, interval=20, spin=7.5),
+    "ring_dense": BulletPattern("ring", count=48, speed=3, volleys=6, interval=10, spin=3.75),
+    "spiral": BulletPattern("ring", count=4, speed=3, volleys=60, interval=2, spin=11),
+    "double_spiral": BulletPattern("ring", count=8, speed=2.5, volleys=180, interval=1, spin=-3.5),
+    "ring_storm": BulletPattern("ring", count=64, speed=2, volleys=12, interval=8, spin=2.8)
+}
+
+# Boss attack cycles by minimum level. Each phase fires its patterns together;
+# "shield" raises the boss shield instead of firing.
+BOSS_PHASES = [
+    (1, [("triple",), ("shield",)]),
+    (10, [("triple",), ("fan",), ("shield",)]),
+    (25, [("aimed_burst", "fan"), ("ring",), ("triple", "shield")]),
+    (50, [("spiral", "ring_dense", "aimed_burst"), ("ring_storm", "fan"), ("shield", "spiral", "ring_dense")]),
+    (75, [("double_spiral", "ring_storm"), ("spiral", "fan_wide", "ring_dense", "aimed_burst"),
+          ("shield", "double_spiral", "ring_storm")])
+]
+
+
+def boss_phases(level):
+    return [phases for min_level, phases in BOSS_PHASES if level >= min_level][-1]
+
+
+# Scrolling starfield
+STAR_COUNT = 200
+STAR_LAYERS = 3
+
+
+class Starfield:
+    """Parallax starfield with positions in arrays and pre-rendered star sprites.
+
+    Stars are split evenly across ``layers``; nearer layers are larger,
+    brighter and faster. ``update`` scrolls every star in one vectorized step
+    and ``draw`` submits them all in a single ``Surface.blits`` call.
+    Scrolling is measured in ticks, so its speed doesn't depend on the frame rate.
+    """
+
+    def __init__(self, count=STAR_COUNT, layers=STAR_LAYERS, width=None, height=None):
+        self.width = WIDTH if width is None else width
+        self.height = HEIGHT if height is None else height
+        self.rng = np.random.default_rng()  # Cosmetic only
+        layers = max(1, layers)
+        per_layer = [count // layers + (1 if i < count % layers else 0) for i in range(layers)]
+
+        self.sprites = []
+        speeds = []
+        radii = []
+        for layer, n in enumerate(per_layer):
+            depth = layer / (layers - 1) if layers > 1 else 1.0
+            radius = 1 + round(depth * 2)
+            shade = int(140 + 115 * depth)
+            sprite = pygame.Surface((radius * 2 + 1, radius * 2 + 1))
+            sprite.fill(BLACK)
+            pygame.draw.circle(sprite, (shade, shade, shade), (radius, radius), radius)
+            sprite.set_colorkey(BLACK, pygame.RLEACCEL)
+            if pygame.display.get_surface() is not None:
+                sprite = sprite.convert()
+            self.sprites.extend([sprite] * n)
+            base = 0.5 + 1.5 * depth
+            speeds.append(self.rng.uniform(base * 0.8, base * 1.2, n))
+            radii.append(np.full(n, radius))
+
+        self.count = count
+        self.speed = np.concatenate(speeds).astype(np.float32)
+        radius = np.concatenate(radii)
+        self.sizes = (radius * 2 + 1).tolist()
+        # Positions are stored as sprite top-left corners
+        self.x = (self.rng.uniform(0, self.width, count) - radius).astype(np.float32)
+        self.y = (self.rng.uniform(0, self.height, count) - radius).astype(np.float32)
+
+    def update(self, ticks=1.0):
+        """Scroll by ``ticks`` simulation ticks' worth (fractions allowed)."""
+        self.y += self.speed * ticks
+        wrapped = self.y > self.height
+        if wrapped.any():
+            self.y[wrapped] = 0
+            self.x[wrapped] = self.rng.uniform(0, self.width, int(np.count_nonzero(wrapped)))
+
+    def rects(self):
+        """Screen rects currently covered by each star sprite."""
+        Rect = pygame.Rect
+        return [Rect(x, y, size, size) for x, y, size in
+                zip(self.x.astype(np.int32).tolist(), self.y.astype(np.int32).tolist(), self.sizes)]
+
+    def draw(self, surface):
+        positions = zip(self.x.astype(np.int32).tolist(), self.y.astype(np.int32).tolist())
+        surface.blits(zip(self.sprites, positions), doreturn=False)
+
+
+# Broad-phase collision grid
+GRID_CELL_SIZE = 64
+GRID_MIN_PAIRS = 2000  # Below this many projectile/enemy pairs a flat scan is faster
+
+
+class SpatialHash:
+    """Uniform grid that buckets integer keys by the cells their rects overlap.
+
+    Rebuilt each tick with ``clear()``/``insert()``; ``query()`` returns the
+    sorted keys of everything sharing a cell with the given rect, so callers
+    only run ``colliderect`` against nearby candidates.
+    """
+
+    def __init__(self, cell_size=GRID_CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}
+
+    def clear(self):
+        self.cells.clear()
+
+    def insert(self, key, rect):
+        size = self.cell_size
+        cells = self.cells
+        x0, x1 = rect.left // size, (rect.right - 1) // size
+        y0, y1 = rect.top // size, (rect.bottom - 1) // size
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                bucket = cells.get((cx, cy))
+                if bucket is None:
+                    cells[(cx, cy)] = [key]
+                else:
+                    bucket.append(key)
+
+    def query(self, rect):
+        size = self.cell_size
+        cells = self.cells
+        x0, x1 = rect.left // size, (rect.right - 1) // size
+        y0, y1 = rect.top // size, (rect.bottom - 1) // size
+        if x0 == x1 and y0 == y1:
+            # Buckets are filled in key order, so a single cell is already sorted
+            return cells.get((x0, y0), ())
+        found = set()
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                bucket = cells.get((cx, cy))
+                if bucket:
+                    found.update(bucket)
+        return sorted(found)
+
+    def query_radius(self, x, y, radius):
+        """Keys sharing a cell with the circle's bounding square; callers test the exact distance."""
+        return self.query(pygame.Rect(x - radius, y - radius, 2 * radius + 1, 2 * radius + 1))
+
+
+def rect_distance(rect, x, y):
+    """Distance from (x, y) to the nearest point of ``rect`` (0 inside it)."""
+    dx = max(rect.left - x, 0, x - rect.right)
+    dy = max(rect.top - y, 0, y - rect.bottom)
+    return math.hypot(dx, dy)
+
+
+# Render targets
+class RenderTargets:
+    """Owns the reusable back-buffer and full-screen overlays for one resolution.
+
+    Surfaces are allocated once per size instead of once per frame, and not
+    until the first ``resize`` (headless games never draw). Overlays are
+    opaque black surfaces with a per-surface alpha, which blit faster than
+    per-pixel ``SRCALPHA`` fills.
+    """
+
+    def __init__(self, size=None):
+        self.size = None
+        self.back_buffer = None
+        self.overlays = {}
+        self.menu = None
+        if size is not None:
+            self.resize(size)
+
+    def resize(self, size):
+        size = tuple(size)
+        if size == self.size:
+            return
+        self.size = size
+        self.back_buffer = self._new_surface()
+        self.overlays = {}
+        self.menu = None
+
+    def _new_surface(self):
+        surface = pygame.Surface(self.size)
+        if pygame.display.get_surface() is not None:
+            surface = surface.convert()
+        return surface
+
+    def menu_layer(self):
+        """Transparent layer that caches the static layout of a menu screen."""
+        if self.menu is None:
+            self.menu = pygame.Surface(self.size, pygame.SRCALPHA)
+        return self.menu
+
+    def overlay(self, alpha):
+        """Return a cached black overlay with the given alpha (0-255)."""
+        overlay = self.overlays.get(alpha)
+        if overlay is None:
+            overlay = self._new_surface()
+            overlay.fill(BLACK)
+            overlay.set_alpha(alpha)
+            self.overlays[alpha] = overlay
+        return overlay
+
+    def present(self, target, offset=(0, 0)):
+        """Blit the back-buffer to ``target`` shifted by ``offset`` (camera shake).
+
+        Only the strips uncovered by the shift are cleared, so shaking costs a
+        single full-screen blit rather than an extra full-screen fill.
+        """
+        ox, oy = offset
+        width, height = self.size
+        if ox > 0:
+            target.fill(BLACK, (0, 0, ox, height))
+        elif ox < 0:
+            target.fill(BLACK, (width + ox, 0, -ox, height))
+        if oy > 0:
+            target.fill(BLACK, (0, 0, width, oy))
+        elif oy < 0:
+            target.fill(BLACK, (0, height + oy, width, -oy))
+        target.blit(self.back_buffer, offset)
+
+    def allocated_bytes(self):
+        """Pixel memory held by the back-buffer, overlays and menu layer."""
+        surfaces = [self.back_buffer, self.menu] + list(self.overlays.values())
+        surfaces = [surface for surface in surfaces if surface is not None]
+        return sum(surface.get_pitch() * surface.get_height() for surface in surfaces)
+
+
+# Frame profiler
+PROFILE_FRAMES = 600  # Ring buffer length (10 seconds at 60 fps)
+PROFILE_TRACE_PATH = "profile_trace"  # .csv/.json are appended on export
+PROFILE_OVERLAY_INTERVAL = 15  # Frames between overlay text refreshes
+
+
+class FrameProfiler:
+    """Per-phase frame timing in fixed-size ring buffers.
+
+    Phases are timed with ``time.perf_counter_ns`` and summed per frame
+    (several simulation ticks can land in one frame). When ``enabled`` is
+    False, ``call`` is a plain passthrough and frames are not recorded.
+    """
+
+    def __init__(self, capacity=PROFILE_FRAMES, enabled=False):
+        self.capacity = capacity
+        self.enabled = enabled
+        self.frame = 0  # Frames recorded so far
+        self.samples = {}  # phase -> int64 ring of ns per frame
+        self.counts = {}  # counter -> int32 ring of values per frame
+        self.current = {}  # phase -> ns accumulated in the frame being recorded
+        self.overlay = None  # Cached overlay surface, refreshed every PROFILE_OVERLAY_INTERVAL frames
+        self.overlay_frame = -PROFILE_OVERLAY_INTERVAL
+
+    def time(self, name, function, *args):
+        start = time.perf_counter_ns()
+        result = function(*args)
+        self.current[name] = self.current.get(name, 0) + time.perf_counter_ns() - start
+        return result
+
+    def call(self, name, function, *args):
+        if self.enabled:
+            return self.time(name, function, *args)
+        return function(*args)
+
+    def end_frame(self, counts=None):
+        """Commit the current frame's phase totals (and entity counts) to the rings."""
+        if not self.enabled:
+            return
+        slot = self.frame % self.capacity
+        for name, ring in self.samples.items():
+            ring[slot] = self.current.pop(name, 0)
+        for name, value in self.current.items():
+            ring = self.samples[name] = np.zeros(self.capacity, dtype=np.int64)
+            ring[slot] = value
+        self.current = {}
+        for name, value in (counts or {}).items():
+            ring = self.counts.get(name)
+            if ring is None:
+                ring = self.counts[name] = np.zeros(self.capacity, dtype=np.int32)
+            ring[slot] = value
+        self.frame += 1
+
+    def _ordered(self, rings):
+        """Ring contents oldest-first."""
+        filled = min(self.frame, self.capacity)
+        start = self.frame % self.capacity if self.frame > self.capacity else 0
+        return {name: np.roll(ring, -start)[:filled] for name, ring in rings.items()}
+
+    def summary(self):
+        """Rolling mean/p95/p99 in milliseconds for every phase."""
+        stats = {}
+        for name, values in self._ordered(self.samples).items():
+            if len(values):
+                mean, p95, p99 = values.mean(), np.percentile(values, 95), np.percentile(values, 99)
+                stats[name] = {"mean": float(mean) / 1e6, "p95": float(p95) / 1e6, "p99": float(p99) / 1e6}
+        return stats
+
+    def dump(self, path=PROFILE_TRACE_PATH):
+        """Write the buffered trace as ``path.csv`` and ``path.json``."""
+        phases = self._ordered(self.samples)
+        counts = self._ordered(self.counts)
+        columns = list(phases) + ["n_" + name for name in counts]
+        rows = zip(*(list(phases.values()) + list(counts.values())))
+        first = max(0, self.frame - self.capacity)
+        with open(path + ".csv", "w") as file:
+            file.write(",".join(["frame"] + columns) + "\n")
+            for i, row in enumerate(rows):
+                file.write(",".join(str(v) for v in [first + i] + [int(v) for v in row]) + "\n")
+        with open(path + ".json", "w") as file:
+            json.dump({
+                "first_frame": first,
+                "phases_ns": {name: values.tolist() for name, values in phases.items()},
+                "counts": {name: values.tolist() for name, values in counts.items()},
+                "summary_ms": self.summary()
+            }, file)
+
+    def draw(self, surface):
+        """Blit the rolling stats table (milliseconds per frame) to ``surface``."""
+        if self.overlay is None or self.frame - self.overlay_frame >= PROFILE_OVERLAY_INTERVAL:
+            self.overlay_frame = self.frame
+            lines = [f"{'phase':<20}{'mean':>8}{'p95':>8}{'p99':>8}"]
+            for name, stat in self.summary().items():
+                lines.append(f"{name:<20}{stat['mean']:8.3f}{stat['p95']:8.3f}{stat['p99']:8.3f}")
+            for name, values in self._ordered(self.counts).items():
+                if len(values):
+                    lines.append(f"{'n_' + name:<20}{int(values[-1]):8d}")
+            # Rendered directly: the numbers change constantly and would churn TEXT_CACHE
+            texts = [FONT_SM.render(line, True, GREEN) for line in lines]
+            self.overlay = pygame.Surface((max(text.get_width() for text in texts) + 10,
+                                           sum(text.get_height() for text in texts) + 10))
+            self.overlay.set_alpha(200)
+            y = 5
+            for text in texts:
+                self.overlay.blit(text, (5, y))
+                y += text.get_height()
+        surface.blit(self.overlay, (10, 120))
+
+
+# Gameplay events
+class GameEvent(Enum):
+    SHOT_FIRED = 0
+    SHOT_MISSED = 1  # A player projectile left the screen without hitting anything
+    ENEMY_KILLED = 2
+    DAMAGE_TAKEN = 3  # value: hit points lost
+    COIN_COLLECTED = 4  # value: coins
+    BOSS_DEFEATED = 5  # value: ticks the fight lasted
+    LEVEL_STARTED = 6  # value: level
+    LEVEL_COMPLETED = 7  # value: level
+    WEAPON_UNLOCKED = 8  # value: weapons now unlocked
+
+
+class EventBus:
+    """Synchronous publish/subscribe for gameplay events.
+
+    Handlers are called as ``handler(event, value)``. Emitting an event with
+    no subscribers is a single dict lookup.
+    """
+
+    def __init__(self):
+        self.handlers = {}
+
+    def subscribe(self, event, handler):
+        self.handlers.setdefault(event, []).append(handler)
+
+    def emit(self, event, value=1):
+        for handler in self.handlers.get(event, ()):
+            handler(event, value)
+
+    def clear(self):
+        self.handlers = {}
+
+
+# Achievement and challenge rules
+class Rule:
+    """An achievement or challenge driven by one gameplay event.
+
+    ``mode`` says how each ``event`` counts towards ``target``:
+    "count" adds one, "total" adds the event's value, "reach" keeps the
+    highest value and "within" completes on a value at or below the target.
+    Any event in ``reset_on`` zeroes the counter and clears a failure; any
+    event in ``fail_on`` blocks progress until the next reset.
+    """
+    __slots__ = ("name", "description", "event", "mode", "target", "reset_on", "fail_on", "reward",
+                 "count", "failed", "done")
+
+    def __init__(self, name, description, event, mode, target, reset_on=(), fail_on=(), reward=0):
+        self.name = name
+        self.description = description
+        self.event = event
+        self.mode = mode
+        self.target = target
+        self.reset_on = reset_on
+        self.fail_on = fail_on
+        self.reward = reward
+        self.count = 0
+        self.failed = False
+        self.done = False
+
+    def progress(self, value):
+        """Apply one occurrence of ``event``; return True once the rule completes."""
+        if self.failed:
+            return False
+        if self.mode == "count":
+            self.count += 1
+        elif self.mode == "total":
+            self.count += value
+        elif self.mode == "reach":
+            self.count = max(self.count, value)
+        elif self.mode == "within":
+            return value <= self.target
+        return self.count >= self.target
+
+
+def achievement_rules():
+    return [
+        Rule("First Blood", "Destroy your first enemy", GameEvent.ENEMY_KILLED, "count", 1),
+        Rule("Coin Collector", "Collect 100 coins", GameEvent.COIN_COLLECTED, "total", 100),
+        Rule("Boss Slayer", "Defeat your first boss", GameEvent.BOSS_DEFEATED, "count", 1),
+        Rule("Weapon Master", "Unlock all weapons", GameEvent.WEAPON_UNLOCKED, "reach", 3),
+        Rule("Ultimate Pilot", "Complete all levels", GameEvent.LEVEL_COMPLETED, "reach", 100)
+    ]
+
+
+def challenge_rules():
+    return [
+        Rule("No Damage", "Complete a level without taking damage", GameEvent.LEVEL_COMPLETED, "count", 1,
+             reset_on=(GameEvent.LEVEL_STARTED,), fail_on=(GameEvent.DAMAGE_TAKEN,), reward=100),
+        Rule("Boss Rush", "Defeat a boss in under 30 seconds", GameEvent.BOSS_DEFEATED, "within",
+             30 * TICK_RATE, reward=200),
+        Rule("Coin Hoarder", "Collect 50 coins in one level", GameEvent.COIN_COLLECTED, "total", 50,
+             reset_on=(GameEvent.LEVEL_STARTED,), reward=150),
+        Rule("Perfect Accuracy", "Destroy 20 enemies without missing", GameEvent.ENEMY_KILLED, "count", 20,
+             reset_on=(GameEvent.SHOT_MISSED,), reward=100)
+    ]
+
+
+class AchievementEngine:
+    """Evaluates rules as events arrive instead of polling every frame.
+
+    Rules are indexed by the events they react to, so an event only touches
+    the rules that care about it, and completed rules drop out of the index.
+    ``on_complete(rule)`` is called once per completed rule.
+    """
+
+    def __init__(self, bus, rules, on_complete):
+        self.rules = rules
+        self.on_complete = on_complete
+        self.index = {}  # event -> [(rule, role)], role is "progress", "reset" or "fail"
+        self.reindex()
+        for event in {event for rule in rules for event in (rule.event, *rule.reset_on, *rule.fail_on)}:
+            bus.subscribe(event, self.handle)
+
+    def reindex(self):
+        self.index = {}
+        for rule in self.rules:
+            if rule.done:
+                continue
+            self.index.setdefault(rule.event, []).append((rule, "progress"))
+            for event in rule.reset_on:
+                self.index.setdefault(event, []).append((rule, "reset"))
+            for event in rule.fail_on:
+                self.index.setdefault(event, []).append((rule, "fail"))
+
+    def handle(self, event, value):
+        completed = []
+        for rule, role in self.index.get(event, ()):
+            if role == "reset":
+                rule.count = 0
+                rule.failed = False
+            elif role == "fail":
+                rule.failed = True
+            elif rule.progress(value):
+                completed.append(rule)
+        for rule in completed:
+            rule.done = True
+            for event, entries in self.index.items():
+                self.index[event] = [entry for entry in entries if entry[0] is not rule]
+            self.on_complete(rule)
+
+    def counters(self):
+        """Progress of unfinished rules, for saving."""
+        return {rule.name: rule.count for rule in self.rules if not rule.done and rule.count}
+
+    def restore(self, states):
+        """Set every rule's (count, failed, done), in ``rules`` order, as a snapshot recorded them."""
+        for rule, (count, failed, done) in zip(self.rules, states):
+            rule.count, rule.failed, rule.done = count, failed, done
+        self.reindex()
+
+
+# Save store
+SAVE_PATH = "profile.json"
+SAVE_VERSION = 1
+SAVE_COALESCE_SECONDS = 0.5  # Writes requested within this window are flushed together
+# Pre-store save files, merged into the profile the first time it is created
+LEGACY_SAVE_FILES = {
+    "high_score.json": None,  # Top-level keys map straight onto the profile
+    "achievements.json": "achievements",
+    "challenges.json": "challenges"
+}
+
+
+class SaveStore:
+    """One versioned JSON profile holding scores, progress and settings.
+
+    The file is read on first access. ``set`` only updates the in-memory copy
+    and wakes a background writer, which waits SAVE_COALESCE_SECONDS so bursts
+    of changes become one write. Each write goes to a temp file which is
+    fsynced and renamed over the profile, so a crash mid-write leaves the
+    previous profile intact. With ``path=None`` the store is memory-only.
+    The same writer also saves whole files queued with ``write_file`` (replays,
+    quick-saves) and reads files ahead for ``preload``, keeping their latest
+    contents in memory, so the frame path never touches the disk.
+    """
+
+    def __init__(self, path=SAVE_PATH):
+        self.path = path
+        self.data = None
+        self.lock = threading.Lock()  # Guards data, changes and files
+        self.write_lock = threading.Lock()  # Held from serializing to renaming, so writes land in order
+        self.pending = threading.Event()
+        self.writer = None
+        self.changes = 0  # Bumped by every set()
+        self.written = 0  # Value of ``changes`` the file on disk reflects
+        self.files = {}  # path -> bytes queued by write_file()
+        self.reads = set()  # Paths queued by preload()
+        self.cache = {}  # path -> latest bytes (None if there is no file), from preload() or write_file()
+
+    def load(self):
+        if self.data is not None:
+            return self.data
+        data = {}
+        if self.path:
+            try:
+                with open(self.path, "r") as file:
+                    data = json.load(file)
+            except FileNotFoundError:
+                data = self.load_legacy()
+            except (OSError, ValueError):
+                data = {}  # Unreadable profile: start fresh rather than crash
+        self.data = self.migrate(data)
+        return self.data
+
+    def load_legacy(self):
+        data = {}
+        for path, key in LEGACY_SAVE_FILES.items():
+            try:
+                with open(path, "r") as file:
+                    value = json.load(file)
+            except (OSError, ValueError):
+                continue
+            if key is None:
+                data.update(value)
+            else:
+                data[key] = value
+        return data
+
+    def migrate(self, data):
+        """Bring ``data`` up to SAVE_VERSION."""
+        if data.get("version", 0) < 1:
+            data.setdefault("high_score", 0)
+            data.setdefault("unlocked_levels", 1)
+            data.setdefault("achievements", [])
+            data.setdefault("challenges", [])
+            data.setdefault("settings", {})
+        data["version"] = SAVE_VERSION
+        return data
+
+    def get(self, key, default=None):
+        """Return a copy of ``key``'s value so callers can mutate it freely."""
+        with self.lock:
+            return copy.deepcopy(self.load().get(key, default))
+
+    def set(self, key, value):
+        """Store a copy of ``value`` and schedule a write. Never touches the disk."""
+        value = copy.deepcopy(value)
+        with self.lock:
+            self.load()[key] = value
+            self.changes += 1
+        if self.path:
+            self.wake()
+
+    def write_file(self, path, data):
+        """Queue ``data`` (bytes) to be written atomically to ``path`` by the background writer."""
+        with self.lock:
+            self.files[path] = data
+            self.cache[path] = data
+        self.wake()
+
+    def preload(self, path):
+        """Have the background writer read ``path`` so cached_file() can return it."""
+        with self.lock:
+            if path in self.cache:
+                return
+            self.reads.add(path)
+        self.wake()
+
+    def cached_file(self, path):
+        """Latest contents of a preloaded or written ``path``: None if not read yet, or if there is no file."""
+        with self.lock:
+            return self.cache.get(path)
+
+    def wake(self):
+        if self.writer is None:
+            self.writer = threading.Thread(target=self.write_behind, name="save-store", daemon=True)
+            self.writer.start()
+        self.pending.set()
+
+    def write_behind(self):
+        while True:
+            self.pending.wait()
+            time.sleep(SAVE_COALESCE_SECONDS)
+            self.pending.clear()
+            self.write()
+            self.read_ahead()
+
+    def read_ahead(self):
+        with self.lock:
+            reads, self.reads = self.reads, set()
+        for path in reads:
+            try:
+                with open(path, "rb") as file:
+                    data = file.read()
+            except OSError:
+                data = None
+            with self.lock:
+                self.cache.setdefault(path, data)  # A write_file() meanwhile is newer
+
+    def write(self):
+        """Write the profile if it changed since the last write, then any queued files.
+
+        Serializing and writing both happen under ``write_lock``, so a call
+        waits for a write in progress and then writes data at least as new:
+        stale data never replaces newer data on disk.
+        """
+        with self.write_lock:
+            with self.lock:
+                changes = self.changes
+                text = json.dumps(self.data) if self.path and changes != self.written else None
+                files, self.files = self.files, {}
+            if text is not None:
+                self.replace(self.path, text.encode("utf-8"))
+                self.written = changes
+            for path, data in files.items():
+                self.replace(path, data)
+
+    @staticmethod
+    def replace(path, data):
+        temp = f"{path}.{os.getpid()}.tmp"  # Per process: two local co-op peers share the profile
+        with open(temp, "wb") as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp, path)
+
+    def flush(self):
+        """Write everything pending now, after any write already in progress (call on exit)."""
+        self.pending.clear()
+        self.write()
+
+
+# World snapshots: the simulation packed into bytes for rewind, quick-saves and
+# rollback. Every entity is one fixed-size record; what follows from its type
+# or level (weapon stats, enemy cooldown ranges, boss attack phases, sprites)
+# is rebuilt on restore instead of stored. Cosmetics (particles, camera shake)
+# are not part of the simulation and are left out; achievement and challenge
+# progress is, since completed challenges pay out coins.
+SNAPSHOT_MAGIC = b"SNAP"
+SNAPSHOT_VERSION = 2
+# magic, version, render width, height, state, level, enemies defeated, enemies to defeat, boss active,
+# boss ticks, coins collected, enemies killed, damage taken, then the record counts: players,
+# projectiles, enemies, power-ups, bullets, boss (0 or 1), rules
+SNAPSHOT_HEADER = struct.Struct("<4sBHHBHII?IiiiBHHHHBB")
+SNAPSHOT_RNG = struct.Struct("<625I?d")  # Mersenne Twister words and position, cached gauss value
+# rect, width, height, speed, health, max health, coins, weapon, power, unlocked count and weapons,
+# rapid fire, shield, shield timer, score, lives, rocket, kills, shoot cooldown, rapid fire timer
+SNAPSHOT_PLAYER = struct.Struct("<4i3i3iBBB3B??iiiBiii")
+# type, level, width, height, speed, health, color, value, shoot cooldown, drop chance, rect,
+# original position, angle, oscillation
+SNAPSHOT_ENEMY = struct.Struct("<BHiidi3Biid4i2ddd")
+SNAPSHOT_PROJECTILE = struct.Struct("<BB4d4i")  # type, power, x, y, vx, vy, rect
+SNAPSHOT_POWER_UP = struct.Struct("<B4ii")  # type, rect, speed
+# width, height, rect, speed, health, max health, direction, phase, phase tick, color, shield,
+# shield timer, level, value, shield cooldown
+SNAPSHOT_BOSS = struct.Struct("<ii4idiibBi3B?iHii")
+SNAPSHOT_RULE = struct.Struct("<i??")  # count, failed, done (achievement rules, then challenge rules)
+WEAPON_NAMES = list(WEAPON_TYPES)
+ROCKET_TYPES = list(Player.ROCKET_COLORS)
+
+# Rewind (hold Backspace) and the quick-save slot (F5 saves, F9 loads)
+REWIND_SECONDS = 10  # How far back the rewind buffer reaches
+REWIND_INTERVAL = 6  # Ticks of play between rewind snapshots
+REWIND_SPEED = 2  # Rewinding runs this many times faster than play
+QUICKSAVE_PATH = "quicksave.snap"
+
+
+def pack_player(player):
+    unlocked = [WEAPON_NAMES.index(weapon) for weapon in player.weapons_unlocked]
+    return SNAPSHOT_PLAYER.pack(
+        *player.rect, player.width, player.height, player.speed, player.health, player.max_health, player.coins,
+        WEAPON_NAMES.index(player.weapon_type), player.weapon_power, len(unlocked), *(unlocked + [0, 0, 0])[:3],
+        player.rapid_fire, player.shield, player.shield_timer, player.score, player.lives,
+        ROCKET_TYPES.index(player.rocket_type), player.kills, player.shoot_cooldown, player.rapid_fire_timer)
+
+
+def unpack_player(fields):
+    player = Player()
+    (x, y, w, h, player.width, player.height, player.speed, player.health, player.max_health, player.coins, weapon,
+     player.weapon_power, unlocked_count, *unlocked) = fields[:16]
+    (player.rapid_fire, player.shield, player.shield_timer, player.score, player.lives, rocket, player.kills,
+     player.shoot_cooldown, player.rapid_fire_timer) = fields[16:]
+    player.rect.update(x, y, w, h)
+    player.weapon_type = WEAPON_NAMES[weapon]
+    player.weapons_unlocked = [WEAPON_NAMES[index] for index in unlocked[:unlocked_count]]
+    player.rocket_type = ROCKET_TYPES[rocket]
+    return player
+
+
+def pack_enemy(enemy):
+    return SNAPSHOT_ENEMY.pack(
+        enemy.type.value, enemy.level, enemy.width, enemy.height, enemy.speed, enemy.health, *enemy.color,
+        enemy.value, enemy.shoot_cooldown, enemy.drop_chance, *enemy.rect, *enemy.original_pos, enemy.angle,
+        enemy.oscillation)
+
+
+def unpack_enemy(fields, rng):
+    # Built without __init__, which would draw from the game's RNG
+    enemy = object.__new__(Enemy)
+    (enemy_type, enemy.level, enemy.width, enemy.height, enemy.speed, enemy.health, red, green, blue, enemy.value,
+     enemy.shoot_cooldown, enemy.drop_chance, x, y, w, h, original_x, original_y, enemy.angle,
+     enemy.oscillation) = fields
+    enemy.type = EnemyType(enemy_type)
+    enemy.color = (red, green, blue)
+    enemy.rect = pygame.Rect(x, y, w, h)
+    enemy.original_pos = (original_x, original_y)
+    enemy.cooldown = ENEMY_ARCHETYPES[enemy.type]["cooldown"]
+    enemy.rng = rng
+    return enemy
+
+
+def pack_projectile(proj):
+    return SNAPSHOT_PROJECTILE.pack(proj.type.value, proj.power, proj.x, proj.y, proj.vx, proj.vy, *proj.rect)
+
+
+def unpack_projectile(fields, pool):
+    weapon, power, x, y, vx, vy, *rect = fields
+    proj = pool.acquire(0, 0, WeaponType(weapon), power)
+    proj.x, proj.y, proj.vx, proj.vy = x, y, vx, vy
+    proj.rect.update(rect)
+    return proj
+
+
+def pack_power_up(power):
+    return SNAPSHOT_POWER_UP.pack(power.type.value, *power.rect, power.speed)
+
+
+def unpack_power_up(fields):
+    power_type, x, y, w, h, speed = fields
+    power = PowerUp(x, y, PowerUpType(power_type))
+    power.rect.size = (w, h)
+    power.speed = speed
+    return power
+
+
+def pack_boss(boss):
+    return SNAPSHOT_BOSS.pack(
+        boss.width, boss.height, *boss.rect, boss.speed, boss.health, boss.max_health, boss.direction,
+        boss.phase_index, boss.phase_tick, *boss.color, boss.shield_active, boss.shield_timer, boss.level,
+        boss.value, boss.shield_cooldown)
+
+
+def unpack_boss(fields):
+    level = fields[-3]
+    boss = Boss(level)  # Rebuilds the attack phases for the level
+    (boss.width, boss.height, x, y, w, h, boss.speed, boss.health, boss.max_health, boss.direction,
+     boss.phase_index, boss.phase_tick, red, green, blue, boss.shield_active, boss.shield_timer, _,
+     boss.value, boss.shield_cooldown) = fields
+    boss.rect.update(x, y, w, h)
+    boss.color = (red, green, blue)
+    return boss
 
 
 # Game class
 class Game:
-    def __init__(self):
+    def __init__(self, seed=None, save_path=SAVE_PATH):
+        # The render resolution is fixed when the window opens, so read it from the profile first
+        self.save_store = SaveStore(save_path)
+        if save_path:  # Tools run memory-only and never quick-load
+            self.save_store.preload(QUICKSAVE_PATH)
+        render = self.save_store.get("settings", {})
+        init(render.get("render_scale", 1.0), render.get("render_resolution"), render.get("smooth_scaling", False))
+        start = time.perf_counter()
         self.state = GameState.START_MENU
+        # Gameplay randomness comes only from this stream; cosmetic effects use the global one
+        self.seed = random.getrandbits(32) if seed is None else seed
+        self.rng = random.Random(self.seed)
+        self.recording = None
+        self.net = None  # RollbackSession while playing online co-op
         self.player = Player()
         self.player2 = None
         self.level = 1
@@ -489,20 +2222,28 @@ class Game:
         self.high_score = 0
         self.load_high_score()
         self.clock = pygame.time.Clock()
-        self.stars = self.create_stars(200)
+        start = startup_step("game setup", start)
+        ATLAS.prebuild()
+        start = startup_step("sprite atlas", start)
+        self.starfield = Starfield()
+        self.render_targets = RenderTargets()  # Sized by the first draw()
+        self.projectile_pool = ProjectilePool()
         self.projectiles = []
         self.enemies = []
-        self.enemy_projectiles = []
+        self.enemy_bullets = BulletStore()
         self.power_ups = []
+        self.enemy_grid = SpatialHash()
+        self.enemy_grid_built = False  # Whether enemy_grid holds this tick's enemies
         self.boss = None
         self.boss_active = False
+        self.boss_ticks = 0
         self.camera_shake = 0
         self.camera_offset = (0, 0)
         self.rapid_fire_active = False
         self.rapid_fire_timer = 0
         self.score = 0
-        self.achievements = self.load_achievements()
-        self.challenges = self.load_challenges()
+        self.events = EventBus()
+        self.load_achievements()
         self.settings = {
             "sound": True,
             "music": True,
@@ -513,14 +2254,30 @@ class Game:
                 "pause": pygame.K_p
             },
             "difficulty": "normal",
-            "two_players": False
+            "two_players": False,
+            "dirty_rect_menus": True,
+            "max_fps": 60,  # Render rate cap; 0 renders as fast as possible
+            "record_replays": True,  # Save each run's inputs to REPLAY_PATH
+            "profiler": False,  # Per-phase frame profiler; F3 toggles the overlay, F4 exports a trace
+            # Internal render resolution, applied at the next launch: a fraction of the display
+            # size, or an explicit [width, height]. Frames are upscaled to the display.
+            "render_scale": 1.0,
+            "render_resolution": None,
+            "smooth_scaling": False
         }
+        self.settings.update(self.save_store.get("settings", {}))
+        self.new_high_score = False
+        self.dropped_ticks = 0  # Backlog ticks run() skipped; shown in the profiler counts
+        self.prev_positions = {}
+        self.render_alpha = 1.0
+        self.rewind_buffer = deque(maxlen=REWIND_SECONDS * TICK_RATE // REWIND_INTERVAL)
+        self.rewind_clock = 0
         self.tutorial_step = 0
         self.story_index = 0
         self.endless_mode = False
         self.enemies_defeated = 0
         self.enemies_to_defeat = 10
-        self.explosions = []
+        self.particles = ParticleSystem()
         self.enemy_spawn_timer = 0
         self.enemy_spawn_delay = 60  # frames between enemy spawns
         self.level_stats = {
@@ -529,9 +2286,45 @@ class Game:
             "damage_taken": 0,
             "time_taken": 0
         }
-        self.level_start_time = pygame.time.get_ticks()
+        self.level_start_time = ticks_ms()
         self.level_complete_time = 0
 
+        # Draw functions for every state other than PLAYING
+        self.screens = {
+            GameState.START_MENU: self.draw_start_menu,
+            GameState.LEVEL_SELECT: self.draw_level_select,
+            GameState.SETTINGS: self.draw_settings_menu,
+            GameState.TUTORIAL: self.draw_tutorial,
+            GameState.GAME_OVER: self.draw_game_over,
+            GameState.SHOP: self.draw_shop,
+            GameState.PAUSED: self.draw_pause_menu,
+            GameState.LEVEL_COMPLETE: self.draw_level_complete,
+            GameState.STORY: self.draw_story,
+            GameState.ACHIEVEMENTS: self.draw_achievements,
+            GameState.CHALLENGES: self.draw_challenges
+        }
+        self.menu_hit_rects = []
+        self.menu_key = None
+        self.menu_redraw = True
+        self.star_rects = []  # Where draw_menu_dirty last drew the stars
+
+        # Simulation phases run by step(), in order, named for the profiler
+        self.inputs = 0
+        self.update_phases = [
+            ("players", self.update_players),
+            ("camera", self.update_camera_shake),
+            ("projectiles", self.update_projectiles),
+            ("enemy_bullets", self.update_enemy_projectiles),
+            ("enemies", self.update_enemies),
+            ("boss", self.update_boss),
+            ("collisions", self.check_projectile_collisions),
+            ("power_ups", self.update_power_ups),
+            ("spawning", self.spawn_enemies),
+            ("particles", self.particles.update)
+        ]
+        self.profiler = FrameProfiler(enabled=self.settings.get("profiler", False))
+        self.show_profiler = False
+
         # Story text
         self.story = [
             "Year 2150: Earth's resources are depleted.",
@@ -553,61 +2346,20 @@ class Game:
             "Defeat the boss at the end of each level",
             "Good luck, Captain!"
         ]
-
-        # Create some initial achievements
-        if not self.achievements:
-            self.achievements = [
-                {"name": "First Blood", "description": "Destroy your first enemy", "unlocked": False},
-                {"name": "Coin Collector", "description": "Collect 100 coins", "unlocked": False},
-                {"name": "Boss Slayer", "description": "Defeat your first boss", "unlocked": False},
-                {"name": "Weapon Master", "description": "Unlock all weapons", "unlocked": False},
-                {"name": "Ultimate Pilot", "description": "Complete all levels", "unlocked": False}
-            ]
-
-        # Create some initial challenges
-        if not self.challenges:
-            self.challenges = [
-                {"name": "No Damage", "description": "Complete a level without taking damage", "reward": 100,
-                 "completed": False},
-                {"name": "Boss Rush", "description": "Defeat a boss in under 30 seconds", "reward": 200,
-                 "completed": False},
-                {"name": "Coin Hoarder", "description": "Collect 50 coins in one level", "reward": 150,
-                 "completed": False},
-                {"name": "Perfect Accuracy", "description": "Destroy 20 enemies without missing", "reward": 100,
-                 "completed": False}
-            ]
-
-    def create_stars(self, count):
-        stars = []
-        for _ in range(count):
-            stars.append({
-                "x": random.randint(0, WIDTH),
-                "y": random.randint(0, HEIGHT),
-                "r": random.randint(1, 3),
-                "speed": random.uniform(0.5, 2)
-            })
-        return stars
-
-    def draw_stars(self, surface):
-        for star in self.stars:
-            pygame.draw.circle(surface, WHITE, (star["x"], star["y"]), star["r"])
-            star["y"] += star["speed"]
-            if star["y"] > HEIGHT:
-                star["y"] = 0
-                star["x"] = random.randint(0, WIDTH)
+        startup_step("game setup", start)
 
     def draw_ui(self, surface):
         # Draw score
-        score_text = FONT_MD.render(f"Score: {self.player.score}", True, WHITE)
-        surface.blit(score_text, (WIDTH - score_text.get_width() - 10, 10))
+        score_text = render_text(FONT_MD, f"Score: {self.player.score}", True, WHITE)
+        surface.blit(score_text, (WIDTH - score_text.get_width() - ui(10), ui(10)))
 
         # Draw level
-        level_text = FONT_MD.render(f"Level: {self.level}", True, WHITE)
-        surface.blit(level_text, (WIDTH - level_text.get_width() - 10, 50))
+        level_text = render_text(FONT_MD, f"Level: {self.level}", True, WHITE)
+        surface.blit(level_text, (WIDTH - level_text.get_width() - ui(10), ui(50)))
 
         # Draw coins
-        coins_text = FONT_MD.render(f"Coins: {self.player.coins}", True, YELLOW)
-        surface.blit(coins_text, (10, 40))
+        coins_text = render_text(FONT_MD, f"Coins: {self.player.coins}", True, YELLOW)
+        surface.blit(coins_text, (ui(10), ui(40)))
 
         # Draw health bar
         self.player.draw_health_bar(surface)
@@ -617,52 +2369,44 @@ class Game:
             self.player2.draw_health_bar(surface, 70)
 
         # Draw weapon info
-        weapon_text = FONT_SM.render(f"Weapon: {self.player.weapon_type.title()} (Lvl {self.player.weapon_power})",
-                                     True, CYAN)
-        surface.blit(weapon_text, (WIDTH - weapon_text.get_width() - 10, 90))
+        weapon_text = render_text(FONT_SM, f"Weapon: {self.player.weapon_type.title()} (Lvl {self.player.weapon_power})",
+                                  True, CYAN)
+        surface.blit(weapon_text, (WIDTH - weapon_text.get_width() - ui(10), ui(90)))
 
         # Draw weapon controls
-        weapons_text = FONT_SM.render("Weapons: 1-Laser 2-Missile 3-Plasma", True, CYAN)
-        surface.blit(weapons_text, (10, HEIGHT - 30))
+        weapons_text = render_text(FONT_SM, "Weapons: 1-Laser 2-Missile 3-Plasma", True, CYAN)
+        surface.blit(weapons_text, (ui(10), HEIGHT - ui(30)))
 
         # Draw active power-ups
-        y_offset = 130
+        y_offset = ui(130)
         if self.player.shield:
-            shield_text = FONT_SM.render("SHIELD ACTIVE", True, BLUE)
-            surface.blit(shield_text, (WIDTH - shield_text.get_width() - 10, y_offset))
-            y_offset += 30
+            shield_text = render_text(FONT_SM, "SHIELD ACTIVE", True, BLUE)
+            surface.blit(shield_text, (WIDTH - shield_text.get_width() - ui(10), y_offset))
+            y_offset += ui(30)
 
         if self.player.rapid_fire:
-            rapid_text = FONT_SM.render("RAPID FIRE ACTIVE", True, GREEN)
-            surface.blit(rapid_text, (WIDTH - rapid_text.get_width() - 10, y_offset))
-            y_offset += 30
+            rapid_text = render_text(FONT_SM, "RAPID FIRE ACTIVE", True, GREEN)
+            surface.blit(rapid_text, (WIDTH - rapid_text.get_width() - ui(10), y_offset))
+            y_offset += ui(30)
 
     def draw_game_over(self, surface):
-        overlay = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
-        overlay.fill((0, 0, 0, 200))
-        surface.blit(overlay, (0, 0))
+        surface.blit(self.render_targets.overlay(200), (0, 0))
 
-        title = FONT_XL.render("GAME OVER", True, RED)
+        title = render_text(FONT_XL, "GAME OVER", True, RED)
         surface.blit(title, (WIDTH // 2 - title.get_width() // 2, HEIGHT // 4))
 
-        score_text = FONT_LG.render(f"Final Score: {self.player.score}", True, WHITE)
-        surface.blit(score_text, (WIDTH // 2 - score_text.get_width() // 2, HEIGHT // 3 + 50))
+        score_text = render_text(FONT_LG, f"Final Score: {self.player.score}", True, WHITE)
+        surface.blit(score_text, (WIDTH // 2 - score_text.get_width() // 2, HEIGHT // 3 + ui(50)))
 
-        restart_text = FONT_MD.render("Press R to Restart or ESC for Menu", True, GREEN)
+        restart_text = render_text(FONT_MD, "Press R to Restart or ESC for Menu", True, GREEN)
         surface.blit(restart_text, (WIDTH // 2 - restart_text.get_width() // 2, HEIGHT // 2))
 
-        # Update high score if needed
-        if self.player.score > self.high_score:
-            self.high_score = self.player.score
-            self.save_high_score()
-            new_high = FONT_LG.render("NEW HIGH SCORE!", True, YELLOW)
-            surface.blit(new_high, (WIDTH // 2 - new_high.get_width() // 2, HEIGHT // 2 + 80))
+        if self.new_high_score:
+            new_high = render_text(FONT_LG, "NEW HIGH SCORE!", True, YELLOW)
+            surface.blit(new_high, (WIDTH // 2 - new_high.get_width() // 2, HEIGHT // 2 + ui(80)))
 
     def draw_start_menu(self, surface):
-        surface.fill(BLACK)
-        self.draw_stars(surface)
-
-        title = FONT_XL.render("🚀 SPACE SHOOTER", True, WHITE)
+        title = render_text(FONT_XL, "🚀 SPACE SHOOTER", True, WHITE)
         surface.blit(title, (WIDTH // 2 - title.get_width() // 2, HEIGHT // 6))
 
         # Menu options
@@ -676,12 +2420,13 @@ class Game:
             ("Quit", None)
         ]
 
-        mouse_pos = pygame.mouse.get_pos()
+        mouse_pos = render_mouse_pos()
 
         for i, (text, state) in enumerate(options):
-            y_pos = HEIGHT // 3 + i * 60
-            text_surf = FONT_LG.render(text, True, WHITE)
-            rect = pygame.Rect(WIDTH // 2 - 150, y_pos, 300, 50)
+            y_pos = HEIGHT // 3 + i * ui(60)
+            text_surf = render_text(FONT_LG, text, True, WHITE)
+            rect = pygame.Rect(WIDTH // 2 - ui(150), y_pos, ui(300), ui(50))
+            self.menu_hit_rects.append(rect)
 
             if rect.collidepoint(mouse_pos):
                 pygame.draw.rect(surface, (50, 50, 100), rect, border_radius=10)
@@ -700,14 +2445,11 @@ class Game:
                                      rect.centery - text_surf.get_height() // 2))
 
         # High score
-        high_score_text = FONT_MD.render(f"High Score: {self.high_score}", True, YELLOW)
-        surface.blit(high_score_text, (WIDTH // 2 - high_score_text.get_width() // 2, HEIGHT - 100))
+        high_score_text = render_text(FONT_MD, f"High Score: {self.high_score}", True, YELLOW)
+        surface.blit(high_score_text, (WIDTH // 2 - high_score_text.get_width() // 2, HEIGHT - ui(100)))
 
     def draw_level_select(self, surface):
-        surface.fill(BLACK)
-        self.draw_stars(surface)
-
-        title = FONT_XL.render("LEVEL SELECT", True, WHITE)
+        title = render_text(FONT_XL, "LEVEL SELECT", True, WHITE)
         surface.blit(title, (WIDTH // 2 - title.get_width() // 2, HEIGHT // 8))
 
         # Calculate how many levels to show per row
@@ -718,11 +2460,12 @@ class Game:
             row = (level_num - 1) // levels_per_row
             col = (level_num - 1) % levels_per_row
 
-            x_pos = WIDTH // 2 - (levels_per_row * 60) // 2 + col * 60
-            y_pos = HEIGHT // 5 + row * 80
+            x_pos = WIDTH // 2 - (levels_per_row * ui(60)) // 2 + col * ui(60)
+            y_pos = HEIGHT // 5 + row * ui(80)
 
-            rect = pygame.Rect(x_pos, y_pos, 50, 50)
+            rect = pygame.Rect(x_pos, y_pos, ui(50), ui(50))
             level_buttons.append((rect, level_num))
+            self.menu_hit_rects.append(rect)
 
             # Draw level button
             if level_num <= self.unlocked_levels:
@@ -735,20 +2478,21 @@ class Game:
             pygame.draw.rect(surface, color, rect, border_radius=10)
             pygame.draw.rect(surface, BLUE, rect, 2, border_radius=10)
 
-            level_text = FONT_MD.render(str(level_num), True, text_color)
+            level_text = render_text(FONT_MD, str(level_num), True, text_color)
             surface.blit(level_text, (rect.centerx - level_text.get_width() // 2,
                                       rect.centery - level_text.get_height() // 2))
 
         # Back button
-        back_rect = pygame.Rect(50, HEIGHT - 100, 200, 50)
+        back_rect = pygame.Rect(ui(50), HEIGHT - ui(100), ui(200), ui(50))
+        self.menu_hit_rects.append(back_rect)
         pygame.draw.rect(surface, (150, 50, 50), back_rect, border_radius=10)
         pygame.draw.rect(surface, RED, back_rect, 2, border_radius=10)
-        back_text = FONT_MD.render("Back", True, WHITE)
+        back_text = render_text(FONT_MD, "Back", True, WHITE)
         surface.blit(back_text, (back_rect.centerx - back_text.get_width() // 2,
                                  back_rect.centery - back_text.get_height() // 2))
 
         # Handle mouse clicks
-        mouse_pos = pygame.mouse.get_pos()
+        mouse_pos = render_mouse_pos()
         mouse_pressed = pygame.mouse.get_pressed()[0]
 
         # Check level buttons
@@ -763,10 +2507,7 @@ class Game:
             self.state = GameState.START_MENU
 
     def draw_settings_menu(self, surface):
-        surface.fill(BLACK)
-        self.draw_stars(surface)
-
-        title = FONT_XL.render("SETTINGS", True, WHITE)
+        title = render_text(FONT_XL, "SETTINGS", True, WHITE)
         surface.blit(title, (WIDTH // 2 - title.get_width() // 2, HEIGHT // 8))
 
         # Settings options
@@ -775,15 +2516,17 @@ class Game:
             (f"Music: {'ON' if self.settings['music'] else 'OFF'}", "music"),
             (f"Difficulty: {self.settings['difficulty'].title()}", "difficulty"),
             (f"Two Players: {'ON' if self.settings.get('two_players', False) else 'OFF'}", "two_players"),
+            (f"Render Scale: {round(self.settings['render_scale'] * 100)}% (restart)", "render_scale"),
             ("Back", "back")
         ]
 
-        mouse_pos = pygame.mouse.get_pos()
+        mouse_pos = render_mouse_pos()
 
         for i, (text, setting) in enumerate(options):
-            y_pos = HEIGHT // 4 + i * 70
-            text_surf = FONT_MD.render(text, True, WHITE)
-            rect = pygame.Rect(WIDTH // 2 - 200, y_pos, 400, 50)
+            y_pos = HEIGHT // 4 + i * ui(70)
+            text_surf = render_text(FONT_MD, text, True, WHITE)
+            rect = pygame.Rect(WIDTH // 2 - ui(200), y_pos, ui(400), ui(50))
+            self.menu_hit_rects.append(rect)
 
             if rect.collidepoint(mouse_pos):
                 pygame.draw.rect(surface, (50, 50, 100), rect, border_radius=10)
@@ -792,10 +2535,17 @@ class Game:
                         self.state = GameState.START_MENU
                     elif setting in ["sound", "music", "two_players"]:
                         self.settings[setting] = not self.settings.get(setting, False)
+                        self.save_settings()
                     elif setting == "difficulty":
                         diffs = ["easy", "normal", "hard"]
                         current = self.settings["difficulty"]
                         self.settings["difficulty"] = diffs[(diffs.index(current) + 1) % len(diffs)]
+                        self.save_settings()
+                    elif setting == "render_scale":
+                        current = self.settings["render_scale"]
+                        index = RENDER_SCALES.index(current) if current in RENDER_SCALES else -1
+                        self.settings["render_scale"] = RENDER_SCALES[(index + 1) % len(RENDER_SCALES)]
+                        self.save_settings()
             else:
                 pygame.draw.rect(surface, (30, 30, 60), rect, border_radius=10)
 
@@ -804,77 +2554,62 @@ class Game:
                                      rect.centery - text_surf.get_height() // 2))
 
     def draw_tutorial(self, surface):
-        surface.fill(BLACK)
-        self.draw_stars(surface)
-
-        title = FONT_XL.render("TUTORIAL", True, WHITE)
+        title = render_text(FONT_XL, "TUTORIAL", True, WHITE)
         surface.blit(title, (WIDTH // 2 - title.get_width() // 2, HEIGHT // 8))
 
         # Display tutorial text
         text = self.tutorial_text[self.tutorial_step]
-        text_surf = FONT_MD.render(text, True, WHITE)
+        text_surf = render_text(FONT_MD, text, True, WHITE)
         surface.blit(text_surf, (WIDTH // 2 - text_surf.get_width() // 2, HEIGHT // 3))
 
         # Navigation
-        nav_text = FONT_MD.render("Press SPACE to continue, ESC to skip", True, GREEN)
-        surface.blit(nav_text, (WIDTH // 2 - nav_text.get_width() // 2, HEIGHT - 100))
+        nav_text = render_text(FONT_MD, "Press SPACE to continue, ESC to skip", True, GREEN)
+        surface.blit(nav_text, (WIDTH // 2 - nav_text.get_width() // 2, HEIGHT - ui(100)))
 
     def draw_story(self, surface):
-        surface.fill(BLACK)
-        self.draw_stars(surface)
-
         # Display story text
         text = self.story[self.story_index]
-        text_surf = FONT_LG.render(text, True, WHITE)
+        text_surf = render_text(FONT_LG, text, True, WHITE)
         surface.blit(text_surf, (WIDTH // 2 - text_surf.get_width() // 2, HEIGHT // 3))
 
         # Navigation
-        nav_text = FONT_MD.render("Press SPACE to continue", True, GREEN)
-        surface.blit(nav_text, (WIDTH // 2 - nav_text.get_width() // 2, HEIGHT - 100))
+        nav_text = render_text(FONT_MD, "Press SPACE to continue", True, GREEN)
+        surface.blit(nav_text, (WIDTH // 2 - nav_text.get_width() // 2, HEIGHT - ui(100)))
 
     def draw_achievements(self, surface):
-        surface.fill(BLACK)
-        self.draw_stars(surface)
-
-        title = FONT_XL.render("ACHIEVEMENTS", True, WHITE)
+        title = render_text(FONT_XL, "ACHIEVEMENTS", True, WHITE)
         surface.blit(title, (WIDTH // 2 - title.get_width() // 2, HEIGHT // 8))
 
         # Display achievements
         for i, achievement in enumerate(self.achievements):
-            y_pos = HEIGHT // 5 + i * 60
+            y_pos = HEIGHT // 5 + i * ui(60)
             color = GREEN if achievement["unlocked"] else RED
             text = f"{achievement['name']}: {achievement['description']}"
-            text_surf = FONT_MD.render(text, True, color)
+            text_surf = render_text(FONT_MD, text, True, color)
             surface.blit(text_surf, (WIDTH // 2 - text_surf.get_width() // 2, y_pos))
 
         # Navigation
-        nav_text = FONT_MD.render("Press ESC to go back", True, GREEN)
-        surface.blit(nav_text, (WIDTH // 2 - nav_text.get_width() // 2, HEIGHT - 100))
+        nav_text = render_text(FONT_MD, "Press ESC to go back", True, GREEN)
+        surface.blit(nav_text, (WIDTH // 2 - nav_text.get_width() // 2, HEIGHT - ui(100)))
 
     def draw_challenges(self, surface):
-        surface.fill(BLACK)
-        self.draw_stars(surface)
-
-        title = FONT_XL.render("CHALLENGES", True, WHITE)
+        title = render_text(FONT_XL, "CHALLENGES", True, WHITE)
         surface.blit(title, (WIDTH // 2 - title.get_width() // 2, HEIGHT // 8))
 
         # Display challenges
         for i, challenge in enumerate(self.challenges):
-            y_pos = HEIGHT // 5 + i * 70
+            y_pos = HEIGHT // 5 + i * ui(70)
             color = GREEN if challenge["completed"] else YELLOW
             text = f"{challenge['name']}: {challenge['description']} - Reward: {challenge['reward']} coins"
-            text_surf = FONT_MD.render(text, True, color)
+            text_surf = render_text(FONT_MD, text, True, color)
             surface.blit(text_surf, (WIDTH // 2 - text_surf.get_width() // 2, y_pos))
 
         # Navigation
-        nav_text = FONT_MD.render("Press ESC to go back", True, GREEN)
-        surface.blit(nav_text, (WIDTH // 2 - nav_text.get_width() // 2, HEIGHT - 100))
+        nav_text = render_text(FONT_MD, "Press ESC to go back", True, GREEN)
+        surface.blit(nav_text, (WIDTH // 2 - nav_text.get_width() // 2, HEIGHT - ui(100)))
 
     def draw_shop(self, surface):
-        surface.fill(BLACK)
-        self.draw_stars(surface)
-
-        title = FONT_XL.render("SHOP", True, YELLOW)
+        title = render_text(FONT_XL, "SHOP", True, YELLOW)
         surface.blit(title, (WIDTH // 2 - title.get_width() // 2, HEIGHT // 8))
 
         # Shop items
@@ -887,12 +2622,13 @@ class Game:
             ("Back", "", "back")
         ]
 
-        mouse_pos = pygame.mouse.get_pos()
+        mouse_pos = render_mouse_pos()
         mouse_pressed = pygame.mouse.get_pressed()[0]
 
         for i, (name, price, action) in enumerate(items):
-            y_pos = HEIGHT // 4 + i * 70
-            rect = pygame.Rect(WIDTH // 2 - 200, y_pos, 400, 60)
+            y_pos = HEIGHT // 4 + i * ui(90)
+            rect = pygame.Rect(WIDTH // 2 - ui(200), y_pos, ui(400), ui(80))
+            self.menu_hit_rects.append(rect)
 
             # Check if player can afford
             can_afford = True
@@ -906,27 +2642,8 @@ class Game:
                 if mouse_pressed:
                     if action == "back":
                         self.state = GameState.PLAYING
-                    elif action == "upgrade_weapon":
-                        if self.player.upgrade_weapon():
-                            # Successfully upgraded
-                            pass
-                    elif action.startswith("upgrade_rocket:"):
-                        rocket_type = action.split(":")[1]
-                        if self.player.upgrade_rocket(rocket_type):
-                            # Successfully upgraded
-                            pass
-                    elif action.startswith("unlock:"):
-                        weapon = action.split(":")[1]
-                        if weapon == "missile":
-                            if self.player.coins >= 300:
-                                self.player.coins -= 300
-                                self.player.unlock_weapon(weapon)
-                                self.player.switch_weapon(weapon)
-                        elif weapon == "plasma":
-                            if self.player.coins >= 500:
-                                self.player.coins -= 500
-                                self.player.unlock_weapon(weapon)
-                                self.player.switch_weapon(weapon)
+                    else:
+                        self.apply_action(action)
             else:
                 color = (30, 60, 30) if can_afford else (60, 30, 30)
                 pygame.draw.rect(surface, color, rect, border_radius=10)
@@ -934,22 +2651,21 @@ class Game:
             pygame.draw.rect(surface, GREEN if can_afford else RED, rect, 3, border_radius=10)
 
             # Draw text
-            name_text = FONT_MD.render(name, True, WHITE)
-            price_text = FONT_MD.render(price, True, YELLOW if can_afford else RED)
+            name_text = render_text(FONT_MD, name, True, WHITE)
+            price_text = render_text(FONT_MD, price, True, YELLOW if can_afford else RED)
 
-            surface.blit(name_text, (rect.centerx - name_text.get_width() // 2, y_pos + 10))
-            surface.blit(price_text, (rect.centerx - price_text.get_width() // 2, y_pos + 35))
+            surface.blit(name_text, (rect.centerx - name_text.get_width() // 2, rect.top + ui(4)))
+            surface.blit(price_text, (rect.centerx - price_text.get_width() // 2,
+                                      rect.bottom - ui(4) - price_text.get_height()))
 
         # Player coins
-        coins_text = FONT_LG.render(f"Coins: {self.player.coins}", True, YELLOW)
-        surface.blit(coins_text, (WIDTH // 2 - coins_text.get_width() // 2, HEIGHT - 100))
+        coins_text = render_text(FONT_LG, f"Coins: {self.player.coins}", True, YELLOW)
+        surface.blit(coins_text, (WIDTH // 2 - coins_text.get_width() // 2, HEIGHT - ui(100)))
 
     def draw_pause_menu(self, surface):
-        overlay = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
-        overlay.fill((0, 0, 0, 150))
-        surface.blit(overlay, (0, 0))
+        surface.blit(self.render_targets.overlay(150), (0, 0))
 
-        title = FONT_XL.render("PAUSED", True, WHITE)
+        title = render_text(FONT_XL, "PAUSED", True, WHITE)
         surface.blit(title, (WIDTH // 2 - title.get_width() // 2, HEIGHT // 4))
 
         options = [
@@ -959,19 +2675,19 @@ class Game:
             ("Main Menu", GameState.START_MENU)
         ]
 
-        mouse_pos = pygame.mouse.get_pos()
+        mouse_pos = render_mouse_pos()
         mouse_pressed = pygame.mouse.get_pressed()[0]
 
         for i, (text, action) in enumerate(options):
-            y_pos = HEIGHT // 3 + i * 80
-            text_surf = FONT_LG.render(text, True, WHITE)
-            rect = pygame.Rect(WIDTH // 2 - 150, y_pos, 300, 50)
+            y_pos = HEIGHT // 3 + i * ui(80)
+            text_surf = render_text(FONT_LG, text, True, WHITE)
+            rect = pygame.Rect(WIDTH // 2 - ui(150), y_pos, ui(300), ui(50))
 
             if rect.collidepoint(mouse_pos):
                 pygame.draw.rect(surface, (50, 50, 100), rect, border_radius=10)
                 if mouse_pressed:
                     if action == "restart":
-                        self.reset_level()
+                        self.apply_action("restart")
                     else:
                         self.state = action
             else:
@@ -982,11 +2698,9 @@ class Game:
                                      rect.centery - text_surf.get_height() // 2))
 
     def draw_level_complete(self, surface):
-        overlay = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
-        overlay.fill((0, 0, 0, 200))
-        surface.blit(overlay, (0, 0))
+        surface.blit(self.render_targets.overlay(200), (0, 0))
 
-        title = FONT_XL.render(f"LEVEL {self.level} COMPLETE!", True, GREEN)
+        title = render_text(FONT_XL, f"LEVEL {self.level} COMPLETE!", True, GREEN)
         surface.blit(title, (WIDTH // 2 - title.get_width() // 2, HEIGHT // 4))
 
         # Calculate time taken in seconds
@@ -1003,37 +2717,37 @@ class Game:
         ]
 
         for i, stat in enumerate(stats):
-            text = FONT_LG.render(stat, True, WHITE)
-            surface.blit(text, (WIDTH // 2 - text.get_width() // 2, HEIGHT // 3 + i * 60))
+            text = render_text(FONT_LG, stat, True, WHITE)
+            surface.blit(text, (WIDTH // 2 - text.get_width() // 2, HEIGHT // 3 + i * ui(60)))
 
         # Draw buttons
-        button_width = 200
-        button_height = 60
-        button_margin = 30
+        button_width = ui(200)
+        button_height = ui(60)
+        button_margin = ui(30)
 
         # Home button
         home_rect = pygame.Rect(
             WIDTH // 2 - button_width - button_margin // 2,
-            HEIGHT - 150,
+            HEIGHT - ui(150),
             button_width,
             button_height
         )
         pygame.draw.rect(surface, (200, 50, 50), home_rect, border_radius=10)
         pygame.draw.rect(surface, RED, home_rect, 3, border_radius=10)
-        home_text = FONT_MD.render("Home", True, WHITE)
+        home_text = render_text(FONT_MD, "Home", True, WHITE)
         surface.blit(home_text, (home_rect.centerx - home_text.get_width() // 2,
                                  home_rect.centery - home_text.get_height() // 2))
 
         # Next level button
         next_rect = pygame.Rect(
             WIDTH // 2 + button_margin // 2,
-            HEIGHT - 150,
+            HEIGHT - ui(150),
             button_width,
             button_height
         )
         pygame.draw.rect(surface, (50, 200, 50), next_rect, border_radius=10)
         pygame.draw.rect(surface, GREEN, next_rect, 3, border_radius=10)
-        next_text = FONT_MD.render("Next Level", True, WHITE)
+        next_text = render_text(FONT_MD, "Next Level", True, WHITE)
         surface.blit(next_text, (next_rect.centerx - next_text.get_width() // 2,
                                  next_rect.centery - next_text.get_height() // 2))
 
@@ -1042,129 +2756,96 @@ class Game:
         self.next_level_button = next_rect
 
     def spawn_enemy(self):
-        # Determine enemy type based on level
-        if self.level == 1:
-            enemy_types = [EnemyType.ASTEROID] * 8 + [EnemyType.SCOUT] * 2
-        elif self.level == 2:
-            enemy_types = [EnemyType.ASTEROID] * 6 + [EnemyType.SCOUT] * 3 + [EnemyType.FIGHTER]
-        elif self.level == 3:
-            enemy_types = [EnemyType.ASTEROID] * 5 + [EnemyType.SCOUT] * 3 + [EnemyType.FIGHTER] * 2
-        elif self.level == 4:
-            enemy_types = [EnemyType.ASTEROID] * 4 + [EnemyType.SCOUT] * 3 + [EnemyType.FIGHTER] * 2 + [
-                EnemyType.BOMBER]
-        elif self.level == 5:
-            enemy_types = [EnemyType.ASTEROID] * 3 + [EnemyType.SCOUT] * 2 + [EnemyType.FIGHTER] * 3 + [
-                EnemyType.BOMBER] * 2
-        else:  # Level 6+ or endless
-            enemy_types = [EnemyType.FIGHTER] * 2 + [EnemyType.BOMBER] * 3 + [EnemyType.ELITE] * 2
-
-        enemy_type = random.choice(enemy_types)
-        return Enemy(random.randint(20, WIDTH - 40), -40, enemy_type, self.level)
+        enemy_type = spawn_sampler(self.level, self.endless_mode).sample(self.rng)
+        return Enemy(self.rng.randint(20, WIDTH - 40), -40, enemy_type, self.level, self.rng)
 
     def spawn_boss(self):
         self.boss = Boss(self.level)
         self.boss_active = True
+        self.boss_ticks = 0
 
     def spawn_power_up(self, x, y, type=None):
         if not type:
             # Weighted random selection
             types = [PowerUpType.COIN] * 5 + [PowerUpType.HEALTH] * 3 + [PowerUpType.SHIELD] * 2 + [
                 PowerUpType.RAPID_FIRE] * 2 + [PowerUpType.GUN] * 1
-            type = random.choice(types)
+            type = self.rng.choice(types)
         self.power_ups.append(PowerUp(x, y, type))
 
     def create_explosion(self, x, y, size):
         # Create visual explosion effect
-        for _ in range(20):
-            particle = {
-                "x": x,
-                "y": y,
-                "dx": random.uniform(-3, 3),
-                "dy": random.uniform(-3, 3),
-                "size": random.randint(2, size),
-                "color": (random.randint(200, 255), random.randint(100, 200), 0),
-                "life": random.randint(20, 40)
-            }
-            self.explosions.append(particle)
+        self.particles.emit(x, y, 20, size)
 
         # Trigger camera shake
         self.camera_shake = 15
 
     def update_camera_shake(self):
         if self.camera_shake > 0:
-            self.camera_offset = (random.randint(-5, 5), random.randint(-5, 5))
+            self.camera_offset = (random.randint(-5, 5), random.randint(-5, 5))  # Cosmetic RNG
             self.camera_shake -= 1
         else:
             self.camera_offset = (0, 0)
 
-    def check_achievements(self):
-        # First Blood
-        if not self.achievements[0]["unlocked"] and self.enemies_defeated > 0:
-            self.achievements[0]["unlocked"] = True
-
-        # Coin Collector
-        if not self.achievements[1]["unlocked"] and self.player.coins >= 100:
-            self.achievements[1]["unlocked"] = True
-
-        # Boss Slayer
-        if not self.achievements[2]["unlocked"] and self.level > 1:
-            self.achievements[2]["unlocked"] = True
-
-        # Weapon Master
-        if not self.achievements[3]["unlocked"] and len(self.player.weapons_unlocked) == 3:
-            self.achievements[3]["unlocked"] = True
-
-        # Ultimate Pilot
-        if not self.achievements[4]["unlocked"] and self.level > self.max_level:
-            self.achievements[4]["unlocked"] = True
-
     def load_high_score(self):
-        try:
-            with open("high_score.json", "r") as file:
-                data = json.load(file)
-                self.high_score = data.get("high_score", 0)
-                self.unlocked_levels = data.get("unlocked_levels", 1)
-        except:
-            self.high_score = 0
-            self.unlocked_levels = 1
+        self.high_score = self.save_store.get("high_score", 0)
+        self.unlocked_levels = self.save_store.get("unlocked_levels", 1)
 
     def save_high_score(self):
-        data = {
-            "high_score": self.high_score,
-            "unlocked_levels": self.unlocked_levels
-        }
-        with open("high_score.json", "w") as file:
-            json.dump(data, file)
+        self.save_store.set("high_score", self.high_score)
+        self.save_store.set("unlocked_levels", self.unlocked_levels)
+
+    def update_high_score(self):
+        """Record the run's score when it ends; draw_game_over shows the banner."""
+        if self.player.score > self.high_score:
+            self.high_score = self.player.score
+            self.new_high_score = True
+            self.save_high_score()
 
     def load_achievements(self):
-        try:
-            with open("achievements.json", "r") as file:
-                return json.load(file)
-        except:
-            return []
+        """Build the achievement and challenge rules and their saved progress, and start the engine."""
+        unlocked = {item["name"] for item in self.save_store.get("achievements", []) if item.get("unlocked")}
+        completed = {item["name"] for item in self.save_store.get("challenges", []) if item.get("completed")}
+        counters = self.save_store.get("rule_progress", {})
+        achievements, challenges = achievement_rules(), challenge_rules()
+        for rule in achievements + challenges:
+            rule.done = rule.name in (completed if rule.reward else unlocked)
+            if not rule.reset_on:  # Counters that span levels carry over between sessions
+                rule.count = counters.get(rule.name, 0)
+        self.achievements = [{"name": rule.name, "description": rule.description, "unlocked": rule.done}
+                             for rule in achievements]
+        self.challenges = [{"name": rule.name, "description": rule.description, "reward": rule.reward,
+                            "completed": rule.done} for rule in challenges]
+        self.achievement_engine = AchievementEngine(self.events, achievements + challenges, self.complete_rule)
+
+    def complete_rule(self, rule):
+        if rule.reward:
+            for challenge in self.challenges:
+                if challenge["name"] == rule.name:
+                    challenge["completed"] = True
+            # Rewards change the simulation, so they go through the recorded action path
+            self.apply_action(f"reward:{rule.reward}")
+        else:
+            for achievement in self.achievements:
+                if achievement["name"] == rule.name:
+                    achievement["unlocked"] = True
+        self.save_achievements()
 
     def save_achievements(self):
-        with open("achievements.json", "w") as file:
-            json.dump(self.achievements, file)
+        self.save_store.set("achievements", self.achievements)
+        self.save_store.set("challenges", self.challenges)
+        self.save_store.set("rule_progress", self.achievement_engine.counters())
 
-    def load_challenges(self):
-        try:
-            with open("challenges.json", "r") as file:
-                return json.load(file)
-        except:
-            return []
-
-    def save_challenges(self):
-        with open("challenges.json", "w") as file:
-            json.dump(self.challenges, file)
+    def save_settings(self):
+        self.save_store.set("settings", self.settings)
 
     def reset_level(self):
         self.player.rect.x = WIDTH // 2 - self.player.width // 2
         if self.player2:
             self.player2.rect.x = WIDTH // 2 + 100
+        self.projectile_pool.release_all(self.projectiles)
         self.projectiles = []
         self.enemies = []
-        self.enemy_projectiles = []
+        self.enemy_bullets.clear()
         self.power_ups = []
         self.boss = None
         self.boss_active = False
@@ -1172,9 +2853,10 @@ class Game:
         self.player.shield = False
         self.camera_shake = 0
         self.camera_offset = (0, 0)
-        self.explosions = []
+        self.particles.clear()
         self.enemies_defeated = 0
         self.enemies_to_defeat = 10 + self.level * 5
+        self.rewind_buffer.clear()
 
         # Reset level stats
         self.level_stats = {
@@ -1185,13 +2867,20 @@ class Game:
         }
 
         # Set start time for level
-        self.level_start_time = pygame.time.get_ticks()
+        self.level_start_time = ticks_ms()
 
         # Spawn initial enemies
         for _ in range(5 + self.level * 2):
             self.enemies.append(self.spawn_enemy())
 
-    def reset_game(self):
+        self.events.emit(GameEvent.LEVEL_STARTED, self.level)
+        self.save_achievements()
+
+    def reset_game(self, seed=None):
+        self.end_recording()
+        self.seed = random.getrandbits(32) if seed is None else seed
+        self.rng.seed(self.seed)
+        self.new_high_score = False
         self.player = Player()
         if self.settings["two_players"]:
             self.player2 = Player(WIDTH // 2 - 100)
@@ -1200,12 +2889,167 @@ class Game:
 
         self.reset_level()
         self.state = GameState.PLAYING
+        if self.settings.get("record_replays", True):
+            self.recording = InputRecording(self.seed, self.level, self.player2 is not None)
 
         # Start with story for level 1
         if self.level == 1:
             self.state = GameState.STORY
             self.story_index = 0
 
+    def apply_action(self, action):
+        """Apply an out-of-band player action (shop purchase or level change).
+
+        Everything that changes the simulation outside ``step`` goes through
+        here so it can be recorded and replayed.
+        """
+        if self.recording is not None:
+            self.recording.record_action(action)
+
+        if action == "next_level":
+            self.next_level()
+        elif action == "restart":
+            self.reset_level()
+        elif action == "upgrade_weapon":
+            self.player.upgrade_weapon()
+        elif action.startswith("upgrade_rocket:"):
+            self.player.upgrade_rocket(action.split(":")[1])
+        elif action.startswith("unlock:"):
+            weapon = action.split(":")[1]
+            cost = {"missile": 300, "plasma": 500}[weapon]
+            if self.player.coins >= cost:
+                self.player.coins -= cost
+                if self.player.unlock_weapon(weapon):
+                    self.events.emit(GameEvent.WEAPON_UNLOCKED, len(self.player.weapons_unlocked))
+                self.player.switch_weapon(weapon)
+        elif action.startswith("reward:"):
+            self.player.add_coins(int(action.split(":")[1]))
+
+    def save_recording(self, path=REPLAY_PATH):
+        """Queue the current run's input recording (if it has any ticks) for the background writer."""
+        if self.recording is not None and self.recording.ticks:
+            self.save_store.write_file(path, self.recording.to_bytes())
+
+    def end_recording(self):
+        """Save and stop the input recording (a replay can't reproduce rewinds or loaded saves)."""
+        self.save_recording()
+        self.recording = None
+
+    def snapshot(self):
+        """Pack the simulation into bytes (see SNAPSHOT_HEADER)."""
+        players = self.players()
+        bullets = self.enemy_bullets
+        stats = self.level_stats
+        rules = self.achievement_engine.rules
+        _, words, gauss = self.rng.getstate()
+        parts = [
+            SNAPSHOT_HEADER.pack(
+                SNAPSHOT_MAGIC, SNAPSHOT_VERSION, WIDTH, HEIGHT, self.state.value, self.level,
+                self.enemies_defeated, self.enemies_to_defeat, self.boss_active, self.boss_ticks,
+                stats["coins_collected"], stats["enemies_killed"], stats["damage_taken"], len(players),
+                len(self.projectiles), len(self.enemies), len(self.power_ups), bullets.count, self.boss is not None,
+                len(rules)),
+            SNAPSHOT_RNG.pack(*words, gauss is not None, gauss or 0.0)
+        ]
+        parts.extend(map(pack_player, players))
+        parts.extend(map(pack_projectile, self.projectiles))
+        parts.extend(map(pack_enemy, self.enemies))
+        parts.extend(map(pack_power_up, self.power_ups))
+        if self.boss is not None:
+            parts.append(pack_boss(self.boss))
+        parts.extend(SNAPSHOT_RULE.pack(rule.count, rule.failed, rule.done) for rule in rules)
+        parts.append(bullets.snapshot())
+        return b"".join(parts)
+
+    def restore(self, data):
+        """Load a ``snapshot``: the ticks that follow play out exactly as they did after it was taken.
+
+        Raises ValueError, leaving the game untouched, if ``data`` is not a
+        complete snapshot of this version at the current render resolution.
+        """
+        try:
+            header = SNAPSHOT_HEADER.unpack_from(data)
+        except struct.error:
+            raise ValueError("not a snapshot") from None
+        (magic, version, width, height, state, level, defeated, to_defeat, boss_active, boss_ticks, coins, kills,
+         damage, players, projectiles, enemies, power_ups, bullets, bosses, rules) = header
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            raise ValueError("not a snapshot of this version")
+        if (width, height) != (WIDTH, HEIGHT):
+            raise ValueError(f"snapshot was taken at {width}x{height}, not {WIDTH}x{HEIGHT}")
+        if rules != len(self.achievement_engine.rules):
+            raise ValueError("snapshot has a different set of achievement rules")
+        records = ((SNAPSHOT_PLAYER, players), (SNAPSHOT_PROJECTILE, projectiles), (SNAPSHOT_ENEMY, enemies),
+                   (SNAPSHOT_POWER_UP, power_ups), (SNAPSHOT_BOSS, bosses), (SNAPSHOT_RULE, rules))
+        size = (SNAPSHOT_HEADER.size + SNAPSHOT_RNG.size + sum(layout.size * count for layout, count in records) +
+                self.enemy_bullets.snapshot_size(bullets))
+        if len(data) != size:
+            raise ValueError("truncated snapshot")
+
+        view = memoryview(data)
+        offset = SNAPSHOT_HEADER.size
+        *words, has_gauss, gauss = SNAPSHOT_RNG.unpack_from(view, offset)
+        offset += SNAPSHOT_RNG.size
+        unpacked = []
+        for layout, count in records:
+            end = offset + layout.size * count
+            unpacked.append(layout.iter_unpack(view[offset:end]))
+            offset = end
+        player_fields, projectile_fields, enemy_fields, power_up_fields, boss_fields, rule_fields = unpacked
+
+        self.state = GameState(state)
+        self.level = level
+        self.enemies_defeated, self.enemies_to_defeat = defeated, to_defeat
+        self.boss_active, self.boss_ticks = boss_active, boss_ticks
+        self.level_stats.update(coins_collected=coins, enemies_killed=kills, damage_taken=damage)
+        self.rng.setstate((3, tuple(words), gauss if has_gauss else None))
+        self.player, *others = map(unpack_player, player_fields)
+        self.player2 = others[0] if others else None
+        self.projectile_pool.release_all(self.projectiles)
+        self.projectiles = [unpack_projectile(fields, self.projectile_pool) for fields in projectile_fields]
+        self.enemies = [unpack_enemy(fields, self.rng) for fields in enemy_fields]
+        self.power_ups = list(map(unpack_power_up, power_up_fields))
+        self.boss = next(map(unpack_boss, boss_fields), None)
+        # The profile keeps what was ever earned; only the simulation's view of the rules goes back
+        self.achievement_engine.restore(rule_fields)
+        self.enemy_bullets.restore(data, offset, bullets)
+        self.prev_positions = {}  # Nothing to interpolate from
+
+    def record_rewind(self):
+        """Called after each tick of play: keep a snapshot every REWIND_INTERVAL ticks."""
+        self.rewind_clock += 1
+        if self.rewind_clock >= REWIND_INTERVAL and self.state == GameState.PLAYING:
+            self.rewind_clock = 0
+            self.rewind_buffer.append(self.snapshot())
+
+    def rewind(self):
+        """Called each tick the rewind key is held: step back through the rewind buffer."""
+        self.rewind_clock += REWIND_SPEED
+        if self.rewind_clock < REWIND_INTERVAL or not self.rewind_buffer:
+            return
+        self.rewind_clock = 0
+        self.restore(self.rewind_buffer.pop())
+        self.end_recording()
+
+    def quick_save(self, path=QUICKSAVE_PATH):
+        self.save_store.write_file(path, self.snapshot())
+
+    def quick_load(self, path=QUICKSAVE_PATH):
+        """Restore the quick-save from memory (read ahead by SaveStore.preload).
+
+        Returns False if there is none (or it doesn't fit this game).
+        """
+        data = self.save_store.cached_file(path)
+        if data is None:
+            return False
+        try:
+            self.restore(data)
+        except ValueError:
+            return False
+        self.rewind_buffer.clear()
+        self.end_recording()
+        return True
+
     def next_level(self):
         # Unlock next level
         if self.level == self.unlocked_levels:
@@ -1216,438 +3060,966 @@ class Game:
         self.reset_level()
         self.state = GameState.PLAYING
 
-    def run(self):
-        while True:
-            # Event handling
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    pygame.quit()
-                    sys.exit()
-
-                if event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_ESCAPE:
-                        if self.state in [GameState.PLAYING, GameState.PAUSED]:
-                            self.state = GameState.PAUSED if self.state == GameState.PLAYING else GameState.PLAYING
-                        elif self.state in [GameState.TUTORIAL, GameState.SETTINGS, GameState.ACHIEVEMENTS,
-                                            GameState.CHALLENGES, GameState.STORY, GameState.LEVEL_SELECT]:
-                            self.state = GameState.START_MENU
-
-                    if event.key == pygame.K_p and self.state == GameState.PLAYING:
-                        self.state = GameState.PAUSED
-
-                    if event.key == pygame.K_SPACE:
-                        if self.state == GameState.TUTORIAL:
-                            self.tutorial_step += 1
-                            if self.tutorial_step >= len(self.tutorial_text):
-                                self.state = GameState.PLAYING
-                        elif self.state == GameState.STORY:
-                            self.story_index += 1
-                            if self.story_index >= len(self.story):
-                                self.state = GameState.PLAYING
-
-                    if event.key == pygame.K_r and self.state == GameState.GAME_OVER:
-                        self.reset_game()
+    def handle_events(self):
+        """Process window/menu events and return the edge-triggered input bits for this frame."""
+        inputs = 0
+        for event in pygame.event.get():
+            if event.type != pygame.MOUSEMOTION:
+                self.menu_redraw = True
+
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                sys.exit()
+
+            if event.type == pygame.KEYDOWN:
+                # Online, pausing, the shop and restarts would only happen on this peer
+                if self.net is not None and event.key in (pygame.K_ESCAPE, pygame.K_p, pygame.K_s, pygame.K_r,
+                                                          pygame.K_F5, pygame.K_F9):
+                    continue
+
+                if event.key == pygame.K_ESCAPE:
+                    if self.state in [GameState.PLAYING, GameState.PAUSED]:
+                        self.state = GameState.PAUSED if self.state == GameState.PLAYING else GameState.PLAYING
+                    elif self.state in [GameState.TUTORIAL, GameState.SETTINGS, GameState.ACHIEVEMENTS,
+                                        GameState.CHALLENGES, GameState.STORY, GameState.LEVEL_SELECT]:
+                        self.state = GameState.START_MENU
 
-                    if event.key == pygame.K_s and self.state == GameState.PLAYING:
-                        self.state = GameState.SHOP
-
-                    # Weapon switching
-                    if event.key == pygame.K_1 and self.state == GameState.PLAYING:
-                        self.player.switch_weapon("laser")
-                    if event.key == pygame.K_2 and self.state == GameState.PLAYING and "missile" in self.player.weapons_unlocked:
-                        self.player.switch_weapon("missile")
-                    if event.key == pygame.K_3 and self.state == GameState.PLAYING and "plasma" in self.player.weapons_unlocked:
-                        self.player.switch_weapon("plasma")
-
-                # Handle mouse clicks for level complete screen
-                if event.type == pygame.MOUSEBUTTONDOWN:
-                    if self.state == GameState.LEVEL_COMPLETE:
-                        mouse_pos = pygame.mouse.get_pos()
-                        if hasattr(self, 'home_button') and self.home_button.collidepoint(mouse_pos):
-                            self.state = GameState.START_MENU
-                        elif hasattr(self, 'next_level_button') and self.next_level_button.collidepoint(mouse_pos):
-                            self.next_level()
-
-            # Update game state
-            if self.state == GameState.PLAYING:
-                # Player 1 movement
-                keys = pygame.key.get_pressed()
-                if keys[pygame.K_LEFT]:
-                    self.player.move(-self.player.speed)
-                if keys[pygame.K_RIGHT]:
-                    self.player.move(self.player.speed)
-
-                # Player 2 movement
-                if self.player2:
-                    if keys[pygame.K_a]:
-                        self.player2.move(-self.player2.speed)
-                    if keys[pygame.K_d]:
-                        self.player2.move(self.player2.speed)
-
-                # Player 1 shooting
-                if keys[pygame.K_SPACE] and self.player.shoot_cooldown <= 0:
-                    # Determine weapon type
-                    if self.player.weapon_type == "laser":
-                        weapon = WeaponType.LASER
-                    elif self.player.weapon_type == "missile":
-                        weapon = WeaponType.MISSILE
-                    elif self.player.weapon_type == "plasma":
-                        weapon = WeaponType.PLASMA
-
-                    self.projectiles.append(Projectile(
-                        self.player.rect.centerx,
-                        self.player.rect.top,
-                        weapon,
-                        self.player.weapon_power
-                    ))
-
-                    # Set cooldown based on rapid fire
-                    if self.player.rapid_fire:
-                        self.player.shoot_cooldown = 5  # Very fast shooting
-                    else:
-                        self.player.shoot_cooldown = 15  # Normal shooting
-
-                # Shooting for player 2
-                if self.player2 and keys[pygame.K_w] and self.player2.shoot_cooldown <= 0:
-                    # Determine weapon type
-                    if self.player2.weapon_type == "laser":
-                        weapon = WeaponType.LASER
-                    elif self.player2.weapon_type == "missile":
-                        weapon = WeaponType.MISSILE
-                    elif self.player2.weapon_type == "plasma":
-                        weapon = WeaponType.PLASMA
-
-                    self.projectiles.append(Projectile(
-                        self.player2.rect.centerx,
-                        self.player2.rect.top,
-                        weapon,
-                        self.player2.weapon_power
-                    ))
-
-                    # Set cooldown for player2
-                    if self.player2.rapid_fire:
-                        self.player2.shoot_cooldown = 5
-                    else:
-                        self.player2.shoot_cooldown = 15
-
-                # Update player
-                self.player.update()
-                if self.player2:
-                    self.player2.update()
-
-                # Update camera shake
-                self.update_camera_shake()
-
-                # Update projectiles
-                for proj in self.projectiles[:]:
-                    proj.move()
-                    if proj.rect.bottom < 0:
-                        self.projectiles.remove(proj)
-
-                # Update enemy projectiles
-                for proj in self.enemy_projectiles[:]:
-                    proj.rect.y += proj.speed
-                    if proj.rect.top > HEIGHT:
-                        self.enemy_projectiles.remove(proj)
-                    # Check collision with player
-                    if proj.rect.colliderect(self.player.rect):
-                        if self.player.take_damage(proj.damage):
-                            self.create_explosion(proj.rect.centerx, proj.rect.centery, 10)
-                            self.level_stats['damage_taken'] += proj.damage
-                        self.enemy_projectiles.remove(proj)
-                        if self.player.health <= 0:
-                            self.state = GameState.GAME_OVER
-
-                    # Check collision with player2
-                    if self.player2 and proj.rect.colliderect(self.player2.rect):
-                        if self.player2.take_damage(proj.damage):
-                            self.create_explosion(proj.rect.centerx, proj.rect.centery, 10)
-                            self.level_stats['damage_taken'] += proj.damage
-                        self.enemy_projectiles.remove(proj)
-                        if self.player2.health <= 0:
-                            self.state = GameState.GAME_OVER
-
-                # Update enemies
-                for enemy in self.enemies[:]:
-                    enemy.move()
-                    enemy.update_cooldown()
-
-                    # Enemy shooting
-                    if enemy.can_shoot():
-                        self.enemy_projectiles.append(Projectile(
-                            enemy.rect.centerx,
-                            enemy.rect.bottom,
-                            WeaponType.LASER,
-                            1
-                        ))
-                        enemy.reset_cooldown()
-
-                    # Enemy collision with player
-                    if enemy.rect.colliderect(self.player.rect):
-                        if self.player.take_damage(10):
-                            self.create_explosion(enemy.rect.centerx, enemy.rect.centery, 20)
-                            self.level_stats['damage_taken'] += 10
-                        self.enemies.remove(enemy)
-                        self.enemies_defeated += 1
-                        self.level_stats['enemies_killed'] += 1
-                        if self.player.health <= 0:
-                            self.state = GameState.GAME_OVER
-
-                    # Enemy collision with player2
-                    if self.player2 and enemy.rect.colliderect(self.player2.rect):
-                        if self.player2.take_damage(10):
-                            self.create_explosion(enemy.rect.centerx, enemy.rect.centery, 20)
-                            self.level_stats['damage_taken'] += 10
-                        self.enemies.remove(enemy)
-                        self.enemies_defeated += 1
-                        self.level_stats['enemies_killed'] += 1
-                        if self.player2.health <= 0:
-                            self.state = GameState.GAME_OVER
-
-                    # Remove enemies that go off screen
-                    if enemy.rect.top > HEIGHT:
-                        self.enemies.remove(enemy)
-
-                # Update boss
-                if self.boss_active:
-                    self.boss.move()
-                    self.boss.update_cooldown()
-                    self.boss.update_shield()
-
-                    # Boss shooting
-                    if self.boss.can_shoot():
-                        # Pattern 1: Triple shot
-                        if self.boss.attack_pattern == 0:
-                            for offset in [-40, 0, 40]:
-                                self.enemy_projectiles.append(Projectile(
-                                    self.boss.rect.centerx + offset,
-                                    self.boss.rect.bottom,
-                                    WeaponType.LASER,
-                                    3
-                                ))
-                            self.boss.attack_timer = 60
-                            self.boss.attack_pattern = 1
-                        # Pattern 2: Moving shield
-                        elif self.boss.attack_pattern == 1:
-                            self.boss.activate_shield()
-                            self.boss.attack_timer = 120
-                            self.boss.attack_pattern = 0
-                        self.boss.reset_cooldown()
-
-                    # Boss collision with player
-                    if self.boss.rect.colliderect(self.player.rect):
-                        if self.player.take_damage(20):
-                            self.create_explosion(self.boss.rect.centerx, self.boss.rect.centery, 30)
-                            self.level_stats['damage_taken'] += 20
-                        if self.player.health <= 0:
-                            self.state = GameState.GAME_OVER
-
-                    # Boss collision with player2
-                    if self.player2 and self.boss.rect.colliderect(self.player2.rect):
-                        if self.player2.take_damage(20):
-                            self.create_explosion(self.boss.rect.centerx, self.boss.rect.centery, 30)
-                            self.level_stats['damage_taken'] += 20
-                        if self.player2.health <= 0:
-                            self.state = GameState.GAME_OVER
-
-                    # Check if boss is defeated
-                    if self.boss.health <= 0:
-                        self.player.add_coins(self.boss.value)
-                        self.player.score += self.boss.value * 10
-                        self.level_stats['coins_collected'] += self.boss.value
-                        self.create_explosion(self.boss.rect.centerx, self.boss.rect.centery, 50)
-                        self.boss_active = False
-                        self.level_complete_time = pygame.time.get_ticks()
-                        self.state = GameState.LEVEL_COMPLETE
-
-                # Check collisions between player projectiles and enemies
-                for proj in self.projectiles[:]:
-                    # Check enemy collisions
-                    for enemy in self.enemies[:]:
-                        if proj.rect.colliderect(enemy.rect):
-                            enemy.health -= proj.damage
-                            if enemy.health <= 0:
-                                self.player.score += enemy.value
-                                self.player.add_coins(enemy.value)
-                                self.level_stats['coins_collected'] += enemy.value
-                                self.enemies_defeated += 1
-                                self.level_stats['enemies_killed'] += 1
-
-                                # Chance to drop power-up
-                                if random.random() < enemy.drop_chance:
-                                    self.spawn_power_up(enemy.rect.centerx, enemy.rect.centery)
-
-                                self.enemies.remove(enemy)
-
-                            # Create explosion
-                            self.create_explosion(proj.rect.centerx, proj.rect.centery, 15)
-
-                            # Remove projectile
-                            if proj in self.projectiles:
-                                self.projectiles.remove(proj)
-                            break
-
-                    # Check boss collision
-                    if self.boss_active and proj.rect.colliderect(self.boss.rect):
-                        if self.boss.take_damage(proj.damage):
-                            self.create_explosion(proj.rect.centerx, proj.rect.centery, 20)
-                        if proj in self.projectiles:
-                            self.projectiles.remove(proj)
-
-                # Update power-ups
-                for power in self.power_ups[:]:
-                    power.move()
-
-                    # Power-up collision with player
-                    if power.rect.colliderect(self.player.rect):
-                        if power.type == PowerUpType.COIN:
-                            self.player.add_coins(5)
-                            self.level_stats['coins_collected'] += 5
-                        elif power.type == PowerUpType.HEALTH:
-                            self.player.heal(20)
-                        elif power.type == PowerUpType.RAPID_FIRE:
-                            self.player.rapid_fire = True
-                            self.player.rapid_fire_timer = 300
-                        elif power.type == PowerUpType.SHIELD:
-                            self.player.activate_shield()
-                        elif power.type == PowerUpType.GUN:
-                            if "missile" not in self.player.weapons_unlocked:
-                                self.player.unlock_weapon("missile")
-                            elif "plasma" not in self.player.weapons_unlocked:
-                                self.player.unlock_weapon("plasma")
-                        self.power_ups.remove(power)
-
-                    # Power-up collision with player2
-                    if self.player2 and power.rect.colliderect(self.player2.rect):
-                        if power.type == PowerUpType.COIN:
-                            self.player.add_coins(5)  # Only one coin counter
-                            self.level_stats['coins_collected'] += 5
-                        elif power.type == PowerUpType.HEALTH:
-                            self.player2.heal(20)
-                        elif power.type == PowerUpType.RAPID_FIRE:
-                            self.player2.rapid_fire = True
-                            self.player2.rapid_fire_timer = 300
-                        elif power.type == PowerUpType.SHIELD:
-                            self.player2.activate_shield()
-                        elif power.type == PowerUpType.GUN:
-                            if "missile" not in self.player2.weapons_unlocked:
-                                self.player2.unlock_weapon("missile")
-                            elif "plasma" not in self.player2.weapons_unlocked:
-                                self.player2.unlock_weapon("plasma")
-                        if power in self.power_ups:
-                            self.power_ups.remove(power)
-
-                    # Remove power-ups that go off screen
-                    if power.rect.top > HEIGHT:
-                        self.power_ups.remove(power)
-
-                # Spawn new enemies
-                if len(self.enemies) < 5 + self.level and random.random() < 0.02:
-                    self.enemies.append(self.spawn_enemy())
-
-                # Spawn boss when enemies are cleared
-                if not self.boss_active and self.enemies_defeated >= self.enemies_to_defeat:
-                    self.enemies = []  # Clear existing enemies
-                    self.spawn_boss()
-
-                # Update explosions
-                for explosion in self.explosions[:]:
-                    explosion["x"] += explosion["dx"]
-                    explosion["y"] += explosion["dy"]
-                    explosion["life"] -= 1
-                    if explosion["life"] <= 0:
-                        self.explosions.remove(explosion)
-
-            # Drawing
-            win.fill(BLACK)
-
-            # Apply camera offset
-            offset_surface = pygame.Surface((WIDTH, HEIGHT))
-            offset_surface.fill(BLACK)
-
-            # Draw stars
-            self.draw_stars(offset_surface)
-
-            # Draw game elements based on state
-            if self.state == GameState.PLAYING:
-                # Draw player
-                self.player.draw(offset_surface)
-                if self.player2:
-                    self.player2.draw(offset_surface)
-
-                # Draw projectiles
-                for proj in self.projectiles:
-                    proj.draw(offset_surface)
-
-                # Draw enemy projectiles
-                for proj in self.enemy_projectiles:
-                    proj.draw(offset_surface)
-
-                # Draw enemies
-                for enemy in self.enemies:
-                    enemy.draw(offset_surface)
-
-                # Draw boss
-                if self.boss_active:
-                    self.boss.draw(offset_surface)
-
-                # Draw power-ups
-                for power in self.power_ups:
-                    power.draw(offset_surface)
-
-                # Draw explosions
-                for explosion in self.explosions:
-                    pygame.draw.circle(offset_surface, explosion["color"],
-                                       (int(explosion["x"]), int(explosion["y"])),
-                                       explosion["size"])
-
-                # Draw UI
-                self.draw_ui(offset_surface)
-
-            elif self.state == GameState.START_MENU:
-                self.draw_start_menu(offset_surface)
-
-            elif self.state == GameState.LEVEL_SELECT:
-                self.draw_level_select(offset_surface)
-
-            elif self.state == GameState.SETTINGS:
-                self.draw_settings_menu(offset_surface)
-
-            elif self.state == GameState.TUTORIAL:
-                self.draw_tutorial(offset_surface)
-
-            elif self.state == GameState.GAME_OVER:
-                self.draw_game_over(offset_surface)
-
-            elif self.state == GameState.SHOP:
-                self.draw_shop(offset_surface)
-
-            elif self.state == GameState.PAUSED:
-                self.draw_pause_menu(offset_surface)
-
-            elif self.state == GameState.LEVEL_COMPLETE:
-                self.draw_level_complete(offset_surface)
+                if event.key == pygame.K_p and self.state == GameState.PLAYING:
+                    self.state = GameState.PAUSED
+
+                if event.key == pygame.K_SPACE:
+                    if self.state == GameState.TUTORIAL:
+                        self.tutorial_step += 1
+                        if self.tutorial_step >= len(self.tutorial_text):
+                            self.state = GameState.PLAYING
+                    elif self.state == GameState.STORY:
+                        self.story_index += 1
+                        if self.story_index >= len(self.story):
+                            self.state = GameState.PLAYING
+
+                if event.key == pygame.K_r and self.state == GameState.GAME_OVER:
+                    self.reset_game()
+
+                if event.key == pygame.K_s and self.state == GameState.PLAYING:
+                    self.state = GameState.SHOP
+
+                # Profiler: F3 toggles the overlay (enabling the profiler), F4 exports a trace
+                if event.key == pygame.K_F3:
+                    self.show_profiler = not self.show_profiler
+                    self.profiler.enabled = self.profiler.enabled or self.show_profiler
+                if event.key == pygame.K_F4 and self.profiler.frame:
+                    self.profiler.dump()
+
+                if event.key == pygame.K_F5 and self.state in (GameState.PLAYING, GameState.PAUSED):
+                    self.quick_save()
+                if event.key == pygame.K_F9:
+                    self.quick_load()
+
+                # Weapon switching is applied by step() so it is part of the tick input
+                if event.key == pygame.K_1:
+                    inputs |= INPUT_WEAPON_LASER
+                if event.key == pygame.K_2:
+                    inputs |= INPUT_WEAPON_MISSILE
+                if event.key == pygame.K_3:
+                    inputs |= INPUT_WEAPON_PLASMA
+
+            # Handle mouse clicks for level complete screen
+            if event.type == pygame.MOUSEBUTTONDOWN:
+                if self.state == GameState.LEVEL_COMPLETE and self.net is None:
+                    mouse_pos = render_mouse_pos()
+                    if hasattr(self, 'home_button') and self.home_button.collidepoint(mouse_pos):
+                        self.state = GameState.START_MENU
+                    elif hasattr(self, 'next_level_button') and self.next_level_button.collidepoint(mouse_pos):
+                        self.apply_action("next_level")
+        return inputs
+
+    def fire(self, player):
+        """Spawn a projectile from ``player`` using its current weapon."""
+        self.projectiles.append(self.projectile_pool.acquire(
+            player.rect.centerx,
+            player.rect.top,
+            WEAPON_TYPES[player.weapon_type],
+            player.weapon_power
+        ))
+        self.events.emit(GameEvent.SHOT_FIRED)
+
+        # Set cooldown based on rapid fire
+        if player.rapid_fire:
+            player.shoot_cooldown = 5  # Very fast shooting
+        else:
+            player.shoot_cooldown = 15  # Normal shooting
+
+    def step(self, inputs=0):
+        """Advance the simulation by one tick.
+
+        ``inputs`` is a bitmask of ``INPUT_*`` flags. Nothing here touches the
+        display, so it can be driven headless (e.g. with ``SDL_VIDEODRIVER=dummy``).
+        Returns the game state after the tick.
+        """
+        if self.state != GameState.PLAYING:
+            return self.state
+
+        if self.recording is not None:
+            self.recording.record(inputs)
+        self.inputs = inputs
+        if self.profiler.enabled:
+            timed = self.profiler.time
+            for name, phase in self.update_phases:
+                timed(name, phase)
+        else:
+            for _, phase in self.update_phases:
+                phase()
+        if self.state == GameState.GAME_OVER:
+            self.update_high_score()
+        return self.state
+
+    def update_players(self):
+        inputs = self.inputs
+        for player, (left, right, fire, *weapons) in zip(self.players(), PLAYER_INPUTS):
+            # Weapon switching
+            for bit, weapon in zip(weapons, WEAPON_TYPES):
+                if inputs & bit:
+                    player.switch_weapon(weapon)
+
+            # Movement
+            if inputs & left:
+                player.move(-player.speed)
+            if inputs & right:
+                player.move(player.speed)
+
+            # Shooting
+            if inputs & fire and player.shoot_cooldown <= 0:
+                self.fire(player)
+
+            player.update()
+
+    def steer_missiles(self):
+        """Turn every homing missile towards its nearest enemy or the boss."""
+        missiles = [proj for proj in self.projectiles if proj.homing]
+        if not missiles:
+            return
+        targets = [enemy.rect.center for enemy in self.enemies]
+        if self.boss_active:
+            targets.append(self.boss.rect.center)
+        if not targets:
+            return
+
+        points = np.array([(proj.x, proj.y) for proj in missiles], dtype=np.float64)
+        targets = np.array(targets, dtype=np.float64)
+        aim = targets[nearest_targets(points, targets)] - points
+        velocity = np.array([(proj.vx, proj.vy) for proj in missiles], dtype=np.float64)
+        heading = np.arctan2(velocity[:, 1], velocity[:, 0])
+        turn = (np.arctan2(aim[:, 1], aim[:, 0]) - heading + math.pi) % (2 * math.pi) - math.pi
+        heading += np.clip(turn, -MISSILE_TURN_RATE, MISSILE_TURN_RATE)
+        speeds = np.array([proj.speed for proj in missiles], dtype=np.float64)
+        vx = (np.cos(heading) * speeds).tolist()
+        vy = (np.sin(heading) * speeds).tolist()
+        for proj, proj_vx, proj_vy in zip(missiles, vx, vy):
+            proj.vx = proj_vx
+            proj.vy = proj_vy
+
+    def update_projectiles(self):
+        self.steer_missiles()
+        live = []
+        for proj in self.projectiles:
+            proj.move()
+            rect = proj.rect
+            if rect.bottom < 0 or rect.top > HEIGHT or rect.right < 0 or rect.left > WIDTH:
+                self.projectile_pool.release(proj)
+                self.events.emit(GameEvent.SHOT_MISSED)
+            else:
+                live.append(proj)
+        self.projectiles = live
+
+    def players(self):
+        return [self.player, self.player2] if self.player2 else [self.player]
+
+    def update_enemy_projectiles(self):
+        bullets = self.enemy_bullets
+        bullets.update()
+
+        # Check collision with players; each bullet hits the first player it overlaps
+        for player in self.players():
+            for damage, x, y in bullets.take_hits(player.rect):
+                if player.take_damage(damage):
+                    self.create_explosion(x, y, 10)
+                    self.level_stats['damage_taken'] += damage
+                    self.events.emit(GameEvent.DAMAGE_TAKEN, damage)
+                if player.health <= 0:
+                    self.state = GameState.GAME_OVER
+
+    def update_enemies(self):
+        for enemy in self.enemies:
+            enemy.move()
+            enemy.update_cooldown()
+
+            # Enemy shooting
+            if enemy.can_shoot():
+                self.enemy_bullets.emit(enemy.rect.centerx, enemy.rect.bottom - 7.5, 0, 15, 10)
+                enemy.reset_cooldown()
+
+            # Enemy collision with players
+            for player in self.players():
+                if enemy.rect.colliderect(player.rect):
+                    if player.take_damage(10):
+                        self.create_explosion(enemy.rect.centerx, enemy.rect.centery, 20)
+                        self.level_stats['damage_taken'] += 10
+                        self.events.emit(GameEvent.DAMAGE_TAKEN, 10)
+                    enemy.health = 0
+                    self.enemies_defeated += 1
+                    self.level_stats['enemies_killed'] += 1
+                    if player.health <= 0:
+                        self.state = GameState.GAME_OVER
+                    break
+
+        # Remove destroyed enemies and those that go off screen
+        self.enemies = [enemy for enemy in self.enemies if enemy.health > 0 and enemy.rect.top <= HEIGHT]
+
+    def update_boss(self):
+        if not self.boss_active:
+            return
+        self.boss_ticks += 1
+        self.boss.move()
+        self.boss.update_cooldown()
+        self.boss.update_shield()
+
+        # Boss attack patterns, aimed at the nearest player
+        boss_x, boss_y = self.boss.rect.midbottom
+        target = min((player.rect.center for player in self.players()),
+                     key=lambda center: (center[0] - boss_x) ** 2 + (center[1] - boss_y) ** 2)
+        self.boss.attack(self.enemy_bullets, target)
+
+        # Boss collision with players
+        for player in self.players():
+            if self.boss.rect.colliderect(player.rect):
+                if player.take_damage(20):
+                    self.create_explosion(self.boss.rect.centerx, self.boss.rect.centery, 30)
+                    self.level_stats['damage_taken'] += 20
+                    self.events.emit(GameEvent.DAMAGE_TAKEN, 20)
+                if player.health <= 0:
+                    self.state = GameState.GAME_OVER
+
+        # Check if boss is defeated
+        if self.boss.health <= 0:
+            self.player.add_coins(self.boss.value)
+            self.player.score += self.boss.value * 10
+            self.level_stats['coins_collected'] += self.boss.value
+            self.events.emit(GameEvent.COIN_COLLECTED, self.boss.value)
+            self.create_explosion(self.boss.rect.centerx, self.boss.rect.centery, 50)
+            self.boss_active = False
+            self.level_complete_time = ticks_ms()
+            self.state = GameState.LEVEL_COMPLETE
+            self.events.emit(GameEvent.BOSS_DEFEATED, self.boss_ticks)
+            self.events.emit(GameEvent.LEVEL_COMPLETED, self.level)
+
+    def check_projectile_collisions(self):
+        # Check collisions between player projectiles and enemies. Only pay for
+        # the broad-phase grid once the brute-force pair count makes it worth it;
+        # plasma blasts build it on demand for their radius queries.
+        enemies = self.enemies
+        self.enemy_grid_built = False
+        if len(self.projectiles) * len(enemies) >= GRID_MIN_PAIRS:
+            self.build_enemy_grid()
+            candidates = self.enemy_grid.query
+        else:
+            every_enemy = range(len(enemies))
+            candidates = lambda rect: every_enemy
+
+        killed = False
+        live = []
+        for proj in self.projectiles:
+            hit = None
+            for i in candidates(proj.rect):
+                enemy = enemies[i]
+                if enemy.health <= 0 or not proj.rect.colliderect(enemy.rect):
+                    continue
+                hit = enemy
+                break
+
+            # Check boss collision
+            if hit is None and self.boss_active and proj.rect.colliderect(self.boss.rect):
+                hit = self.boss
+
+            if hit is None:
+                live.append(proj)
+                continue
+            if proj.explosive:
+                killed |= self.plasma_blast(proj)
+            elif hit is self.boss:
+                if self.boss.take_damage(proj.damage):
+                    self.create_explosion(proj.rect.centerx, proj.rect.centery, 20)
+            else:
+                killed |= self.damage_enemy(hit, proj.damage)
+                self.create_explosion(proj.rect.centerx, proj.rect.centery, 15)
+            self.projectile_pool.release(proj)
+        self.projectiles = live
+
+        # Dead enemies (including chain kills) are dropped in one pass
+        if killed:
+            self.enemies = [enemy for enemy in enemies if enemy.health > 0]
+
+    def build_enemy_grid(self):
+        if not self.enemy_grid_built:
+            grid = self.enemy_grid
+            grid.clear()
+            for i, enemy in enumerate(self.enemies):
+                grid.insert(i, enemy.rect)
+            self.enemy_grid_built = True
+
+    def damage_enemy(self, enemy, amount):
+        """Apply ``amount`` damage; on a kill pay out score, coins and a possible drop. Returns True on a kill."""
+        enemy.health -= amount
+        if enemy.health > 0:
+            return False
+        self.player.score += enemy.value
+        self.player.add_coins(enemy.value)
+        self.level_stats['coins_collected'] += enemy.value
+        self.enemies_defeated += 1
+        self.level_stats['enemies_killed'] += 1
+        self.events.emit(GameEvent.ENEMY_KILLED)
+        self.events.emit(GameEvent.COIN_COLLECTED, enemy.value)
+
+        # Chance to drop power-up
+        if self.rng.random() < enemy.drop_chance:
+            self.spawn_power_up(enemy.rect.centerx, enemy.rect.centery)
+        return True
 
-            elif self.state == GameState.STORY:
-                self.draw_story(offset_surface)
+    def plasma_blast(self, proj):
+        """Damage everything within the blast radius of ``proj``, falling off with distance."""
+        x, y = proj.rect.center
+        radius = PLASMA_RADIUS + PLASMA_RADIUS_PER_POWER * proj.power
+        falloff = 1 - PLASMA_EDGE_DAMAGE
+
+        killed = False
+        self.build_enemy_grid()
+        enemies = self.enemies
+        for i in self.enemy_grid.query_radius(x, y, radius):
+            enemy = enemies[i]
+            if enemy.health <= 0:
+                continue
+            distance = rect_distance(enemy.rect, x, y)
+            if distance <= radius:
+                killed |= self.damage_enemy(enemy, max(1, round(proj.damage * (1 - falloff * distance / radius))))
+
+        if self.boss_active:
+            distance = rect_distance(self.boss.rect, x, y)
+            if distance <= radius:
+                self.boss.take_damage(max(1, round(proj.damage * (1 - falloff * distance / radius))))
+
+        self.create_explosion(x, y, radius // 2)
+        return killed
+
+    def collect_power_up(self, player, power):
+        if power.type == PowerUpType.COIN:
+            self.player.add_coins(5)  # Only one coin counter
+            self.level_stats['coins_collected'] += 5
+            self.events.emit(GameEvent.COIN_COLLECTED, 5)
+        elif power.type == PowerUpType.HEALTH:
+            player.heal(20)
+        elif power.type == PowerUpType.RAPID_FIRE:
+            player.rapid_fire = True
+            player.rapid_fire_timer = 300
+        elif power.type == PowerUpType.SHIELD:
+            player.activate_shield()
+        elif power.type == PowerUpType.GUN:
+            if "missile" not in player.weapons_unlocked:
+                player.unlock_weapon("missile")
+            elif "plasma" not in player.weapons_unlocked:
+                player.unlock_weapon("plasma")
+            else:
+                return
+            self.events.emit(GameEvent.WEAPON_UNLOCKED, len(player.weapons_unlocked))
+
+    def update_power_ups(self):
+        live = []
+        for power in self.power_ups:
+            power.move()
+
+            # Remove power-ups that go off screen
+            if power.rect.top > HEIGHT:
+                continue
+
+            # Power-up collision with players
+            for player in self.players():
+                if power.rect.colliderect(player.rect):
+                    self.collect_power_up(player, power)
+                    break
+            else:
+                live.append(power)
+        self.power_ups = live
+
+    def spawn_enemies(self):
+        # Spawn new enemies
+        if len(self.enemies) < 5 + self.level and self.rng.random() < 0.02:
+            self.enemies.append(self.spawn_enemy())
 
-            elif self.state == GameState.ACHIEVEMENTS:
-                self.draw_achievements(offset_surface)
+        # Spawn boss when enemies are cleared
+        if not self.boss_active and self.enemies_defeated >= self.enemies_to_defeat:
+            self.enemies = []  # Clear existing enemies
+            self.spawn_boss()
+
+    def capture_positions(self):
+        """Remember entity positions before a tick so draws can interpolate."""
+        entities = self.players() + self.projectiles + self.enemies + self.power_ups
+        if self.boss_active:
+            entities.append(self.boss)
+        self.prev_positions = {id(entity): entity.rect.topleft for entity in entities}
+
+    def lerp_offset(self, entity):
+        """Offset from ``entity``'s tick position to its interpolated draw position."""
+        prev = self.prev_positions.get(id(entity))
+        if prev is None:
+            return 0, 0
+        x, y = entity.rect.topleft
+        dx, dy = prev[0] - x, prev[1] - y
+        if abs(dx) > MAX_LERP_DISTANCE or abs(dy) > MAX_LERP_DISTANCE:
+            return 0, 0  # Respawned or recycled since the last tick
+        t = 1.0 - self.render_alpha
+        return round(dx * t), round(dy * t)
+
+    def lerp_blits(self, entities):
+        items = []
+        for entity in entities:
+            sprite, (x, y) = entity.sprite()
+            ox, oy = self.lerp_offset(entity)
+            items.append((sprite, (x + ox, y + oy)))
+        return items
+
+    def draw_playing(self, surface):
+        call = self.profiler.call
+        call("draw_entities", self.draw_entities, surface)
+
+        # Draw explosions
+        call("draw_particles", self.particles.draw, surface)
+
+        # Draw UI
+        call("draw_ui", self.draw_ui, surface)
+
+    def draw_entities(self, surface):
+        blits = surface.blits
+
+        # Draw players
+        items = []
+        for player in self.players():
+            ox, oy = self.lerp_offset(player)
+            items.extend((sprite, (x + ox, y + oy)) for sprite, (x, y) in player.sprites())
+        blits(items, doreturn=False)
+
+        # Draw projectiles
+        blits(self.lerp_blits(self.projectiles), doreturn=False)
+
+        # Draw enemy bullets
+        self.enemy_bullets.draw(surface, 1.0 - self.render_alpha if self.prev_positions else 0.0)
+
+        # Draw enemies
+        blits(self.lerp_blits(self.enemies), doreturn=False)
+
+        # Draw boss
+        if self.boss_active:
+            self.boss.draw(surface, self.lerp_offset(self.boss))
+
+        # Draw power-ups
+        blits(self.lerp_blits(self.power_ups), doreturn=False)
+
+    def draw(self, target):
+        """Render one frame to ``target``.
+
+        Returns the list of rects that changed, or None when the whole target
+        needs presenting.
+        """
+        if self.state in MENU_STATES and self.settings.get("dirty_rect_menus", True):
+            return self.draw_menu_dirty(target)
+        self.menu_key = None  # Menus start with a full redraw next time
+
+        self.render_targets.resize(target.get_size())
+        surface = self.render_targets.back_buffer
+
+        self.profiler.call("stars", self.draw_stars, surface)
+
+        # Draw game elements based on state
+        if self.state == GameState.PLAYING:
+            self.draw_playing(surface)
+        else:
+            self.menu_hit_rects = []
+            self.screens[self.state](surface)
 
-            elif self.state == GameState.CHALLENGES:
-                self.draw_challenges(offset_surface)
+        # Apply camera offset to the whole screen
+        self.render_targets.present(target, self.camera_offset)
+        return None
 
-            # Apply camera offset to the whole screen
-            win.blit(offset_surface, self.camera_offset)
+    def draw_stars(self, surface):
+        surface.fill(BLACK)
+        self.starfield.draw(surface)
+
+    def draw_menu_dirty(self, target):
+        """Draw a menu screen, redrawing only what changed since the last frame.
+
+        The screen layout is rendered into a cached transparent layer and only
+        re-rendered when the state, hovered button or mouse button changes (or
+        a non-motion event arrives). Otherwise only the starfield moves: each
+        star's old and new rect is cleared, the stars are redrawn and the
+        layout is patched back over just those rects.
+        """
+        self.render_targets.resize(target.get_size())
+        layer = self.render_targets.menu_layer()
+        mouse_pos = render_mouse_pos()
+        hovered = next((i for i, rect in enumerate(self.menu_hit_rects) if rect.collidepoint(mouse_pos)), -1)
+        key = (self.state, hovered, pygame.mouse.get_pressed()[0])
+
+        old_rects, self.star_rects = self.star_rects, self.starfield.rects()
+
+        if self.menu_redraw or key != self.menu_key:
+            self.menu_redraw = False
+            self.menu_key = key
+            self.menu_hit_rects = []
+            layer.fill((0, 0, 0, 0))
+            self.screens[self.state](layer)
+            target.fill(BLACK)
+            self.starfield.draw(target)
+            target.blit(layer, (0, 0))
+            return None
+
+        # Merge overlapping rects so no pixel gets the layout blended twice, and
+        # clip to the screen so patches stay aligned at the edges
+        screen = target.get_rect()
+        dirty = []
+        for rect in old_rects + self.star_rects:
+            index = rect.collidelist(dirty)
+            while index != -1:
+                rect = rect.union(dirty.pop(index))
+                index = rect.collidelist(dirty)
+            dirty.append(rect)
+        dirty = [rect.clip(screen) for rect in dirty]
+        for rect in dirty:
+            target.fill(BLACK, rect)
+        self.starfield.draw(target)
+        target.blits([(layer, rect.topleft, rect) for rect in dirty], doreturn=False)
+        return dirty
 
-            pygame.display.flip()
-            self.clock.tick(60)
+    def run(self):
+        """Fixed-timestep main loop.
+
+        The simulation advances in TICK_RATE steps fed by a wall-clock
+        accumulator, running several ticks per rendered frame to catch up.
+        Once a frame owes more than MAX_TICKS_PER_FRAME the backlog is dropped
+        (and counted) instead of spiralling. Rendering interpolates entity
+        positions between the last two ticks.
+        """
+        tick_time = 1.0 / TICK_RATE
+        accumulator = 0.0
+        previous = time.perf_counter()
+        pending_inputs = 0
+        profiler = self.profiler
+        first_frame = previous
+        while True:
+            now = time.perf_counter()
+            accumulator += now - previous
+            # The starfield is cosmetic: it scrolls by elapsed time (in ticks) in every state
+            self.starfield.update(min((now - previous) * TICK_RATE, MAX_TICKS_PER_FRAME))
+            previous = now
+
+            pending_inputs |= profiler.call("events", self.handle_events)
+
+            ticks = int(accumulator / tick_time)
+            if ticks > MAX_TICKS_PER_FRAME:
+                self.dropped_ticks += ticks - MAX_TICKS_PER_FRAME
+                accumulator -= (ticks - MAX_TICKS_PER_FRAME) * tick_time
+                ticks = MAX_TICKS_PER_FRAME
+
+            rewinding = self.net is None and pygame.key.get_pressed()[pygame.K_BACKSPACE]
+            for tick in range(ticks):
+                if rewinding and self.state in (GameState.PLAYING, GameState.GAME_OVER):
+                    self.rewind()
+                    pending_inputs = 0
+                elif self.state == GameState.PLAYING or self.net is not None:
+                    if tick == ticks - 1:
+                        self.capture_positions()
+                    inputs = pending_inputs | read_inputs(pygame.key.get_pressed())
+                    if self.net is not None:
+                        self.net.advance(inputs)  # Keeps exchanging inputs after the level ends
+                    else:
+                        self.step(inputs)
+                        self.record_rewind()
+                    pending_inputs = 0
+                accumulator -= tick_time
+
+            self.render_alpha = accumulator / tick_time if self.prev_positions else 1.0
+
+            dirty = self.draw(screen)
+            if self.show_profiler and dirty is None:
+                profiler.draw(screen)
+            profiler.call("present", present, dirty)
+            if first_frame is not None:
+                startup_step("first frame", first_frame)
+                first_frame = None
+                if "--startup-report" in sys.argv:
+                    print(startup_report(), flush=True)
+            text_hits, text_misses = TEXT_CACHE.take_counts()
+            profiler.end_frame({
+                "ticks": ticks,
+                "dropped_ticks": self.dropped_ticks,
+                "enemies": len(self.enemies),
+                "projectiles": len(self.projectiles),
+                "enemy_bullets": len(self.enemy_bullets),
+                "particles": self.particles.count,
+                "text_cache_hits": text_hits,
+                "text_cache_misses": text_misses,
+                "render_target_kb": self.render_targets.allocated_bytes() // 1024
+            })
+            self.clock.tick(self.settings["max_fps"])
+
+
+def replay(recording, game=None, on_tick=None):
+    """Re-simulate ``recording`` headless as fast as possible.
+
+    ``on_tick(game, tick)`` is called after every tick, e.g. to time ticks.
+    Returns the game in its final state. Opens the window at the recording's
+    render resolution if it isn't open yet; raises ValueError if it is open
+    at another one, since the run would play out differently.
+    """
+    init(render_resolution=recording.size)
+    if (WIDTH, HEIGHT) != recording.size:
+        width, height = recording.size
+        raise ValueError(f"replay was recorded at {width}x{height}, not {WIDTH}x{HEIGHT}")
+    game = game or Game(save_path=None)
+    game.settings["two_players"] = recording.two_players
+    game.level = recording.level
+    game.reset_game(recording.seed)
+    game.recording = None
+    game.events.clear()  # Recorded reward actions replay the rules' effects
+    game.state = GameState.PLAYING
+
+    actions = recording.actions
+    next_action = 0
+    for tick, inputs in enumerate(recording.inputs()):
+        while next_action < len(actions) and actions[next_action][0] == tick:
+            game.apply_action(actions[next_action][1])
+            next_action += 1
+        game.step(inputs)
+        if on_tick is not None:
+            on_tick(game, tick)
+    for _, action in actions[next_action:]:
+        game.apply_action(action)
+    return game
+
+
+# Online co-op. Both peers run the whole simulation and exchange only their
+# per-tick inputs over UDP. A remote input that has not arrived yet is
+# predicted (the last one received); when the real one turns out different,
+# the game is rolled back to the state saved before that tick and
+# re-simulated. The host plays player 1 and the guest player 2; both read
+# their keys in player 1's layout.
+NET_PORT = 7777
+NET_INPUT_DELAY = 2  # Ticks local inputs are held back; hides that much latency without rollback
+NET_MAX_ROLLBACK = 8  # Ticks simulated ahead of the peer's inputs before waiting for them
+NET_HELLO_INTERVAL = 0.1  # Seconds between connection attempts
+NET_TIMEOUT = 10.0  # Seconds to wait for the peer when connecting
+NET_PACKET_SIZE = 2048
+NET_HELLO, NET_START, NET_INPUTS = 1, 2, 3
+NET_HELLO_PACKET = struct.Struct("<BHH")  # type, render width, height
+NET_START_PACKET = struct.Struct("<BIHHH")  # type, seed, level, render width, height
+NET_INPUT_HEADER = struct.Struct("<BIIB")  # type, ticks received from the peer, first tick, runs
+NET_INPUT_RUN = struct.Struct("<HB")  # input mask, ticks held
+
+
+def encode_inputs(received, first, masks):
+    """Pack the input masks for ticks ``first`` onwards as runs of unchanged input."""
+    runs = []
+    for mask in masks:
+        if runs and runs[-1][0] == mask and runs[-1][1] < 255:
+            runs[-1][1] += 1
+        elif len(runs) < 255:
+            runs.append([mask, 1])
+        else:
+            break
+    return (NET_INPUT_HEADER.pack(NET_INPUTS, received, first, len(runs)) +
+            b"".join(NET_INPUT_RUN.pack(mask, count) for mask, count in runs))
+
+
+def decode_inputs(data):
+    """Unpack an inputs packet into (ticks received, first tick, masks)."""
+    _, received, first, run_count = NET_INPUT_HEADER.unpack_from(data)
+    masks = []
+    for index in range(run_count):
+        mask, count = NET_INPUT_RUN.unpack_from(data, NET_INPUT_HEADER.size + index * NET_INPUT_RUN.size)
+        masks.extend([mask] * count)
+    return received, first, masks
+
+
+class NetLink:
+    """Non-blocking UDP socket to one peer, optionally degraded for testing.
+
+    Outgoing packets are delayed by ``latency`` plus or minus ``jitter``
+    seconds (so they can arrive out of order) and a ``loss`` fraction of them
+    is dropped, so the netcode can be exercised on loopback. The peer's
+    address is learned from its first packet when not given.
+    """
+
+    def __init__(self, port=0, peer=None, latency=0.0, jitter=0.0, loss=0.0, condition_seed=None,
+                 clock=time.perf_counter):
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind(("", port))
+        self.socket.setblocking(False)
+        self.peer = peer
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.rng = random.Random(condition_seed)  # Network conditions only, never the game's stream
+        self.clock = clock
+        self.pending = []  # (due time, sequence, packet) heap of delayed packets
+        self.sequence = 0
+        self.stats = {"sent": 0, "dropped": 0, "received": 0, "bytes_sent": 0}
+
+    @property
+    def port(self):
+        return self.socket.getsockname()[1]
+
+    def send(self, data):
+        if self.peer is None:
+            return
+        self.stats["sent"] += 1
+        self.stats["bytes_sent"] += len(data)
+        if self.loss and self.rng.random() < self.loss:
+            self.stats["dropped"] += 1
+            return
+        delay = self.latency + self.rng.uniform(-self.jitter, self.jitter) if self.jitter else self.latency
+        if delay <= 0:
+            self.transmit(data)
+        else:
+            heapq.heappush(self.pending, (self.clock() + delay, self.sequence, data))
+            self.sequence += 1
+
+    def transmit(self, data):
+        try:
+            self.socket.sendto(data, self.peer)
+        except OSError:
+            pass  # Peer not listening (yet); the next packet repeats everything unacknowledged
+
+    def poll(self):
+        """Send the delayed packets that are due and return the packets received."""
+        now = self.clock()
+        while self.pending and self.pending[0][0] <= now:
+            self.transmit(heapq.heappop(self.pending)[2])
+        packets = []
+        while True:
+            try:
+                data, address = self.socket.recvfrom(NET_PACKET_SIZE)
+            except (BlockingIOError, InterruptedError):
+                break
+            except ConnectionResetError:
+                continue  # Windows reports an earlier send to a closed port here
+            if self.peer is None:
+                self.peer = address
+            self.stats["received"] += 1
+            packets.append(data)
+        return packets
+
+    def close(self):
+        self.socket.close()
+
+
+class RollbackSession:
+    """One peer of an online co-op game (``index`` 0 hosts, 1 joins).
+
+    Call ``advance`` once per tick with the local player's inputs. The host
+    picks the seed and level and sends them when the guest says hello; until
+    then ``advance`` only handles the handshake. Only ticks simulated with a
+    predicted remote input have their state saved, so with an input delay
+    covering the latency most ticks cost no more than offline play.
+    """
+
+    def __init__(self, game, link, index, level=1, seed=None, input_delay=NET_INPUT_DELAY,
+                 max_rollback=NET_MAX_ROLLBACK):
+        self.game = game
+        self.link = link
+        self.index = index
+        self.level = level
+        self.seed = random.getrandbits(32) if seed is None else seed
+        self.input_delay = input_delay
+        self.max_rollback = max_rollback
+        self.connected = False
+        self.last_hello = -math.inf
+        self.tick = 0  # Next tick to simulate
+        self.local = {tick: 0 for tick in range(input_delay)}  # tick -> local input
+        self.remote = {}  # tick -> remote input, for ticks after ``confirmed``
+        self.confirmed = -1  # Every remote input up to this tick has arrived
+        self.last_remote = 0  # Remote input at ``confirmed``: the prediction for later ticks
+        self.peer_confirmed = -1  # The peer has all our inputs up to this tick
+        self.predicted = {}  # tick -> remote input assumed when simulating it
+        self.states = {}  # tick -> game state before it, for predicted ticks
+        self.rollback_tick = None  # Earliest mispredicted tick
+        self.resimulations = deque(maxlen=PROFILE_FRAMES)  # (ticks, milliseconds) per rollback
+        self.stats = {"rollbacks": 0, "resimulated": 0, "stalls": 0}
+
+    @classmethod
+    def host(cls, game, port=NET_PORT, level=1, seed=None, **conditions):
+        return cls(game, NetLink(port, **conditions), 0, level, seed)
+
+    @classmethod
+    def join(cls, game, address, **conditions):
+        return cls(game, NetLink(0, address, **conditions), 1)
+
+    def wait(self, timeout=NET_TIMEOUT):
+        """Block until the handshake completes."""
+        deadline = time.perf_counter() + timeout
+        while not self.connected:
+            if time.perf_counter() > deadline:
+                raise TimeoutError("no response from the other player")
+            self.advance(0)
+            time.sleep(0.01)
+
+    def begin(self, seed, level):
+        game = self.game
+        game.settings["two_players"] = True
+        game.level = level
+        game.reset_game(seed)
+        game.recording = None  # Rollbacks would record re-simulated ticks twice
+        game.events.clear()  # Achievement progress differs between profiles; rewards would desync
+        game.state = GameState.PLAYING
+        self.seed, self.level = seed, level
+        self.connected = True
+
+    def check_resolution(self, width, height):
+        if (width, height) != (WIDTH, HEIGHT):
+            raise ConnectionError(f"the other player renders at {width}x{height}, not {WIDTH}x{HEIGHT}; "
+                                  "set the same render_resolution on both")
+
+    def advance(self, inputs):
+        """Feed this tick's local inputs (player 1 layout) and simulate a tick.
+
+        Returns the number of ticks simulated: 1, or 0 while connecting or
+        when too far ahead of the peer's inputs.
+        """
+        self.receive()
+        if not self.connected:
+            if self.index == 1 and self.link.clock() - self.last_hello >= NET_HELLO_INTERVAL:
+                self.last_hello = self.link.clock()
+                self.link.send(NET_HELLO_PACKET.pack(NET_HELLO, WIDTH, HEIGHT))
+            return 0
+        if self.rollback_tick is not None:
+            self.resimulate()
+        self.prune()
+        if self.tick - self.confirmed > self.max_rollback:
+            self.stats["stalls"] += 1
+            self.send_inputs()
+            return 0
+        self.local[self.tick + self.input_delay] = inputs & PLAYER_INPUT_MASKS[0]
+        self.send_inputs()
+        self.simulate()
+        return 1
+
+    def receive(self):
+        for data in self.link.poll():
+            try:
+                kind = data[0]
+                if kind == NET_HELLO and self.index == 0:
+                    self.check_resolution(*NET_HELLO_PACKET.unpack(data)[1:])
+                    if not self.connected:
+                        self.begin(self.seed, self.level)
+                    # Sent for every hello: the guest repeats them until a start arrives
+                    self.link.send(NET_START_PACKET.pack(NET_START, self.seed, self.level, WIDTH, HEIGHT))
+                elif kind == NET_START and self.index == 1 and not self.connected:
+                    _, seed, level, width, height = NET_START_PACKET.unpack(data)
+                    self.check_resolution(width, height)
+                    self.begin(seed, level)
+                elif kind == NET_INPUTS and self.connected:
+                    self.receive_inputs(*decode_inputs(data))
+            except (struct.error, IndexError):
+                continue  # Malformed packet
+
+    def receive_inputs(self, received, first, masks):
+        self.peer_confirmed = max(self.peer_confirmed, received - 1)
+        for tick, mask in enumerate(masks, first):
+            if tick <= self.confirmed or tick in self.remote:
+                continue
+            self.remote[tick] = mask
+            predicted = self.predicted.get(tick)
+            if predicted is not None and predicted != mask:
+                if self.rollback_tick is None or tick < self.rollback_tick:
+                    self.rollback_tick = tick
+        while self.confirmed + 1 in self.remote:
+            self.confirmed += 1
+            self.last_remote = self.remote[self.confirmed]
+
+    def send_inputs(self):
+        first = self.peer_confirmed + 1
+        last = max(self.local, default=first - 1)
+        self.link.send(encode_inputs(self.confirmed + 1, first, [self.local[tick] for tick in range(first, last + 1)]))
+
+    def simulate(self):
+        """Simulate ``self.tick`` with the known or predicted remote input."""
+        tick = self.tick
+        remote = self.remote.get(tick)
+        if remote is None:
+            remote = self.last_remote
+            self.predicted[tick] = remote
+            self.states[tick] = self.game.snapshot()
+        local = self.local[tick]
+        if self.index == 0:
+            self.game.step(local | as_player(remote, 1))
+        else:
+            self.game.step(remote | as_player(local, 1))
+        self.tick += 1
+
+    def resimulate(self):
+        """Roll back to before the earliest mispredicted tick and simulate up to now again."""
+        start = time.perf_counter()
+        tick, end = self.rollback_tick, self.tick
+        self.rollback_tick = None
+        self.game.restore(self.states[tick])
+        self.tick = tick
+        while self.tick < end:
+            self.predicted.pop(self.tick, None)
+            self.states.pop(self.tick, None)
+            self.simulate()
+        self.stats["rollbacks"] += 1
+        self.stats["resimulated"] += end - tick
+        self.resimulations.append((end - tick, (time.perf_counter() - start) * 1000))
+
+    def prune(self):
+        """Forget inputs and states no rollback or resend can need any more."""
+        done = min(self.tick - 1, self.confirmed)  # Simulated with known inputs on both sides
+        for tick in [tick for tick in self.local if tick <= min(done, self.peer_confirmed)]:
+            del self.local[tick]
+        for inputs in (self.remote, self.predicted, self.states):
+            for tick in [tick for tick in inputs if tick <= done]:
+                del inputs[tick]
+
+    def close(self):
+        self.link.close()
+
+
+def start_net_session(game, argv):
+    """Connect for ``--host [PORT]`` or ``--join HOST[:PORT]`` in ``argv``; returns the session or None."""
+    def argument(flag):
+        index = argv.index(flag)
+        return argv[index + 1] if index + 1 < len(argv) and not argv[index + 1].startswith("--") else ""
+
+    if "--host" in argv:
+        session = RollbackSession.host(game, int(argument("--host") or NET_PORT), level=game.unlocked_levels)
+    elif "--join" in argv:
+        host, _, port = argument("--join").partition(":")
+        session = RollbackSession.join(game, (host or "127.0.0.1", int(port or NET_PORT)))
+    else:
+        return None
+    print("Waiting for the other player...", flush=True)
+    session.wait()
+    return session
 
 
 # Run the game
 if __name__ == "__main__":
     game = Game()
-    game.run()
+    try:
+        game.net = start_net_session(game, sys.argv)
+        game.run()
+    finally:
+        if game.net is not None:
+            game.net.close()
+        game.save_recording()
+        game.save_store.flush()
+        if game.profiler.enabled and game.profiler.frame:
+            game.profiler.dump()
 
 
 
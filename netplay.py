@@ -0,0 +1,193 @@
+"""Loopback test for online co-op: two rollback peers in one process over real UDP sockets.
+
+Both peers are driven by held random inputs through NetLinks that add
+latency, jitter and packet loss, on a virtual 60 Hz clock so the run goes
+as fast as the simulation allows. Every tick both peers have fully confirmed
+is fingerprinted (keyed by the tick about to run); the peers must agree with each other and with an offline
+re-simulation of the host's inputs. Rollback counts and re-simulation times
+are reported against the frame budget, followed by worst-case rollbacks of
+NET_MAX_ROLLBACK ticks in late-game boss fights.
+
+Usage: python netplay.py [--ticks 3600] [--latency 0.06] [--jitter 0.02] [--loss 0.05] [--level 5]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import zlib
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import numpy as np
+
+from main import NET_MAX_ROLLBACK, TICK_RATE, Game, GameState, RollbackSession
+
+FRAME_BUDGET_MS = 1000 / 60
+WORST_CASE_LEVELS = (10, 50, 100)
+
+
+def fingerprint(game):
+    """Checksum of the simulation state that both peers must agree on."""
+    bullets = game.enemy_bullets
+    n = bullets.count
+    parts = (game.state.name, game.rng.getstate(), game.enemies_defeated, game.level_stats["damage_taken"],
+             [(p.rect, p.health, p.coins, p.score, p.weapon_type, p.shoot_cooldown) for p in game.players()],
+             [(e.rect, e.health, e.shoot_cooldown) for e in game.enemies],
+             [(p.x, p.y, p.vx, p.vy) for p in game.projectiles],
+             [(p.rect, p.type) for p in game.power_ups],
+             game.boss_active and (game.boss.rect, game.boss.health, game.boss.phase_index, game.boss.phase_tick))
+    return zlib.crc32(repr(parts).encode() + bullets.x[:n].tobytes() + bullets.y[:n].tobytes())
+
+
+class HeldInputs:
+    """Random inputs held for a random number of ticks, like a player would."""
+
+    def __init__(self, seed):
+        self.rng = random.Random(seed)
+        self.inputs = 0
+        self.hold = 0
+
+    def __call__(self):
+        if self.hold <= 0:
+            self.inputs = self.rng.getrandbits(3) | (self.rng.choice((0, 0, 0, 1, 2, 4)) << 6)
+            self.hold = self.rng.randint(3, 30)
+        self.hold -= 1
+        return self.inputs
+
+
+def logged_steps(session):
+    """Record the input ``session`` finally used for each tick (re-simulations overwrite)."""
+    log = {}
+    step = session.game.step
+
+    def logging_step(inputs=0):
+        log[session.tick] = inputs
+        return step(inputs)
+
+    session.game.step = logging_step
+    return log
+
+
+def run_peers(args):
+    now = [0.0]
+    clock = lambda: now[0]
+    conditions = {"latency": args.latency, "jitter": args.jitter, "loss": args.loss, "clock": clock}
+    host = RollbackSession.host(Game(save_path=None), 0, args.level, args.seed, condition_seed=1, **conditions)
+    guest = RollbackSession.join(Game(save_path=None), ("127.0.0.1", host.link.port), condition_seed=2, **conditions)
+    host_log = logged_steps(host)
+    scratch = Game(save_path=None)
+    peers = [(host, HeldInputs(11), {}), (guest, HeldInputs(22), {})]
+
+    frames = 0
+    while min(host.tick, guest.tick) < args.ticks and frames < args.ticks * 4:
+        for session, inputs, prints in peers:
+            session.advance(inputs())
+            if not session.connected:
+                continue
+            # A state is final once every input before it is confirmed: the live
+            # state when the peer has caught up, or the saved rollback states
+            if session.tick - 1 <= session.confirmed and session.tick not in prints:
+                prints[session.tick] = fingerprint(session.game)
+            for tick, state in session.states.items():
+                if tick - 1 <= session.confirmed and tick not in prints:
+                    scratch.restore(state)
+                    prints[tick] = fingerprint(scratch)
+        now[0] += 1 / TICK_RATE
+        frames += 1
+    return host, guest, host_log, peers, frames
+
+
+def check(host, host_log, peers):
+    """Compare the peers' fingerprints with each other and with an offline re-simulation."""
+    host_prints, guest_prints = peers[0][2], peers[1][2]
+    common = sorted(set(host_prints) & set(guest_prints))
+    mismatches = [tick for tick in common if host_prints[tick] != guest_prints[tick]]
+
+    offline = Game(save_path=None)
+    offline.settings["two_players"] = True
+    offline.settings["record_replays"] = False
+    offline.level = host.level
+    offline.reset_game(host.seed)
+    offline.events.clear()
+    offline.state = GameState.PLAYING
+    offline_mismatches = []
+    for tick in range(max(common, default=0)):
+        offline.step(host_log[tick])
+        if tick + 1 in host_prints and fingerprint(offline) != host_prints[tick + 1]:
+            offline_mismatches.append(tick + 1)
+    return common, mismatches, offline_mismatches
+
+
+def report_session(name, session):
+    times = np.array([ms for _, ms in session.resimulations]) if session.resimulations else np.zeros(1)
+    ticks = max((count for count, _ in session.resimulations), default=0)
+    link = session.link.stats
+    print(f"{name:<6}{session.tick:7d}{session.stats['stalls']:8d}{session.stats['rollbacks']:10d}"
+          f"{session.stats['resimulated']:7d}{ticks:9d}{np.percentile(times, 99):9.2f}{times.max():9.2f}"
+          f"{link['bytes_sent'] / max(1, link['sent']):9.1f}{link['dropped']:9d}")
+
+
+def worst_case(level):
+    """Milliseconds for a rollback of NET_MAX_ROLLBACK ticks in a boss fight at ``level``."""
+    game = Game(seed=level, save_path=None)
+    game.settings["two_players"] = True
+    game.settings["record_replays"] = False
+    game.level = level
+    game.reset_game(level)
+    game.events.clear()
+    game.state = GameState.PLAYING
+    game.spawn_boss()
+    rng = random.Random(level)
+    for _ in range(240):  # Let the boss fill the screen with bullets
+        for player in game.players():
+            player.shield, player.shield_timer = True, 2
+        game.step(rng.getrandbits(12))
+    game.state = GameState.PLAYING
+    saved = game.snapshot()
+    start = time.perf_counter()
+    game.restore(saved)
+    for _ in range(NET_MAX_ROLLBACK):
+        game.snapshot()
+        game.step(rng.getrandbits(12))
+    return (time.perf_counter() - start) * 1000, len(game.enemies), len(game.enemy_bullets)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ticks", type=int, default=3600, help="Ticks each peer simulates")
+    parser.add_argument("--latency", type=float, default=0.06, help="One-way latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.02, help="Latency varies by up to this many seconds")
+    parser.add_argument("--loss", type=float, default=0.05, help="Fraction of packets dropped")
+    parser.add_argument("--level", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1234, help="Game seed")
+    args = parser.parse_args()
+
+    host, guest, host_log, peers, frames = run_peers(args)
+    common, mismatches, offline_mismatches = check(host, host_log, peers)
+
+    print(f"{frames} frames at {args.latency * 1000:.0f}+-{args.jitter * 1000:.0f} ms latency, "
+          f"{args.loss:.0%} loss, level {args.level}")
+    print(f"{'peer':<6}{'ticks':>7}{'stalls':>8}{'rollbacks':>10}{'resim':>7}{'max len':>9}"
+          f"{'p99 ms':>9}{'max ms':>9}{'bytes/pk':>9}{'dropped':>9}")
+    report_session("host", host)
+    report_session("guest", guest)
+    print(f"{len(common)} confirmed ticks compared: {len(mismatches)} peer mismatches, "
+          f"{len(offline_mismatches)} offline mismatches")
+
+    print(f"\nworst-case rollback ({NET_MAX_ROLLBACK} ticks, boss fight), budget {FRAME_BUDGET_MS:.1f} ms")
+    for level in WORST_CASE_LEVELS:
+        ms, enemies, bullets = worst_case(level)
+        print(f"level {level:3d}: {ms:7.2f} ms  ({enemies} enemies, {bullets} bullets)")
+
+    host.close()
+    guest.close()
+    if mismatches or offline_mismatches:
+        print("DESYNC at ticks", (mismatches or offline_mismatches)[:10])
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,41 @@
+"""Re-simulate a recorded run headless at maximum speed.
+
+Reports throughput and the slowest ticks so frame spikes can be reproduced
+and re-run as performance regressions.
+
+Usage: python replay.py [last_run.rply]
+"""
+import os
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+from main import REPLAY_PATH, InputRecording, replay
+
+
+def main(path=REPLAY_PATH, slowest=10):
+    recording = InputRecording.load(path)
+    tick_times = []
+    last = [time.perf_counter()]
+
+    def on_tick(game, tick):
+        now = time.perf_counter()
+        tick_times.append((now - last[0], tick))
+        last[0] = now
+
+    start = time.perf_counter()
+    game = replay(recording, on_tick=on_tick)
+    elapsed = time.perf_counter() - start
+
+    print(f"{path}: seed={recording.seed} level={recording.level} ticks={recording.ticks}")
+    print(f"replayed in {elapsed:.3f}s ({recording.ticks / max(elapsed, 1e-9):.0f} ticks/s)")
+    print(f"final state={game.state.name} level={game.level} score={game.player.score}")
+    print("slowest ticks:")
+    for duration, tick in sorted(tick_times, reverse=True)[:slowest]:
+        print(f"  tick {tick:7d}: {duration * 1e3:.3f} ms")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:2])
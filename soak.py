@@ -0,0 +1,40 @@
+"""Headless soak test: drive Game.step() through levels 1-100 with random inputs.
+
+Usage: SDL_VIDEODRIVER=dummy python soak.py [ticks_per_level]
+"""
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+from main import Game, GameState
+
+
+def soak_level(game, level, ticks, rng):
+    game.level = level
+    game.reset_game()
+    game.state = GameState.PLAYING
+    game.player.shield = True  # Keep the run alive so every tick is simulated
+    start = time.perf_counter()
+    for _ in range(ticks):
+        game.player.shield_timer = 2
+        inputs = rng.getrandbits(9)
+        if game.step(inputs) != GameState.PLAYING:
+            game.state = GameState.PLAYING
+    return ticks / (time.perf_counter() - start)
+
+
+def main_soak(ticks_per_level=600):
+    rng = random.Random(0)
+    game = Game(save_path=None)
+    game.settings["record_replays"] = False
+    for level in range(1, game.max_level + 1):
+        rate = soak_level(game, level, ticks_per_level, rng)
+        print(f"level {level:3d}: {rate:10.0f} ticks/s  enemies={len(game.enemies)}")
+
+
+if __name__ == "__main__":
+    main_soak(int(sys.argv[1]) if len(sys.argv) > 1 else 600)